@@ -0,0 +1,197 @@
+"""
+ad_inventory.py - Warm pool of ready-to-serve ads
+A background prefetcher keeps a small pool of fetched ads per
+(format, country) and provider, so the dashboard takes an ad from memory
+instead of waiting on a provider inside the page request.
+
+    take()      pops an ad for a (format, country), highest-priority
+                provider first, or the best head by the caller's rank
+                (auction mode: expected eCPM); a lock and a deque pop,
+                no I/O. Expired ads are dropped.
+                Returns None when the pool is empty - the caller then
+                fetches live.
+    prefetcher  one daemon thread per worker. It tops every requested
+                (format, country) up to AD_POOL_SIZE per provider whenever
+                a pool falls to AD_POOL_LOW_WATERMARK, and sweeps expired
+                ads every AD_POOL_REFRESH_SECONDS.
+
+Only keys that have been asked for are kept warm; the least recently
+requested is dropped beyond AD_POOL_MAX_KEYS.
+
+Environment:
+    AD_POOL_ENABLED=true
+    AD_POOL_SIZE=6               ads kept per (format, country, provider)
+    AD_POOL_LOW_WATERMARK=2      refill when a provider's pool falls to this
+    AD_POOL_TTL_SECONDS=300      an ad older than this is never served
+    AD_POOL_REFRESH_SECONDS=30
+    AD_POOL_MAX_KEYS=50          (format, country) pools kept warm
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='ads')
+
+AD_POOL_ENABLED = os.getenv('AD_POOL_ENABLED', 'true').lower() == 'true'
+AD_POOL_SIZE = int(os.getenv('AD_POOL_SIZE', '6'))
+AD_POOL_LOW_WATERMARK = int(os.getenv('AD_POOL_LOW_WATERMARK', '2'))
+AD_POOL_TTL_SECONDS = float(os.getenv('AD_POOL_TTL_SECONDS', '300'))
+AD_POOL_REFRESH_SECONDS = float(os.getenv('AD_POOL_REFRESH_SECONDS', '30'))
+AD_POOL_MAX_KEYS = int(os.getenv('AD_POOL_MAX_KEYS', '50'))
+
+
+class AdInventory:
+    """
+    Per-(format, country) pools of prefetched ads, refilled in the background
+
+    fetch(provider, ad_format, user_country) -> ad dict or None does one
+    provider fetch (the caller's breaker and metrics wrapper). providers()
+    returns the providers to stock, in serving order.
+    """
+
+    def __init__(self, fetch, providers, size=AD_POOL_SIZE, low_watermark=AD_POOL_LOW_WATERMARK,
+                 ttl_seconds=AD_POOL_TTL_SECONDS, refresh_seconds=AD_POOL_REFRESH_SECONDS,
+                 max_keys=AD_POOL_MAX_KEYS):
+        self._fetch = fetch
+        self._providers = providers
+        self.size = size
+        self.low_watermark = min(low_watermark, size - 1)
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self.max_keys = max_keys
+
+        self._lock = threading.Lock()
+        # (format, country) -> {provider name: deque[(expires_at, ad)]}, LRU by last take()
+        self._pools = OrderedDict()
+        self._wake = threading.Event()
+        self._worker = None
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'fetched': 0}
+
+    def take(self, ad_format, user_country, rank=None):
+        """
+        (provider name, ad copy) from the pool, or None if nothing fresh is pooled
+
+        Without rank the first provider with a fresh ad serves; with
+        rank(provider, ad) -> sort key the provider whose next ad ranks
+        highest does (ties go to the earlier provider).
+        """
+        key = (ad_format, user_country)
+        now = time.monotonic()
+        served = None
+        refill = False
+
+        with self._lock:
+            pools = self._pools.get(key)
+            if pools is None:
+                pools = self._pools[key] = {}
+                while len(self._pools) > self.max_keys:
+                    self._pools.popitem(last=False)
+                refill = True
+            else:
+                self._pools.move_to_end(key)
+
+            heads = []
+            for provider in self._providers():
+                pool = pools.get(provider.name)
+                while pool and pool[0][0] <= now:
+                    pool.popleft()
+                    self._stats['expired'] += 1
+                if pool:
+                    heads.append((provider, pool))
+                    if rank is None:
+                        break
+
+            if heads:
+                provider, pool = heads[0] if rank is None else max(
+                    heads, key=lambda head: rank(head[0], head[1][0][1]))
+                served = (provider.name, dict(pool.popleft()[1]))
+                refill = refill or len(pool) <= self.low_watermark
+            else:
+                refill = True
+
+            self._stats['hits' if served else 'misses'] += 1
+
+        if refill:
+            self._ensure_worker()
+            self._wake.set()
+        return served
+
+    def warm(self, ad_format, user_country):
+        """Start keeping a (format, country) pool stocked before its first request"""
+        with self._lock:
+            self._pools.setdefault((ad_format, user_country), {})
+        self._ensure_worker()
+        self._wake.set()
+
+    def refill(self):
+        """Sweep expired ads and top every pool up to size; returns ads fetched"""
+        now = time.monotonic()
+        with self._lock:
+            wanted = []
+            for key, pools in self._pools.items():
+                for provider in self._providers():
+                    pool = pools.setdefault(provider.name, deque())
+                    fresh = deque(item for item in pool if item[0] > now)
+                    self._stats['expired'] += len(pool) - len(fresh)
+                    pools[provider.name] = fresh
+                    if len(fresh) <= self.low_watermark:
+                        wanted.append((key, provider, self.size - len(fresh)))
+
+        fetched = 0
+        for (ad_format, user_country), provider, missing in wanted:
+            ads = []
+            for _ in range(missing):
+                ad = self._fetch(provider, ad_format, user_country)
+                if not ad:
+                    # No fill, error or open breaker: try again next round
+                    break
+                ads.append((time.monotonic() + self.ttl_seconds, dict(ad)))
+            if not ads:
+                continue
+            with self._lock:
+                pools = self._pools.get((ad_format, user_country))
+                if pools is None:
+                    continue  # evicted meanwhile
+                pool = pools.setdefault(provider.name, deque())
+                pool.extend(ads)
+                while len(pool) > self.size:
+                    pool.popleft()
+                self._stats['fetched'] += len(ads)
+            fetched += len(ads)
+
+        if fetched:
+            log.debug('ad_pool_refilled', ads=fetched, pools=len(self._pools))
+        return fetched
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._refill_loop, name='ad-inventory', daemon=True)
+            self._worker.start()
+
+    def _refill_loop(self):
+        while True:
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+            try:
+                self.refill()
+            except Exception as e:
+                log.error('ad_pool_refill_failed', error=str(e))
+
+    def stats(self):
+        """Hit/miss counters and current pool depths for this worker"""
+        with self._lock:
+            depths = {
+                f'{fmt}/{country}': {name: len(pool) for name, pool in pools.items()}
+                for (fmt, country), pools in self._pools.items()
+            }
+            return dict(self._stats, pools=depths)
@@ -1,577 +0,0 @@
-"""
-ad_providers_enhanced.py - Production-Ready Multi-Provider Ad Manager
-Supports real API integration with fallback to demo ads
-"""
-
-import requests
-import random
-import json
-from datetime import datetime
-from models import get_db
-from config import AdConfig
-
-class AdProvider:
-    """Base class for ad providers"""
-    def __init__(self, name, enabled=True):
-        self.name = name
-        self.enabled = enabled
-        self.timeout = AdConfig.REQUEST_TIMEOUT
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Override this in subclasses"""
-        raise NotImplementedError
-    
-    def track_impression(self, ad_id, user_id):
-        """Track when ad is shown"""
-        try:
-            conn = get_db()
-            conn.execute('''INSERT INTO ad_impressions 
-                           (provider, ad_id, user_id, timestamp, status) 
-                           VALUES (?, ?, ?, ?, ?)''',
-                        (self.name, ad_id, user_id, 
-                         datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'shown'))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error tracking impression: {e}")
-    
-    def track_completion(self, ad_id, user_id, watch_time):
-        """Track when ad is completed"""
-        try:
-            conn = get_db()
-            conn.execute('''UPDATE ad_impressions 
-                           SET status = ?, watch_time = ?, completed_at = ?
-                           WHERE provider = ? AND ad_id = ? AND user_id = ? 
-                           AND status = 'shown' ''',
-                        ('completed', watch_time, 
-                         datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                         self.name, ad_id, user_id))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error tracking completion: {e}")
-
-
-class GoogleAdMobProvider(AdProvider):
-    """Google AdMob - Real API Integration"""
-    def __init__(self):
-        super().__init__('admob', AdConfig.ADMOB_ENABLED)
-        self.api_key = AdConfig.ADMOB_API_KEY
-        self.app_id = AdConfig.ADMOB_APP_ID
-        # AdMob uses mediation, not direct REST API for serving ads
-        # This is a conceptual implementation
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from AdMob"""
-        if not self.enabled or not self.api_key:
-            print(f"[{self.name}] Not enabled or missing API key")
-            return None
-        
-        try:
-            # Note: AdMob typically uses SDK integration, not REST API
-            # For server-side, you'd use AdMob API for reporting/management
-            # This is a conceptual REST implementation
-            
-            print(f"[{self.name}] Fetching ad...")
-            
-            # In production, you'd integrate with AdMob SDK or use mediation
-            # For now, return None to test fallback
-            return None
-            
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class UnityAdsProvider(AdProvider):
-    """Unity Ads - Real API Integration"""
-    def __init__(self):
-        super().__init__('unity', AdConfig.UNITY_ENABLED)
-        self.game_id = AdConfig.UNITY_GAME_ID
-        self.api_key = AdConfig.UNITY_API_KEY
-        self.base_url = 'https://monetization.api.unity.com/v1'
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from Unity"""
-        if not self.enabled or not self.game_id:
-            print(f"[{self.name}] Not enabled or missing game ID")
-            return None
-        
-        try:
-            print(f"[{self.name}] Fetching ad...")
-            
-            # Unity Ads Mediation API
-            response = requests.post(
-                f'{self.base_url}/games/{self.game_id}/mediation/ads',
-                headers={
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'placement': 'rewardedVideo',
-                    'platform': 'android',
-                    'country': user_country
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                ad_data = response.json()
-                return {
-                    'provider': 'unity',
-                    'ad_id': ad_data.get('id', f'unity_{random.randint(1000, 9999)}'),
-                    'video_url': ad_data.get('video_url'),
-                    'title': ad_data.get('creative_name', 'Sponsored Content'),
-                    'advertiser': ad_data.get('advertiser', 'Unity Network'),
-                    'duration': ad_data.get('duration', duration),
-                    'reward': 5,
-                    'tracking_url': ad_data.get('tracking_url'),
-                    'image_url': ad_data.get('thumbnail_url', 
-                        'https://via.placeholder.com/400x300/FF6C00/FFF?text=Unity+Ads')
-                }
-            else:
-                print(f"[{self.name}] API returned {response.status_code}")
-                return None
-                
-        except requests.Timeout:
-            print(f"[{self.name}] Request timeout")
-            return None
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class FacebookAudienceNetworkProvider(AdProvider):
-    """Facebook Audience Network - Real API Integration"""
-    def __init__(self):
-        super().__init__('facebook', AdConfig.FACEBOOK_ENABLED)
-        self.placement_id = AdConfig.FACEBOOK_PLACEMENT_ID
-        self.api_key = AdConfig.FACEBOOK_API_KEY
-        self.base_url = 'https://graph.facebook.com/v18.0'
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from Facebook"""
-        if not self.enabled or not self.placement_id:
-            print(f"[{self.name}] Not enabled or missing placement ID")
-            return None
-        
-        try:
-            print(f"[{self.name}] Fetching ad...")
-            
-            # Facebook Audience Network API
-            response = requests.get(
-                f'{self.base_url}/network/{self.placement_id}/ad',
-                headers={'Authorization': f'Bearer {self.api_key}'},
-                params={
-                    'format': 'rewarded_video',
-                    'platform': 'android'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                ad_data = response.json()
-                return {
-                    'provider': 'facebook',
-                    'ad_id': ad_data.get('id', f'fb_{random.randint(1000, 9999)}'),
-                    'video_url': ad_data.get('video_url'),
-                    'title': ad_data.get('title', 'Sponsored'),
-                    'advertiser': ad_data.get('advertiser_name', 'Facebook Network'),
-                    'duration': ad_data.get('duration', duration),
-                    'reward': 5,
-                    'tracking_url': ad_data.get('impression_url'),
-                    'image_url': ad_data.get('image_url',
-                        'https://via.placeholder.com/400x300/1877F2/FFF?text=Facebook+Ads')
-                }
-            else:
-                print(f"[{self.name}] API returned {response.status_code}")
-                return None
-                
-        except requests.Timeout:
-            print(f"[{self.name}] Request timeout")
-            return None
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class SmaatoProvider(AdProvider):
-    """Smaato - Real API Integration (Great for African markets)"""
-    def __init__(self):
-        super().__init__('smaato', AdConfig.SMAATO_ENABLED)
-        self.publisher_id = AdConfig.SMAATO_PUBLISHER_ID
-        self.adspace_id = AdConfig.SMAATO_ADSPACE_ID
-        self.base_url = 'https://soma.smaato.net/oapi'
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from Smaato"""
-        if not self.enabled or not self.publisher_id:
-            print(f"[{self.name}] Not enabled or missing publisher ID")
-            return None
-        
-        try:
-            print(f"[{self.name}] Fetching ad...")
-            
-            # Smaato SOMA API
-            response = requests.post(
-                f'{self.base_url}/ad',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json'
-                },
-                json={
-                    'publisherId': self.publisher_id,
-                    'adSpaceId': self.adspace_id,
-                    'format': 'video',
-                    'device': {
-                        'os': 'android',
-                        'geo': {'country': user_country}
-                    }
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                ad_data = response.json()
-                return {
-                    'provider': 'smaato',
-                    'ad_id': ad_data.get('adId', f'smaato_{random.randint(1000, 9999)}'),
-                    'video_url': ad_data.get('videoUrl'),
-                    'title': ad_data.get('title', 'Sponsored Content'),
-                    'advertiser': ad_data.get('advertiser', 'Smaato Network'),
-                    'duration': ad_data.get('duration', duration),
-                    'reward': 5,
-                    'tracking_url': ad_data.get('impressionUrl'),
-                    'image_url': ad_data.get('imageUrl',
-                        'https://via.placeholder.com/400x300/00B8D4/FFF?text=Smaato')
-                }
-            else:
-                print(f"[{self.name}] API returned {response.status_code}")
-                return None
-                
-        except requests.Timeout:
-            print(f"[{self.name}] Request timeout")
-            return None
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class AppLovinProvider(AdProvider):
-    """AppLovin MAX - Real API Integration"""
-    def __init__(self):
-        super().__init__('applovin', AdConfig.APPLOVIN_ENABLED)
-        self.sdk_key = AdConfig.APPLOVIN_SDK_KEY
-        self.base_url = 'https://api.applovin.com/v1'
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from AppLovin"""
-        if not self.enabled or not self.sdk_key:
-            print(f"[{self.name}] Not enabled or missing SDK key")
-            return None
-        
-        try:
-            print(f"[{self.name}] Fetching ad...")
-            
-            # AppLovin typically uses SDK, but supports server-side
-            response = requests.post(
-                f'{self.base_url}/ad/load',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {self.sdk_key}'
-                },
-                json={
-                    'sdk_key': self.sdk_key,
-                    'ad_format': 'rewarded',
-                    'platform': 'android',
-                    'country_code': user_country
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                ad_data = response.json()
-                return {
-                    'provider': 'applovin',
-                    'ad_id': ad_data.get('ad_id', f'al_{random.randint(1000, 9999)}'),
-                    'video_url': ad_data.get('video_url'),
-                    'title': ad_data.get('title', 'Rewarded Video'),
-                    'advertiser': ad_data.get('advertiser', 'AppLovin'),
-                    'duration': ad_data.get('duration', duration),
-                    'reward': 5,
-                    'tracking_url': ad_data.get('impression_url'),
-                    'image_url': ad_data.get('image_url',
-                        'https://via.placeholder.com/400x300/2D6FF7/FFF?text=AppLovin')
-                }
-            else:
-                print(f"[{self.name}] API returned {response.status_code}")
-                return None
-                
-        except requests.Timeout:
-            print(f"[{self.name}] Request timeout")
-            return None
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class IronSourceProvider(AdProvider):
-    """ironSource - Real API Integration"""
-    def __init__(self):
-        super().__init__('ironsource', AdConfig.IRONSOURCE_ENABLED)
-        self.app_key = AdConfig.IRONSOURCE_APP_KEY
-        self.base_url = 'https://platform.ironsrc.com/partners/api/v1'
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Fetch ad from ironSource"""
-        if not self.enabled or not self.app_key:
-            print(f"[{self.name}] Not enabled or missing app key")
-            return None
-        
-        try:
-            print(f"[{self.name}] Fetching ad...")
-            
-            response = requests.post(
-                f'{self.base_url}/showAd',
-                headers={
-                    'Authorization': f'Bearer {self.app_key}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'appKey': self.app_key,
-                    'placementName': 'RewardedVideo',
-                    'platform': 'android',
-                    'country': user_country
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                ad_data = response.json()
-                return {
-                    'provider': 'ironsource',
-                    'ad_id': ad_data.get('instanceId', f'is_{random.randint(1000, 9999)}'),
-                    'video_url': ad_data.get('videoUrl'),
-                    'title': ad_data.get('adTitle', 'Rewarded Video'),
-                    'advertiser': ad_data.get('advertiser', 'ironSource'),
-                    'duration': ad_data.get('duration', duration),
-                    'reward': 5,
-                    'tracking_url': ad_data.get('impressionUrl'),
-                    'image_url': ad_data.get('imageUrl',
-                        'https://via.placeholder.com/400x300/FF5722/FFF?text=ironSource')
-                }
-            else:
-                print(f"[{self.name}] API returned {response.status_code}")
-                return None
-                
-        except requests.Timeout:
-            print(f"[{self.name}] Request timeout")
-            return None
-        except Exception as e:
-            print(f"[{self.name}] Fetch error: {e}")
-            return None
-
-
-class DemoAdProvider(AdProvider):
-    """Demo/Fallback ads - Always works for testing"""
-    def __init__(self):
-        super().__init__('demo', AdConfig.DEMO_ENABLED)
-        self.demo_ads = [
-            {
-                'provider': 'demo',
-                'ad_id': 'demo_mtn_001',
-                'video_url': 'https://via.placeholder.com/800x600/0066CC/FFF?text=MTN+Deal',
-                'title': 'MTN Mega Data Deal',
-                'advertiser': 'MTN South Africa',
-                'description': 'Get 50% more data on all recharges this month!',
-                'duration': 30,
-                'reward': 5,
-                'image_url': 'https://via.placeholder.com/400x300/0066CC/FFF?text=MTN'
-            },
-            {
-                'provider': 'demo',
-                'ad_id': 'demo_shoprite_001',
-                'video_url': 'https://via.placeholder.com/800x600/00AA00/FFF?text=Shoprite',
-                'title': 'Shoprite Fresh Specials',
-                'advertiser': 'Shoprite',
-                'description': 'Fresh produce at unbeatable prices all week!',
-                'duration': 20,
-                'reward': 5,
-                'image_url': 'https://via.placeholder.com/400x300/00AA00/FFF?text=Shoprite'
-            },
-            {
-                'provider': 'demo',
-                'ad_id': 'demo_nike_001',
-                'video_url': 'https://via.placeholder.com/800x600/000/FFF?text=Nike',
-                'title': 'Nike Back to School Sale',
-                'advertiser': 'Nike',
-                'description': 'Get ready for the new term with new gear!',
-                'duration': 45,
-                'reward': 10,
-                'image_url': 'https://via.placeholder.com/400x300/000/FFF?text=Nike'
-            },
-            {
-                'provider': 'demo',
-                'ad_id': 'demo_vodacom_001',
-                'video_url': 'https://via.placeholder.com/800x600/E60000/FFF?text=Vodacom',
-                'title': 'Vodacom LTE Upgrade',
-                'advertiser': 'Vodacom',
-                'description': 'Upgrade to unlimited LTE for less!',
-                'duration': 25,
-                'reward': 5,
-                'image_url': 'https://via.placeholder.com/400x300/E60000/FFF?text=Vodacom'
-            },
-            {
-                'provider': 'demo',
-                'ad_id': 'demo_checkers_001',
-                'video_url': 'https://via.placeholder.com/800x600/0066FF/FFF?text=Checkers',
-                'title': 'Checkers Little Shop',
-                'advertiser': 'Checkers',
-                'description': 'Collect miniatures with every purchase!',
-                'duration': 15,
-                'reward': 3,
-                'image_url': 'https://via.placeholder.com/400x300/0066FF/FFF?text=Checkers'
-            }
-        ]
-    
-    def fetch_ad(self, ad_type='video', duration=30, user_country='ZA'):
-        """Return random demo ad"""
-        if not self.enabled:
-            return None
-        print(f"[{self.name}] Returning demo ad")
-        return random.choice(self.demo_ads)
-
-
-class AdManager:
-    """Manages multiple ad providers with fallback and tracking"""
-    def __init__(self):
-        # Initialize all providers
-        self.providers = [
-            GoogleAdMobProvider(),
-            AppLovinProvider(),
-            UnityAdsProvider(),
-            FacebookAudienceNetworkProvider(),
-            IronSourceProvider(),
-            SmaatoProvider(),
-            DemoAdProvider()
-        ]
-        
-        self.provider_priority = AdConfig.PROVIDER_PRIORITY
-        self.fallback_to_demo = AdConfig.FALLBACK_TO_DEMO
-        
-        # Log enabled providers
-        enabled = [p.name for p in self.providers if p.enabled]
-        print(f"✓ Ad Manager initialized with providers: {', '.join(enabled)}")
-    
-    def get_ad(self, ad_type='video', duration=30, user_id=None, user_country='ZA'):
-        """
-        Fetch ad from providers in priority order with fallback
-        Returns ad data or None
-        """
-        # Sort providers by priority (enabled only)
-        sorted_providers = sorted(
-            [p for p in self.providers if p.enabled],
-            key=lambda p: self.provider_priority.get(p.name, 0),
-            reverse=True
-        )
-        
-        print(f"\n{'='*60}")
-        print(f"🎬 Fetching ad (type={ad_type}, duration={duration}s)")
-        print(f"{'='*60}")
-        
-        # Try each provider
-        for provider in sorted_providers:
-            # Skip demo unless it's the last resort
-            if provider.name == 'demo' and not self.fallback_to_demo:
-                if len(sorted_providers) > 1:
-                    continue
-            
-            print(f"→ Trying provider: {provider.name} (priority={self.provider_priority.get(provider.name, 0)})")
-            
-            ad_data = provider.fetch_ad(ad_type, duration, user_country)
-            
-            if ad_data:
-                print(f"✓ Ad fetched successfully from {provider.name}")
-                print(f"  Ad: {ad_data.get('title')} - {ad_data.get('advertiser')}")
-                print(f"  Reward: {ad_data.get('reward')} MIGP")
-                print(f"{'='*60}\n")
-                
-                # Track impression
-                if user_id:
-                    provider.track_impression(ad_data['ad_id'], user_id)
-                
-                # Add provider info
-                ad_data['provider_name'] = provider.name
-                return ad_data
-        
-        print(f"✗ No ads available from any provider")
-        print(f"{'='*60}\n")
-        return None
-    
-    def complete_ad(self, provider_name, ad_id, user_id, watch_time):
-        """Mark ad as completed and track"""
-        provider = next((p for p in self.providers if p.name == provider_name), None)
-        if provider:
-            provider.track_completion(ad_id, user_id, watch_time)
-            self.update_provider_stats(provider_name, completed=True)
-    
-    def update_provider_stats(self, provider_name, completed=False):
-        """Update provider performance stats"""
-        try:
-            conn = get_db()
-            
-            stats = conn.execute(
-                'SELECT * FROM provider_stats WHERE provider = ?',
-                (provider_name,)
-            ).fetchone()
-            
-            if stats:
-                if completed:
-                    conn.execute('''UPDATE provider_stats 
-                                   SET completions = completions + 1,
-                                       last_served = ?
-                                   WHERE provider = ?''',
-                               (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 
-                                provider_name))
-                else:
-                    conn.execute('''UPDATE provider_stats 
-                                   SET impressions = impressions + 1,
-                                       last_served = ?
-                                   WHERE provider = ?''',
-                               (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 
-                                provider_name))
-            else:
-                conn.execute('''INSERT INTO provider_stats 
-                               (provider, impressions, completions, last_served) 
-                               VALUES (?, ?, ?, ?)''',
-                            (provider_name, 1, 1 if completed else 0,
-                             datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error updating stats: {e}")
-    
-    def get_provider_stats(self):
-        """Get performance stats for all providers"""
-        try:
-            conn = get_db()
-            stats = conn.execute('''SELECT provider, impressions, completions, 
-                                           last_served,
-                                           ROUND(CAST(completions AS FLOAT) / 
-                                           NULLIF(impressions, 0) * 100, 2) as completion_rate
-                                   FROM provider_stats 
-                                   ORDER BY impressions DESC''').fetchall()
-            conn.close()
-            return stats
-        except Exception as e:
-            print(f"Error getting stats: {e}")
-            return []
-    
-    def get_enabled_providers(self):
-        """Get list of enabled providers"""
-        return [{'name': p.name, 'enabled': p.enabled} for p in self.providers]
-
-
-# Global ad manager instance
-ad_manager = AdManager()
@@ -0,0 +1,35 @@
+"""
+ad_templates.py - Precompiled, read-only ad creatives
+Providers used to rebuild embed markup, recompute rewards and assemble
+the ad dict on every fetch, and the demo provider edited its shared ad
+dicts in place. Each unit / zone / demo creative is now compiled once
+(when the provider is built, or by its reload_templates()) into an
+AdTemplate whose fields can't be modified. A fetch then just renders it:
+one dict copy plus the few per-request fields, so callers always get
+their own dict and never touch the shared template.
+"""
+
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple
+
+
+class AdTemplate(NamedTuple):
+    key: str
+    fields: Mapping[str, Any]   # read-only view, shared by every request
+
+    def render(self, **overlay):
+        """A fresh ad dict: the template's fields plus per-request overlay fields"""
+        ad = self.fields.copy()   # the proxy's copy() is a plain dict copy; dict(proxy) is ~15x slower
+        if overlay:
+            ad.update(overlay)
+        return ad
+
+
+def compile_template(key, fields):
+    """Freeze fields (copied) into an AdTemplate"""
+    return AdTemplate(key, MappingProxyType(dict(fields)))
+
+
+def compile_templates(definitions):
+    """Read-only {key: AdTemplate} from {key: fields}"""
+    return MappingProxyType({key: compile_template(key, fields) for key, fields in definitions.items()})
@@ -0,0 +1,210 @@
+"""
+admin_listings.py - Keyset-paginated, searchable admin listings
+Users and ads are listed a page at a time in any of a few whitelisted sort
+orders. Each sort order has a matching (column, id) index, so every page is
+an index range scan no matter how deep into the list it is.
+
+Search:
+    digits    -> phone prefix (pattern-ops index / the UNIQUE phone index)
+    otherwise -> name substring via pg_trgm on PostgreSQL, name prefix on
+                 SQLite or when the pg_trgm extension is unavailable
+"""
+
+import base64
+import json
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+from app_logging import get_logger
+
+log = get_logger(__name__, category='db')
+
+ADMIN_PAGE_SIZE = 50
+
+# sort key -> (column, direction); every entry has an index below
+USER_SORTS = {
+    'balance': ('u.balance', 'DESC'),
+    'newest': ('u.created_at', 'DESC'),
+    'name': ('u.name', 'ASC'),
+    'phone': ('u.phone', 'ASC')
+}
+
+AD_SORTS = {
+    'newest': ('a.id', 'DESC'),
+    'reward': ('a.reward', 'DESC'),
+    'title': ('a.title', 'ASC')
+}
+
+# Sort columns whose index uses a non-default collation; ORDER BY and the
+# keyset comparison must use the same one or the index can't be used
+SORT_COLLATIONS = {'u.name': 'NOCASE'} if USE_SQLITE else {}
+
+USER_FIELDS = ('id', 'phone', 'name', 'is_admin', 'balance', 'created_at', 'pending')
+AD_FIELDS = ('id', 'title', 'advertiser', 'reward', 'duration', 'type', 'provider')
+
+_trigram_available = None
+
+
+def init_admin_listing_indexes():
+    """Indexes behind each sort order and search mode"""
+    run_ddl(
+        sqlite_statements=[
+            "CREATE INDEX IF NOT EXISTS idx_users_balance_id ON users(balance DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_users_name_id ON users(name COLLATE NOCASE, id)",
+            "CREATE INDEX IF NOT EXISTS idx_ads_reward_id ON ads(reward DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_ads_title_id ON ads(title, id)"
+        ],
+        postgres_statements=[
+            "CREATE INDEX IF NOT EXISTS idx_users_balance_id ON users(balance DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_users_name_id ON users(name, id)",
+            "CREATE INDEX IF NOT EXISTS idx_users_phone_prefix ON users(phone varchar_pattern_ops)",
+            "CREATE INDEX IF NOT EXISTS idx_users_name_lower ON users(lower(name) text_pattern_ops)",
+            "CREATE INDEX IF NOT EXISTS idx_ads_reward_id ON ads(reward DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_ads_title_id ON ads(title, id)"
+        ]
+    )
+
+    if USE_SQLITE:
+        return
+
+    # pg_trgm needs CREATE privilege on the database; fall back to prefix search without it
+    try:
+        run_ddl([], [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON users USING gin (name gin_trgm_ops)"
+        ])
+    except Exception as e:
+        log.warning('trigram_index_unavailable', error=str(e))
+
+
+def trigram_available():
+    """True when substring name search can use pg_trgm (cached)"""
+    global _trigram_available
+    if USE_SQLITE:
+        return False
+    if _trigram_available is None:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_users_name_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+            cursor.close()
+    return _trigram_available
+
+
+# ============================================================================
+# CURSORS
+# ============================================================================
+
+def encode_cursor(sort_value, row_id):
+    """Opaque page cursor for the last row of a page"""
+    if hasattr(sort_value, 'isoformat'):
+        sort_value = sort_value.isoformat(sep=' ')
+    elif sort_value is not None and not isinstance(sort_value, (int, float, str)):
+        sort_value = float(sort_value)
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor_value):
+    """Reverse of encode_cursor(); returns (sort_value, id) or None if invalid"""
+    if not cursor_value:
+        return None
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _page(select_sql, where, params, sorts, sort, cursor_value, limit, fields):
+    """Run one keyset page; shared by the user and ad listings"""
+    sort = sort if sort in sorts else next(iter(sorts))
+    column, direction = sorts[sort]
+    id_column = column.split('.')[0] + '.id'
+    sort_expr = f"{column} COLLATE {SORT_COLLATIONS[column]}" if column in SORT_COLLATIONS else column
+    limit = max(1, min(int(limit), 200))
+
+    where = list(where)
+    params = list(params)
+    position = decode_cursor(cursor_value)
+    if position:
+        op = '<' if direction == 'DESC' else '>'
+        where.append(f"({sort_expr}, {id_column}) {op} (%s, %s)")
+        params.extend(position)
+
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort_expr} {direction}, {id_column} {direction} LIMIT %s"
+    params.append(limit + 1)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(sql), tuple(params))
+        rows = [{key: safe_row_access(row, key, i) for i, key in enumerate(fields)}
+                for row in cursor.fetchall()]
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        sort_field = column.split('.')[1]
+        next_cursor = encode_cursor(rows[-1][sort_field], rows[-1]['id'])
+    return rows, next_cursor, sort
+
+
+# ============================================================================
+# LISTINGS
+# ============================================================================
+
+def _user_search(term):
+    """WHERE clause + params for an admin search string"""
+    term = term.strip()
+    if term.isdigit():
+        if USE_SQLITE:
+            # Range form lets SQLite use the UNIQUE phone index
+            return ["u.phone >= %s AND u.phone < %s"], [term, term + '\uffff']
+        return ["u.phone LIKE %s"], [term + '%']
+
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    if trigram_available():
+        return ["u.name ILIKE %s"], ['%' + escaped + '%']
+    if USE_SQLITE:
+        return ["u.name LIKE %s ESCAPE '\\'"], [escaped + '%']
+    return ["lower(u.name) LIKE lower(%s)"], [escaped + '%']
+
+
+def list_users(sort='balance', cursor_value=None, search=None, limit=ADMIN_PAGE_SIZE):
+    """
+    One page of users for the admin panel
+
+    Ordering (and the cursor) uses the indexed materialized balance;
+    visible_balance adds pending deltas for display.
+
+    Returns:
+        (rows, next_cursor, applied_sort)
+    """
+    where, params = _user_search(search) if search and search.strip() else ([], [])
+    select_sql = """
+        SELECT u.id, u.phone, u.name, u.is_admin, u.balance, u.created_at,
+               COALESCE((SELECT SUM(d.amount) FROM balance_deltas d WHERE d.user_id = u.id), 0) as pending
+        FROM users u
+    """
+    rows, next_cursor, sort = _page(select_sql, where, params, USER_SORTS, sort, cursor_value, limit, USER_FIELDS)
+    for row in rows:
+        row['visible_balance'] = row['balance'] + row['pending']
+    return rows, next_cursor, sort
+
+
+def list_ads(sort='newest', cursor_value=None, search=None, limit=ADMIN_PAGE_SIZE):
+    """One page of ads for the admin panel. Returns (rows, next_cursor, applied_sort)."""
+    where, params = [], []
+    if search and search.strip():
+        where.append("a.title LIKE %s")
+        params.append(search.strip() + '%')
+    select_sql = """
+        SELECT a.id, a.title, a.advertiser, a.reward, a.duration, a.type, a.provider
+        FROM ads a
+    """
+    return _page(select_sql, where, params, AD_SORTS, sort, cursor_value, limit, AD_FIELDS)
@@ -0,0 +1,307 @@
+"""
+analytics.py - Hourly and daily activity rollups
+Impressions (ad_impressions), completions (watched_ads) and ledger activity
+(transactions) are folded into analytics_rollups, bucketed by hour and by
+day and split by provider, ad unit, country and reward type. Each source
+keeps a high-water mark, so a run only reads rows added since the last one.
+
+Dashboards read the rollups, never the raw tables: a 24-hour chart is 24
+rows per series, a 90-day chart 90.
+
+Usage:
+    python analytics.py            # one incremental pass
+    python analytics.py --loop     # every ROLLUP_INTERVAL_SECONDS
+
+Environment:
+    ROLLUP_INTERVAL_SECONDS=300
+    ROLLUP_SETTLE_SECONDS=60       leave rows younger than this for the next pass
+"""
+
+import os
+import sys
+import time
+from datetime import timedelta
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, ensure_columns, USE_SQLITE
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='db')
+
+ROLLUP_INTERVAL_SECONDS = int(os.getenv('ROLLUP_INTERVAL_SECONDS', '300'))
+ROLLUP_SETTLE_SECONDS = int(os.getenv('ROLLUP_SETTLE_SECONDS', '60'))
+
+GRANULARITIES = ('hour', 'day')
+
+# source table -> metric name and the expression for each dimension
+ROLLUP_SOURCES = {
+    'ad_impressions': {
+        'metric': 'impressions',
+        'provider': "COALESCE(provider, '')",
+        'ad_unit': "COALESCE(ad_id, '')",
+        'country': "''",
+        'reward_type': "''",
+        'amount': '0'
+    },
+    'watched_ads': {
+        'metric': 'completions',
+        'provider': "COALESCE(provider, '')",
+        'ad_unit': "COALESCE(ad_unit, '')",
+        'country': "COALESCE(country, '')",
+        'reward_type': "'earn'",
+        'amount': 'COALESCE(reward, 0)'
+    },
+    'transactions': {
+        'metric': 'ledger',
+        'provider': "''",
+        'ad_unit': "''",
+        'country': "''",
+        'reward_type': 'type',
+        'amount': 'amount'
+    }
+}
+
+DIMENSIONS = ('provider', 'ad_unit', 'country', 'reward_type')
+
+
+def init_analytics_tables():
+    """Create the rollup and watermark tables and the watched_ads dimensions"""
+    ensure_columns('watched_ads', {
+        'provider': 'VARCHAR(50)',
+        'ad_unit': 'VARCHAR(100)',
+        'country': 'VARCHAR(2)',
+        'reward': 'NUMERIC(10, 2)'
+    })
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS analytics_rollups (
+                granularity VARCHAR(4) NOT NULL,
+                metric VARCHAR(20) NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL DEFAULT '',
+                ad_unit VARCHAR(100) NOT NULL DEFAULT '',
+                country VARCHAR(2) NOT NULL DEFAULT '',
+                reward_type VARCHAR(20) NOT NULL DEFAULT '',
+                events INTEGER NOT NULL DEFAULT 0,
+                amount REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, metric, bucket_start, provider, ad_unit, country, reward_type)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                source VARCHAR(50) PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS analytics_rollups (
+                granularity VARCHAR(4) NOT NULL,
+                metric VARCHAR(20) NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL DEFAULT '',
+                ad_unit VARCHAR(100) NOT NULL DEFAULT '',
+                country VARCHAR(2) NOT NULL DEFAULT '',
+                reward_type VARCHAR(20) NOT NULL DEFAULT '',
+                events BIGINT NOT NULL DEFAULT 0,
+                amount NUMERIC(18, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, metric, bucket_start, provider, ad_unit, country, reward_type)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                source VARCHAR(50) PRIMARY KEY,
+                last_id BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]
+    )
+
+
+def _bucket_sql(granularity, column='timestamp'):
+    if USE_SQLITE:
+        fmt = '%Y-%m-%d %H:00:00' if granularity == 'hour' else '%Y-%m-%d 00:00:00'
+        return f"strftime('{fmt}', {column})"
+    return f"date_trunc('{granularity}', {column})"
+
+
+def _table_exists(cursor, table):
+    if USE_SQLITE:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL as present", (table,))
+    return bool(safe_row_access(cursor.fetchone(), 'present', 0))
+
+
+def _settled_max_id(cursor, table):
+    """Newest id old enough that no earlier id can still be uncommitted"""
+    if USE_SQLITE:
+        cursor.execute(
+            f"SELECT MAX(id) as max_id FROM {table} WHERE timestamp < datetime('now', ?)",
+            (f'-{ROLLUP_SETTLE_SECONDS} seconds',)
+        )
+    else:
+        cursor.execute(
+            f"SELECT MAX(id) as max_id FROM {table} WHERE timestamp < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (ROLLUP_SETTLE_SECONDS,)
+        )
+    return safe_row_access(cursor.fetchone(), 'max_id', 0) or 0
+
+
+def _get_watermark(cursor, source):
+    cursor.execute(convert_query('SELECT last_id FROM rollup_watermarks WHERE source = %s'), (source,))
+    row = cursor.fetchone()
+    return safe_row_access(row, 'last_id', 0) if row else 0
+
+
+# ============================================================================
+# ROLLUP
+# ============================================================================
+
+def roll_up_source(source):
+    """
+    Fold one source's new rows into the hourly and daily rollups
+
+    Rollup rows and the watermark are written in one transaction, so a
+    crash never double-counts. Returns how far the watermark advanced.
+    """
+    spec = ROLLUP_SOURCES[source]
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if not _table_exists(cursor, source):
+                return 0
+
+            last_id = _get_watermark(cursor, source)
+            high_water = _settled_max_id(cursor, source)
+            if high_water <= last_id:
+                return 0
+
+            for granularity in GRANULARITIES:
+                cursor.execute(convert_query(f"""
+                    INSERT INTO analytics_rollups
+                        (granularity, metric, bucket_start, provider, ad_unit, country, reward_type, events, amount)
+                    SELECT %s, %s, {_bucket_sql(granularity)},
+                           {spec['provider']}, {spec['ad_unit']}, {spec['country']}, {spec['reward_type']},
+                           COUNT(*), COALESCE(SUM({spec['amount']}), 0)
+                    FROM {source}
+                    WHERE id > %s AND id <= %s
+                    GROUP BY 3, 4, 5, 6, 7
+                    ON CONFLICT (granularity, metric, bucket_start, provider, ad_unit, country, reward_type)
+                    DO UPDATE SET events = analytics_rollups.events + excluded.events,
+                                  amount = analytics_rollups.amount + excluded.amount
+                """), (granularity, spec['metric'], last_id, high_water))
+
+            cursor.execute(convert_query("""
+                INSERT INTO rollup_watermarks (source, last_id, updated_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (source) DO UPDATE
+                SET last_id = excluded.last_id, updated_at = excluded.updated_at
+            """), (source, high_water))
+            conn.commit()
+            return high_water - last_id
+        finally:
+            cursor.close()
+
+
+def run_rollups():
+    """One incremental pass over every source"""
+    started = time.time()
+    folded = {source: roll_up_source(source) for source in ROLLUP_SOURCES}
+    log.info('rollups_updated', seconds=round(time.time() - started, 2), **folded)
+    return folded
+
+
+# ============================================================================
+# QUERIES (admin charts)
+# ============================================================================
+
+def _format_ts(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if USE_SQLITE else value
+
+
+def pick_granularity(start, end):
+    """Hourly up to a week, daily beyond - keeps every series to a few hundred points"""
+    return 'hour' if end - start <= timedelta(days=7) else 'day'
+
+
+def get_series(metric, start, end, granularity=None, reward_type=None):
+    """
+    Totals per bucket for one metric between start and end (UTC datetimes)
+
+    Returns:
+        list of dicts: bucket_start, events, amount
+    """
+    granularity = granularity or pick_granularity(start, end)
+    sql = """
+        SELECT bucket_start, SUM(events) as events, SUM(amount) as amount
+        FROM analytics_rollups
+        WHERE granularity = %s AND metric = %s
+          AND bucket_start >= %s AND bucket_start < %s
+    """
+    params = [granularity, metric, _format_ts(start), _format_ts(end)]
+    if reward_type:
+        sql += " AND reward_type = %s"
+        params.append(reward_type)
+    sql += " GROUP BY bucket_start ORDER BY bucket_start"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(sql), tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    return [{
+        'bucket_start': safe_row_access(row, 'bucket_start', 0),
+        'events': safe_row_access(row, 'events', 1) or 0,
+        'amount': float(safe_row_access(row, 'amount', 2) or 0)
+    } for row in rows]
+
+
+def get_breakdown(metric, dimension, start, end, limit=20):
+    """Totals for one metric grouped by a dimension, largest first"""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension: {dimension}")
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(f"""
+            SELECT {dimension} as label, SUM(events) as events, SUM(amount) as amount
+            FROM analytics_rollups
+            WHERE granularity = %s AND metric = %s
+              AND bucket_start >= %s AND bucket_start < %s
+            GROUP BY {dimension}
+            ORDER BY events DESC
+            LIMIT %s
+        """), (pick_granularity(start, end), metric, _format_ts(start), _format_ts(end), limit))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    return [{
+        'label': safe_row_access(row, 'label', 0) or '(none)',
+        'events': safe_row_access(row, 'events', 1) or 0,
+        'amount': float(safe_row_access(row, 'amount', 2) or 0)
+    } for row in rows]
+
+
+if __name__ == '__main__':
+    from models import init_db
+    init_db()
+
+    if '--loop' in sys.argv:
+        try:
+            while True:
+                run_rollups()
+                time.sleep(ROLLUP_INTERVAL_SECONDS)
+        except KeyboardInterrupt:
+            print("\nRollups stopped")
+    else:
+        folded = run_rollups()
+        for source, count in folded.items():
+            print(f"  {source}: advanced {count} id(s)")
@@ -43,12 +43,14 @@ from blueprints.auth import auth_bp
 from blueprints.main import main_bp
 from blueprints.wallet import wallet_bp
 from blueprints.admin import admin_bp
+from blueprints.api import api_bp
 from ad_providers_config import AdProvidersConfig
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(main_bp)
 app.register_blueprint(wallet_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(api_bp)
 
 @app.route('/')
 def index():
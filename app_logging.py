@@ -0,0 +1,228 @@
+"""
+app_logging.py - Structured, sampled, non-blocking logging
+Replaces print() on request hot paths. Records are handed to a bounded
+in-memory queue and written by a background listener thread, so a log call
+costs microseconds instead of a blocking stdout write.
+
+Usage:
+    from app_logging import get_logger
+    log = get_logger(__name__, category='ads')
+
+    log.debug('trying_provider', provider='demo')      # off by default
+    log.event('ad_served', provider='demo', reward=2)   # INFO, sampled per category
+    log.error('fetch_failed', provider='unity', error=str(e))
+
+Environment:
+    LOG_LEVEL=INFO                                    root level
+    LOG_LEVELS=adsterra_provider=DEBUG,models=WARNING  per-module levels
+    LOG_SAMPLING=ads=0.1,provider=0.05                 INFO sample rate per category
+    LOG_FORMAT=text|json
+    LOG_QUEUE_SIZE=10000                              records buffered before dropping
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Default INFO sample rates - chatty per-ad categories are thinned out,
+# anything involving money is always kept
+DEFAULT_SAMPLING = {
+    'ads': 0.1,
+    'provider': 0.1,
+    'tracking': 0.05,
+    'reward': 1.0,
+    'wallet': 1.0,
+    'db': 1.0
+}
+
+
+def _parse_pairs(raw):
+    """Parse 'a=1,b=2' into a dict of strings"""
+    pairs = {}
+    for item in (raw or '').split(','):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+SAMPLING = dict(DEFAULT_SAMPLING)
+SAMPLING.update({k: float(v) for k, v in _parse_pairs(os.getenv('LOG_SAMPLING')).items()})
+
+MODULE_LEVELS = {k: v.upper() for k, v in _parse_pairs(os.getenv('LOG_LEVELS')).items()}
+
+
+# ============================================================================
+# HANDLERS AND FORMATTERS
+# ============================================================================
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the caller's thread.
+    When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens in the listener thread; the record stays in-process
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders the message plus any structured fields as text or JSON"""
+
+    def __init__(self, fmt_type='text'):
+        super().__init__()
+        self.fmt_type = fmt_type
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        category = getattr(record, 'category', record.name)
+
+        if self.fmt_type == 'json':
+            payload = {
+                'ts': round(record.created, 3),
+                'level': record.levelname,
+                'logger': record.name,
+                'category': category,
+                'event': record.getMessage()
+            }
+            payload.update(fields)
+            if record.exc_info:
+                payload['exc'] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created))
+        line = f"{timestamp} {record.levelname:<7} [{category}] {record.getMessage()}"
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v!r}" if isinstance(v, str) and ' ' in v else f"{k}={v}"
+                                   for k, v in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+_configure_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+def configure_logging():
+    """Install the queue handler and start the writer thread (idempotent)"""
+    global _listener, _queue_handler
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_queue_handler)
+
+        for module, level in MODULE_LEVELS.items():
+            logging.getLogger(module).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+
+        import atexit
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_dropped_count():
+    """Records discarded because the queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+# ============================================================================
+# STRUCTURED LOGGER
+# ============================================================================
+
+class EventLogger:
+    """
+    Thin wrapper around logging.Logger that attaches a category and
+    keyword fields to each record. event() applies the category's INFO
+    sample rate; warnings and errors are never sampled.
+    """
+
+    def __init__(self, name, category):
+        self.logger = logging.getLogger(name)
+        self.category = category
+
+    def _log(self, level, event, fields, exc_info=False):
+        self.logger.log(level, event, exc_info=exc_info,
+                        extra={'category': self.category, 'fields': fields})
+
+    def event(self, event, **fields):
+        """INFO-level structured event, subject to category sampling"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        rate = SAMPLING.get(self.category, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        if rate < 1.0:
+            fields['sample_rate'] = rate
+        self._log(logging.INFO, event, fields)
+
+    def debug(self, event, **fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        """INFO-level event that is never sampled (startup, config changes)"""
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """ERROR with the current traceback attached"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name, category=None):
+    """Get a structured logger; the category defaults to the module name"""
+    configure_logging()
+    return EventLogger(name, category or name)
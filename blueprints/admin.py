@@ -1,6 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import get_db_connection
+from counters import get_counters
+from admin_listings import list_users, list_ads, USER_SORTS, AD_SORTS
+from analytics import get_series, get_breakdown
+from provider_metrics import get_provider_report
+from http_client import get_http_stats
+from pixel_dispatcher import get_pixel_stats
+from circuit_breaker import all_breaker_status
+from blueprints.main import ad_manager
+from fraud_scoring import get_flagged, set_review_status, REVIEW_STATUSES
+from bulk_adjust import bulk_adjust as run_bulk_adjust, BULK_TYPES, USER_FILTERS
+from datetime import datetime, timedelta
 from functools import wraps
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -24,42 +35,161 @@ def dashboard():
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
-        # Get total users
-        cursor.execute('SELECT COUNT(*) as count FROM users')
-        total_users = cursor.fetchone()['count']
-        
-        # Get total ad views
-        cursor.execute('SELECT COUNT(*) as count FROM watched_ads')
-        total_ad_views = cursor.fetchone()['count']
-        
-        # Get total earned
-        cursor.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total 
-            FROM transactions 
-            WHERE type = %s
-        """, ('earn',))
-        total_earned = cursor.fetchone()['total']
-        
-        # Get total spent
-        cursor.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total 
-            FROM transactions 
-            WHERE type = %s
-        """, ('spend',))
-        total_spent = cursor.fetchone()['total']
-        
-        # Get all users
-        cursor.execute('SELECT * FROM users ORDER BY balance DESC')
-        users = cursor.fetchall()
-        
-        # Get all ads
-        cursor.execute('SELECT * FROM ads')
-        ads = cursor.fetchall()
+        # Platform totals - maintained incrementally, see counters.py
+        counters = get_counters(cursor)
+        total_users = int(counters['users'])
+        total_ad_views = int(counters['ad_views'])
+        total_earned = counters['earned']
+        total_spent = counters['spent']
+    
+    # Top of each listing only - the full lists live on /admin/users and /admin/ads
+    users, _, _ = list_users(sort='balance', limit=10)
+    ads, _, _ = list_ads(sort='newest', limit=10)
+    
+    return render_template('admin/dashboard.html', 
+                         total_users=total_users, 
+                         total_ad_views=total_ad_views,
+                         total_earned=total_earned, 
+                         total_spent=total_spent, 
+                         users=users, 
+                         ads=ads)
+
+@admin_bp.route('/users')
+@login_required
+@admin_required
+def users():
+    """All users, keyset-paginated with ?sort=, ?q= and ?cursor="""
+    sort = request.args.get('sort', 'balance')
+    search = request.args.get('q', '').strip()
+    rows, next_cursor, sort = list_users(sort, request.args.get('cursor'), search)
+    
+    return render_template('admin/users.html',
+                         users=rows,
+                         next_cursor=next_cursor,
+                         sort=sort,
+                         sorts=USER_SORTS,
+                         search=search)
+
+@admin_bp.route('/ads')
+@login_required
+@admin_required
+def ads():
+    """All ads, keyset-paginated with ?sort=, ?q= and ?cursor="""
+    sort = request.args.get('sort', 'newest')
+    search = request.args.get('q', '').strip()
+    rows, next_cursor, sort = list_ads(sort, request.args.get('cursor'), search)
+    
+    return render_template('admin/ads.html',
+                         ads=rows,
+                         next_cursor=next_cursor,
+                         sort=sort,
+                         sorts=AD_SORTS,
+                         search=search)
+
+ANALYTICS_RANGES = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90)
+}
+
+@admin_bp.route('/analytics')
+@login_required
+@admin_required
+def analytics():
+    """Charts over the hourly/daily rollups (?range=24h|7d|30d|90d)"""
+    range_key = request.args.get('range', '7d')
+    if range_key not in ANALYTICS_RANGES:
+        range_key = '7d'
+    # Rollup buckets are UTC; end on the next hour so the current bucket is included
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - ANALYTICS_RANGES[range_key]
+    
+    series = {
+        'completions': get_series('completions', start, end),
+        'impressions': get_series('impressions', start, end),
+        'earned': get_series('ledger', start, end, reward_type='earn')
+    }
+    
+    return render_template('admin/analytics.html',
+                         range_key=range_key,
+                         ranges=ANALYTICS_RANGES,
+                         series=series,
+                         by_provider=get_breakdown('completions', 'provider', start, end),
+                         by_country=get_breakdown('completions', 'country', start, end),
+                         by_unit=get_breakdown('completions', 'ad_unit', start, end, limit=10))
+
+@admin_bp.route('/providers')
+@login_required
+@admin_required
+def providers():
+    """Ad network performance from the provider_metrics rollups (?hours=)"""
+    hours = request.args.get('hours', 24, type=int)
+    hours = max(1, min(hours, 24 * 30))
+    
+    return render_template('admin/providers.html',
+                         report=get_provider_report(hours),
+                         http_stats=get_http_stats(),
+                         pixel_stats=get_pixel_stats(),
+                         breakers=all_breaker_status(),
+                         pool=ad_manager.inventory.stats() if ad_manager.inventory else None,
+                         hours=hours)
+
+@admin_bp.route('/bulk-adjust', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_adjust():
+    """Credit or debit many users at once from a CSV upload or a user filter"""
+    result = None
+    stages = []
+    
+    if request.method == 'POST':
+        upload = request.files.get('csv')
+        csv_text = upload.read().decode('utf-8-sig') if upload and upload.filename else None
+        user_filter = request.form.get('filter', 'all')
+        if request.form.get('filter_value'):
+            user_filter += '=' + request.form['filter_value'].strip()
         
-        return render_template('admin/dashboard.html', 
-                             total_users=total_users, 
-                             total_ad_views=total_ad_views,
-                             total_earned=total_earned, 
-                             total_spent=total_spent, 
-                             users=users, 
-                             ads=ads)
+        result = run_bulk_adjust(
+            request.form.get('type', 'bonus'),
+            request.form.get('description', '').strip() or 'Bonus',
+            csv_text=csv_text,
+            user_filter=None if csv_text is not None else user_filter,
+            amount=request.form.get('amount', type=float),
+            dry_run=bool(request.form.get('dry_run')),
+            progress=lambda stage, **info: stages.append((stage, info))
+        )
+        if result.ok:
+            flash(f"{'Dry run: ' if request.form.get('dry_run') else ''}{result.users} user(s) adjusted "
+                  f"in {result.seconds}s", 'success')
+        else:
+            flash(f"Bulk adjustment failed: {result.reason.replace('_', ' ')} - nothing was changed", 'danger')
+    
+    return render_template('admin/bulk_adjust.html',
+                         result=result,
+                         stages=stages,
+                         types=BULK_TYPES,
+                         filters=USER_FILTERS)
+
+@admin_bp.route('/fraud', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def fraud():
+    """Review users flagged by the fraud scoring job"""
+    if request.method == 'POST':
+        user_id = request.form.get('user_id', type=int)
+        status = request.form.get('status', '')
+        if user_id and set_review_status(user_id, status):
+            flash(f'User {user_id} marked {status}', 'success')
+        else:
+            flash('Could not update review status', 'danger')
+        return redirect(url_for('admin.fraud', status=request.args.get('status', 'pending')))
+    
+    status = request.args.get('status', 'pending')
+    if status not in REVIEW_STATUSES:
+        status = 'pending'
+    
+    return render_template('admin/fraud.html',
+                         flagged=get_flagged(status),
+                         status=status,
+                         statuses=REVIEW_STATUSES)
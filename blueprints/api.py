@@ -0,0 +1,214 @@
+"""
+api.py - Lightweight versioned JSON API for mobile clients
+Compact JSON versions of the dashboard, ads, transactions and wallet catalog.
+
+Responses carry a strong ETag derived from the user's data version
+(latest transaction, latest watch, balance). Clients send it back in
+If-None-Match and get an empty 304 when nothing changed. /ads has no
+ETag: every call serves fresh ads with new impression ids. A ?fields=a,b
+query parameter trims responses down to the keys the client renders.
+"""
+
+from flask import Blueprint, jsonify, request, Response
+from flask_login import current_user
+from functools import wraps
+from datetime import datetime, date
+from decimal import Decimal
+import hashlib
+import json
+from models import get_db_connection, convert_query, safe_row_access
+from blueprints.main import ad_manager, get_dashboard_stats
+from blueprints.wallet import AIRTIME_PACKAGES, DATA_PACKAGES
+from history import fetch_transactions_page
+from redemptions import get_redemption
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def api_login_required(f):
+    """Like login_required, but answers 401 JSON instead of redirecting"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+
+def _json_value(value):
+    """Convert DB values to JSON-safe primitives"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _requested_fields():
+    """Parse ?fields=a,b,c into a set (None = everything)"""
+    raw = request.args.get('fields', '').strip()
+    if not raw:
+        return None
+    return {f.strip() for f in raw.split(',') if f.strip()}
+
+
+def _select_fields(data, fields):
+    """Keep only the requested keys of a dict"""
+    if fields is None:
+        return data
+    return {k: v for k, v in data.items() if k in fields}
+
+
+def get_data_version(cursor, user_id):
+    """
+    Cheap per-user version string: changes whenever the user earns,
+    spends or watches. Each part is a single index lookup.
+    """
+    cursor.execute(convert_query("""
+        SELECT u.balance + COALESCE((SELECT SUM(amount) FROM balance_deltas WHERE user_id = u.id), 0) as balance,
+               (SELECT MAX(id) FROM transactions WHERE user_id = %s) as last_txn,
+               (SELECT MAX(id) FROM watched_ads WHERE user_id = %s) as last_watch
+        FROM users u
+        WHERE u.id = %s
+    """), (user_id, user_id, user_id))
+    row = cursor.fetchone()
+    return '{}:{}:{}'.format(
+        safe_row_access(row, 'balance', 0),
+        safe_row_access(row, 'last_txn', 1),
+        safe_row_access(row, 'last_watch', 2)
+    )
+
+
+def _make_etag(*parts):
+    """Strong ETag over the endpoint, version and query string"""
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _not_modified(etag):
+    """True when the client already holds this representation"""
+    return request.if_none_match.contains(etag)
+
+
+def _json_response(payload, etag, max_age=0):
+    """Compact JSON response with ETag (if any) and private caching headers"""
+    body = json.dumps(payload, separators=(',', ':'), default=_json_value)
+    response = Response(body, mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+    if max_age:
+        response.headers['Cache-Control'] = f'private, max-age={max_age}'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified_response(etag, max_age=0):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={max_age}' if max_age else 'private, no-cache'
+    return response
+
+
+@api_bp.route('/dashboard')
+@api_login_required
+def dashboard():
+    """Balance and earning stats shown on the dashboard"""
+    fields = _requested_fields()
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Today's earnings roll over at midnight, so the date is part of the version
+        version = get_data_version(cursor, current_user.id)
+        etag = _make_etag('dashboard', version, date.today(), request.query_string)
+        if _not_modified(etag):
+            return _not_modified_response(etag)
+
+        user, today_earnings, earn_count, watched_count = get_dashboard_stats(cursor, current_user.id)
+
+    data = {
+        'balance': _json_value(safe_row_access(user, 'balance', 5)),
+        'today_earnings': _json_value(today_earnings),
+        'earn_count': earn_count,
+        'watched_count': watched_count,
+        'is_first_ad': today_earnings == 0
+    }
+    return _json_response(_select_fields(data, fields), etag)
+
+
+@api_bp.route('/ads')
+@api_login_required
+def ads():
+    """
+    Ads available to watch right now (?count=1..10, default 4)
+
+    Ads rotate and each carries a new impression_id, so there is nothing
+    stable to validate against: no ETag, and clients must not reuse it.
+    """
+    fields = _requested_fields()
+    count = max(1, min(request.args.get('count', 4, type=int), 10))
+
+    items = []
+    for i in range(count):
+        ad = ad_manager.get_ad(ad_format='native', user_id=current_user.id, user_country='ZA')
+        if ad:
+            item = dict(ad)
+            item['id'] = f'{item.get("provider", "ad")}_{i}'
+            items.append(_select_fields(item, fields))
+
+    return _json_response({'ads': items}, None)
+
+
+@api_bp.route('/transactions')
+@api_login_required
+def transactions():
+    """Transactions newest first, keyset-paginated via ?cursor="""
+    fields = _requested_fields()
+    limit = request.args.get('limit', 20, type=int)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        version = get_data_version(cursor, current_user.id)
+        etag = _make_etag('transactions', version, request.query_string)
+        if _not_modified(etag):
+            return _not_modified_response(etag)
+
+        rows, next_cursor = fetch_transactions_page(
+            current_user.id, request.args.get('cursor'), limit=limit, cursor=cursor
+        )
+
+    items = [_select_fields({k: _json_value(v) for k, v in row.items()}, fields) for row in rows]
+    return _json_response({'transactions': items, 'next_cursor': next_cursor}, etag)
+
+
+@api_bp.route('/redemptions/<int:redemption_id>')
+@api_login_required
+def redemption_status(redemption_id):
+    """Poll the fulfillment status of an airtime/data conversion"""
+    redemption = get_redemption(redemption_id, user_id=current_user.id)
+    if redemption is None:
+        return jsonify({'error': 'not found'}), 404
+
+    data = {k: _json_value(v) for k, v in redemption.items()}
+    etag = _make_etag('redemption', redemption_id, data['status'], data['attempts'], request.query_string)
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+    return _json_response(_select_fields(data, _requested_fields()), etag)
+
+
+# The catalog is static for the life of the process - hash it once
+_CATALOG = {'airtime': AIRTIME_PACKAGES, 'data': DATA_PACKAGES}
+_CATALOG_VERSION = _make_etag(json.dumps(_CATALOG, sort_keys=True))
+
+
+@api_bp.route('/wallet/catalog')
+@api_login_required
+def wallet_catalog():
+    """Airtime and data packages available for conversion"""
+    fields = _requested_fields()
+    etag = _make_etag('catalog', _CATALOG_VERSION, request.query_string)
+    if _not_modified(etag):
+        return _not_modified_response(etag, max_age=3600)
+    return _json_response(_select_fields(_CATALOG, fields), etag, max_age=3600)
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from models import User, get_db_connection, convert_query, safe_row_access
+from models import User, get_db_connection, convert_query, safe_row_access, USER_COLUMNS_SQL
 from forms import LoginForm, RegisterForm
+from ledger import credit
 from datetime import datetime, date
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -69,14 +70,8 @@ def login():
                 should_award, bonus_amount = check_daily_login_bonus(user.id, conn)
                 
                 if should_award:
-                    cursor = conn.cursor()
-                    cursor.execute(convert_query(
-                        'INSERT INTO transactions (user_id, type, amount, description) VALUES (%s, %s, %s, %s)'),
-                        (user.id, 'bonus', bonus_amount, 'Daily login bonus')
-                    )
-                    cursor.execute(convert_query('UPDATE users SET balance = balance + %s WHERE id = %s'), (bonus_amount, user.id))
+                    credit(user.id, bonus_amount, 'Daily login bonus', txn_type='bonus', conn=conn)
                     conn.commit()
-                    cursor.close()
                     flash(f'Welcome back! +{bonus_amount} MIGP daily bonus', 'success')
                 else:
                     flash('Welcome back!', 'success')
@@ -91,7 +86,7 @@ def login():
 def quick_login(phone):
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(convert_query('SELECT * FROM users WHERE phone = %s'), (phone,))
+        cursor.execute(convert_query(f'SELECT {USER_COLUMNS_SQL} FROM users u WHERE u.phone = %s'), (phone,))
         user_data = cursor.fetchone()
         cursor.close()
         
@@ -109,14 +104,8 @@ def quick_login(phone):
             should_award, bonus_amount = check_daily_login_bonus(user.id, conn)
             
             if should_award:
-                cursor = conn.cursor()
-                cursor.execute(convert_query(
-                    'INSERT INTO transactions (user_id, type, amount, description) VALUES (%s, %s, %s, %s)'),
-                    (user.id, 'bonus', bonus_amount, 'Daily login bonus')
-                )
-                cursor.execute(convert_query('UPDATE users SET balance = balance + %s WHERE id = %s'), (bonus_amount, user.id))
+                credit(user.id, bonus_amount, 'Daily login bonus', txn_type='bonus', conn=conn)
                 conn.commit()
-                cursor.close()
                 flash(f'Welcome back! +{bonus_amount} MIGP daily bonus', 'success')
             else:
                 flash('Welcome back!', 'success')
@@ -140,14 +129,8 @@ def register():
             
             # Give welcome bonus (bigger than daily login)
             with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(convert_query(
-                    'INSERT INTO transactions (user_id, type, amount, description) VALUES (%s, %s, %s, %s)'),
-                    (user.id, 'bonus', 50, 'Welcome bonus')
-                )
-                cursor.execute(convert_query('UPDATE users SET balance = balance + %s WHERE id = %s'), (50, user.id))
+                credit(user.id, 50, 'Welcome bonus', txn_type='bonus', conn=conn)
                 conn.commit()
-                cursor.close()
             
             flash('Welcome! +50 MIGP welcome bonus', 'success')
             return redirect(url_for('main.dashboard'))
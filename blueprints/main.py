@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request, Response, stream_with_context
 from flask_login import login_required, current_user
-from models import get_db_connection, convert_query, safe_row_access
+from models import get_db_connection, convert_query, safe_row_access, USER_COLUMNS_SQL
 from datetime import datetime, timedelta
 from adsterra_provider import AdManager
+from events import event_bus, stream_events, streams_supported, publish_balance, publish_cooldown
+from history import fetch_transactions_page
+from ledger import credit
+from counters import increment
+from provider_metrics import metrics as provider_metrics
+from fraud_scoring import client_fingerprint
+from app_logging import get_logger
 import os
 from dotenv import load_dotenv
 
@@ -16,6 +23,8 @@ ad_manager = AdManager(
 
 main_bp = Blueprint('main', __name__)
 
+log = get_logger(__name__, category='reward')
+
 
 def get_ad_cooldown_info(user_id, ad_id):
     """
@@ -53,6 +62,35 @@ def get_ad_cooldown_info(user_id, ad_id):
             return False, 0, safe_row_access(result, 'timestamp', 1)
 
 
+def get_dashboard_stats(cursor, user_id):
+    """
+    Load the user row plus dashboard counters in one query
+    Returns: (user_row, today_earnings, earn_count, watched_count)
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    
+    cursor.execute(convert_query(f"""
+        SELECT 
+            {USER_COLUMNS_SQL},
+            COALESCE(SUM(CASE WHEN t.type = 'earn' AND DATE(t.timestamp) = %s THEN t.amount ELSE 0 END), 0) as today_earnings,
+            COUNT(DISTINCT CASE WHEN t.type = 'earn' THEN t.id END) as earn_count,
+            COUNT(DISTINCT w.id) as watched_count
+        FROM users u
+        LEFT JOIN transactions t ON t.user_id = u.id
+        LEFT JOIN watched_ads w ON w.user_id = u.id
+        WHERE u.id = %s
+        GROUP BY u.id
+    """), (today, user_id))
+    
+    result = cursor.fetchone()
+    return (
+        result,
+        safe_row_access(result, 'today_earnings', 6),
+        safe_row_access(result, 'earn_count', 7),
+        safe_row_access(result, 'watched_count', 8)
+    )
+
+
 def calculate_ad_reward(ad_data, user_id):
     """Calculate dynamic reward based on ad type and user bonuses"""
     base_reward = float(ad_data['reward'])
@@ -126,27 +164,7 @@ def dashboard():
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        # Get user stats
-        cursor.execute(convert_query("""
-            SELECT 
-                u.*,
-                COALESCE(SUM(CASE WHEN t.type = 'earn' AND DATE(t.timestamp) = %s THEN t.amount ELSE 0 END), 0) as today_earnings,
-                COUNT(DISTINCT CASE WHEN t.type = 'earn' THEN t.id END) as earn_count,
-                COUNT(DISTINCT w.id) as watched_count
-            FROM users u
-            LEFT JOIN transactions t ON t.user_id = u.id
-            LEFT JOIN watched_ads w ON w.user_id = u.id
-            WHERE u.id = %s
-            GROUP BY u.id
-        """), (today, current_user.id))
-        
-        result = cursor.fetchone()
-        user = result
-        today_earnings = safe_row_access(result, 'today_earnings', 6)
-        earn_count = safe_row_access(result, 'earn_count', 7)
-        watched_count = safe_row_access(result, 'watched_count', 8)
+        user, today_earnings, earn_count, watched_count = get_dashboard_stats(cursor, current_user.id)
         is_first_ad = today_earnings == 0
         
         # Fetch fresh ads from Adsterra/Demo (not from database)
@@ -163,20 +181,12 @@ def dashboard():
                 ad_dict['cooldown_seconds'] = 0
                 ad_dict['last_watched'] = None
                 ads_with_cooldown.append(ad_dict)
-                print(f"✅ Added Adsterra ad {i}. Total ads: {len(ads_with_cooldown)}")
         
-        print(f"📊 Final ads list: {len(ads_with_cooldown)} ads")
-        for ad in ads_with_cooldown:
-            print(f"   - {ad.get('provider')} : {ad.get('title')}")
+        log.debug('dashboard_ads', user_id=current_user.id, count=len(ads_with_cooldown),
+                  providers=','.join(str(ad.get('provider')) for ad in ads_with_cooldown))
         
         # Get recent transactions
-        cursor.execute(convert_query("""
-            SELECT * FROM transactions 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT 10
-        """), (current_user.id,))
-        transactions = cursor.fetchall()
+        transactions, _ = fetch_transactions_page(current_user.id, limit=10, cursor=cursor)
         
         return render_template('main/dashboard.html', 
                              user=user, 
@@ -202,6 +212,31 @@ def check_cooldown(ad_id):
     })
 
 
+@main_bp.route('/events')
+@login_required
+def events():
+    """Server-Sent Events stream of balance and cooldown updates"""
+    if not streams_supported(request.environ):
+        # A stream would hold this single-threaded worker; 204 tells EventSource
+        # not to reconnect, and pages fall back to polling
+        return Response(status=204)
+    
+    sub = event_bus.subscribe(current_user.id)
+    if sub is None:
+        # Worker is at its connection limit - client falls back to polling
+        return Response('Too many live connections', status=503,
+                        headers={'Retry-After': '30'})
+    
+    return Response(
+        stream_with_context(stream_events(sub)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @main_bp.route('/watch_ad_page')
 @login_required
 def watch_ad_page():
@@ -218,10 +253,7 @@ def watch_ad():
         
         provider = data.get('provider', 'demo')
         
-        # Debug: log incoming ad data
-        print(f"\n📨 INCOMING AD DATA:")
-        print(f"   provider: {provider}")
-        print(f"   title: {data.get('title')}")
+        log.debug('watch_ad_request', user_id=current_user.id, provider=provider, title=data.get('title'))
         
         # Handle Adsterra and other ads
         ad = {
@@ -236,6 +268,7 @@ def watch_ad():
                 'format': data.get('format', 'native'),
                 'click_url': data.get('click_url'),
                 'impression_url': data.get('impression_url'),
+                'impression_id': data.get('impression_id'),
                 # Preserve Adsterra embed data
                 'is_embed': data.get('is_embed', False),
                 'embed_script': data.get('embed_script'),
@@ -286,7 +319,7 @@ def watch_ad():
             'provider': ad['provider']
         }
         
-        print(f"✅ ALLOWED: User {current_user.id} watching ad '{ad['title']}' from {ad['provider']}")
+        log.event('watch_started', user_id=current_user.id, title=ad['title'], provider=ad['provider'])
         
         return jsonify({
             'success': True,
@@ -295,9 +328,7 @@ def watch_ad():
         })
     
     except Exception as e:
-        print(f"❌ ERROR in watch_ad: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('watch_ad_failed', error=str(e))
         return jsonify({'error': str(e)}), 400
 
 
@@ -313,9 +344,16 @@ def complete_ad():
         ad_title = data.get('title', 'Ad')
         ad_reward = float(data.get('reward', 2.1))
         provider = data.get('provider', 'demo')
+        ad_unit = str(data.get('ad_unit') or '')[:100]
         watch_time = int(data.get('watch_time', 30))
+        # Served with the ad (ProviderManager._serve); identifies the ad_impressions row
+        impression_id = str(data.get('impression_id') or '')[:32] or None
+        # Set by Cloudflare in front of the app; used for analytics rollups
+        country = (request.headers.get('CF-IPCountry') or '')[:2].upper()
+        ip, user_agent = client_fingerprint(request)
         
-        print(f"📝 Completing ad: {ad_title} ({provider}) - Watch time: {watch_time}s")
+        log.debug('complete_ad_request', user_id=current_user.id, title=ad_title,
+                  provider=provider, watch_time=watch_time)
         
         # Calculate reward with bonuses
         base_reward = ad_reward
@@ -361,29 +399,37 @@ def complete_ad():
             
             # Record the watch (using ad_id as string since Adsterra ads have string IDs)
             cursor.execute(convert_query("""
-                INSERT INTO watched_ads (user_id, ad_id, timestamp) 
-                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                INSERT INTO watched_ads (user_id, ad_id, provider, ad_unit, country, reward, ip, user_agent, timestamp) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                 RETURNING id, timestamp
-            """), (current_user.id, str(ad_id)))
+            """), (current_user.id, str(ad_id), provider, ad_unit, country, total_reward, ip, user_agent))
             
             watch_record = cursor.fetchone()
+            increment(cursor, 'ad_views')
             
-            # Insert transaction
-            cursor.execute(convert_query("""
-                INSERT INTO transactions (user_id, type, amount, description) 
-                VALUES (%s, 'earn', %s, %s)
-            """), (current_user.id, total_reward, description))
-            
-            # Update balance
-            cursor.execute(convert_query("""
-                UPDATE users SET balance = balance + %s WHERE id = %s
-            """), (total_reward, current_user.id))
+            # Pay the reward (balance, transaction and ledger legs in one call)
+            result = credit(current_user.id, total_reward, description, conn=conn)
+            if not result.ok:
+                # Rewards under one MIGP round to nothing; don't keep an unpaid watch
+                conn.rollback()
+                log.warning('reward_rejected', user_id=current_user.id, provider=provider,
+                            reward=total_reward, reason=result.reason)
+                return jsonify({'success': False, 'error': 'Invalid reward'}), 400
+            new_balance = result.balance
             
             conn.commit()
         
+        provider_metrics.record_completion(provider, ad_manager.estimated_revenue(provider, ad_id))
+        ad_manager.record_completion(provider, str(ad_id), current_user.id)
+        ad_manager.complete_ad(provider, str(ad_id), current_user.id, watch_time, impression_id=impression_id)
+        
+        # Push the new balance and cooldown to any open dashboards
+        publish_balance(current_user.id, new_balance, delta=total_reward)
+        publish_cooldown(current_user.id, ad_id)
+        
         timestamp = safe_row_access(watch_record, 'timestamp', 1)
-        print(f"✅ COMPLETED: User {current_user.id} watched {provider} ad '{ad_title}' at {timestamp}")
-        print(f"   Reward: {total_reward} MIGP (Base: {base_reward}, Bonus: {bonus_amount})")
+        log.event('reward_paid', user_id=current_user.id, provider=provider, title=ad_title,
+                  watched_at=timestamp, reward=total_reward, base=base_reward, bonus=bonus_amount)
         
         response = {
             'success': True, 
@@ -400,7 +446,5 @@ def complete_ad():
         return jsonify(response)
     
     except Exception as e:
-        print(f"❌ ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('complete_ad_failed', error=str(e))
         return jsonify({'error': 'Failed to complete ad'}), 500
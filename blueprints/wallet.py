@@ -1,9 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, stream_with_context
 from flask_login import login_required, current_user
-from models import get_db_connection, convert_query, safe_row_access
+from models import get_db_connection, convert_query, safe_row_access, USER_COLUMNS_SQL
+from events import publish_balance
+from ledger import debit
+from redemptions import enqueue_redemption
+from history import fetch_transactions_page, export_csv, export_json
+from app_logging import get_logger
 
 wallet_bp = Blueprint('wallet', __name__, url_prefix='/wallet')
 
+log = get_logger(__name__, category='wallet')
+
 # Conversion rates
 AIRTIME_PACKAGES = [
     {'amount': 10, 'points': 100, 'type': 'airtime'},
@@ -29,98 +36,90 @@ def index():
         cursor = conn.cursor()
         
         # Get user info
-        cursor.execute(convert_query('SELECT * FROM users WHERE id = %s'), (current_user.id,))
+        cursor.execute(convert_query(f'SELECT {USER_COLUMNS_SQL} FROM users u WHERE u.id = %s'), (current_user.id,))
         user = cursor.fetchone()
         
-        # Get transactions
-        cursor.execute(convert_query("""
-            SELECT * FROM transactions 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT 20
-        """), (current_user.id,))
-        transactions = cursor.fetchall()
+        # Get transactions (keyset page - ?cursor= walks back through history)
+        transactions, next_cursor = fetch_transactions_page(
+            current_user.id,
+            request.args.get('cursor'),
+            limit=20,
+            cursor=cursor
+        )
         
         return render_template('wallet/wallet.html', 
                              user=user, 
                              transactions=transactions,
+                             next_cursor=next_cursor,
                              airtime_packages=AIRTIME_PACKAGES,
                              data_packages=DATA_PACKAGES)
 
-@wallet_bp.route('/convert/airtime', methods=['POST'])
+@wallet_bp.route('/export.<fmt>')
 @login_required
-def convert_airtime():
-    amount = int(request.form.get('amount', 0))
-    points_needed = amount * 10
+def export_history(fmt):
+    """Stream the user's full transaction history as CSV or JSON"""
+    if fmt == 'csv':
+        body, mimetype = export_csv(current_user.id), 'text/csv'
+    elif fmt == 'json':
+        body, mimetype = export_json(current_user.id), 'application/json'
+    else:
+        return 'Unsupported export format', 404
     
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=migp-transactions.{fmt}'}
+    )
+
+def _redeem(kind, product, points_needed, success_message, failure_event):
+    """
+    Debit the user and queue the fulfillment in one transaction.
+    The telco call happens in the redemption worker, so this stays fast
+    however slow the upstream is.
+    """
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get user balance
-            cursor.execute(convert_query('SELECT * FROM users WHERE id = %s'), (current_user.id,))
-            user = cursor.fetchone()
+            description = f'{kind.title()}: {product}'
+            result = debit(current_user.id, points_needed, description, conn=conn)
             
-            user_balance = safe_row_access(user, 'balance', 5)
-            user_phone = safe_row_access(user, 'phone', 1)
-            
-            if user_balance >= points_needed:
-                # Insert transaction
-                cursor.execute(convert_query("""
-                    INSERT INTO transactions (user_id, type, amount, description) 
-                    VALUES (%s, %s, %s, %s)
-                """), (current_user.id, 'spend', points_needed, f'Airtime: R{amount}'))
-                
-                # Update balance
-                cursor.execute(convert_query("""
-                    UPDATE users SET balance = balance - %s WHERE id = %s
-                """), (points_needed, current_user.id))
-                
+            if result.ok:
+                redemption_id = enqueue_redemption(conn, current_user.id, result.transaction_id,
+                                                   kind, product, points_needed, current_user.phone)
                 conn.commit()
-                flash(f'✅ R{amount} airtime sent to {user_phone}!', 'success')
+                publish_balance(current_user.id, result.balance, delta=-points_needed)
+                log.event('redemption_queued', user_id=current_user.id,
+                          redemption_id=redemption_id, kind=kind, product=product)
+                flash(success_message, 'success')
+            elif result.reason == 'insufficient_funds':
+                flash(f'❌ Insufficient balance. You need {points_needed} MIGP but only have {result.balance} MIGP', 'danger')
             else:
-                flash(f'❌ Insufficient balance. You need {points_needed} MIGP but only have {user_balance} MIGP', 'danger')
+                flash('❌ Invalid package selected.', 'danger')
     except Exception as e:
-        print(f"Error in convert_airtime: {e}")
+        log.exception(failure_event, user_id=current_user.id, error=str(e))
         flash('❌ Transaction failed. Please try again.', 'danger')
+
+@wallet_bp.route('/convert/airtime', methods=['POST'])
+@login_required
+def convert_airtime():
+    amount = request.form.get('amount', type=int)
     
+    # Price comes from the catalog, never from the submitted form
+    package = next((p for p in AIRTIME_PACKAGES if p['amount'] == amount), None)
+    points_needed = package['points'] if package else 0
+    
+    _redeem('airtime', f'R{amount}', points_needed,
+            f'✅ R{amount} airtime is on its way to {current_user.phone}!', 'convert_airtime_failed')
     return redirect(url_for('wallet.index'))
 
 @wallet_bp.route('/convert/data', methods=['POST'])
 @login_required
 def convert_data():
     data_amount = request.form.get('data_amount', '')
-    points_needed = int(request.form.get('points', 0))
     
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get user balance
-            cursor.execute(convert_query('SELECT * FROM users WHERE id = %s'), (current_user.id,))
-            user = cursor.fetchone()
-            
-            user_balance = safe_row_access(user, 'balance', 5)
-            user_phone = safe_row_access(user, 'phone', 1)
-            
-            if user_balance >= points_needed:
-                # Insert transaction
-                cursor.execute(convert_query("""
-                    INSERT INTO transactions (user_id, type, amount, description) 
-                    VALUES (%s, %s, %s, %s)
-                """), (current_user.id, 'spend', points_needed, f'Data: {data_amount}'))
-                
-                # Update balance
-                cursor.execute(convert_query("""
-                    UPDATE users SET balance = balance - %s WHERE id = %s
-                """), (points_needed, current_user.id))
-                
-                conn.commit()
-                flash(f'✅ {data_amount} data sent to {user_phone}!', 'success')
-            else:
-                flash(f'❌ Insufficient balance. You need {points_needed} MIGP but only have {user_balance} MIGP', 'danger')
-    except Exception as e:
-        print(f"Error in convert_data: {e}")
-        flash('❌ Transaction failed. Please try again.', 'danger')
+    # Price comes from the catalog, never from the submitted form
+    package = next((p for p in DATA_PACKAGES if p['amount'] == data_amount), None)
+    points_needed = package['points'] if package else 0
     
+    _redeem('data', data_amount, points_needed,
+            f'✅ {data_amount} data is on its way to {current_user.phone}!', 'convert_data_failed')
     return redirect(url_for('wallet.index'))
@@ -0,0 +1,381 @@
+"""
+bulk_adjust.py - Set-based bulk balance adjustments
+Credits (or debits) a cohort of users in one transaction: the targets are
+loaded into a temporary staging table - COPY from the CSV on PostgreSQL,
+INSERT ... SELECT for a user filter - and then applied with one UPDATE ...
+FROM, one INSERT ... SELECT into transactions and one into ledger_entries.
+Any failure, or a debit that would overdraw someone, rolls back everything.
+The target users' rows are locked before the funds check, and the UPDATE
+repeats the check, so a concurrent spend can't take anyone below zero.
+
+CSV format: a header row with 'phone' or 'user_id', and 'amount'.
+Negative amounts are posted as 'correction' debits. Amounts are rounded
+to whole MIGP like ledger.post(); NaN and infinity are rejected.
+
+Usage:
+    python bulk_adjust.py --csv promo.csv --type bonus --description "Heritage Day bonus"
+    python bulk_adjust.py --filter active_days=7 --amount 5 --type bonus --description "Weekly bonus"
+    add --dry-run to apply and roll back (validates and reports counts)
+"""
+
+import csv
+import io
+import math
+import sys
+import time
+from typing import NamedTuple, Optional
+from models import get_db_connection, convert_query, safe_row_access, USE_SQLITE
+from ledger import COUNTER_ACCOUNTS, USER_ACCOUNT, to_points
+from counters import TRANSACTION_COUNTERS, increment
+from app_logging import get_logger
+
+log = get_logger(__name__, category='wallet')
+
+# Credit types an admin can post in bulk; negative rows become 'correction'
+BULK_TYPES = ('bonus', 'adjustment')
+
+# Filter name -> WHERE clause over users u; {since} is "N days ago"
+USER_FILTERS = {
+    'all': None,
+    'joined_days': "u.created_at >= {since}",
+    'active_days': """EXISTS (SELECT 1 FROM watched_ads w
+                              WHERE w.user_id = u.id AND w.timestamp >= {since})""",
+    'min_balance': "u.balance >= %s"
+}
+
+
+class BulkResult(NamedTuple):
+    """Outcome of a bulk adjustment"""
+    ok: bool
+    users: int                      # users adjusted
+    credited: float                 # total MIGP added
+    debited: float                  # total MIGP removed
+    unmatched: int                  # CSV rows with no matching user
+    seconds: float
+    reason: Optional[str] = None    # 'no_targets', 'insufficient_funds', 'invalid_csv', ...
+
+
+def parse_filter(spec):
+    """'active_days=7' -> (where_sql, params); raises ValueError if invalid"""
+    name, _, raw = spec.partition('=')
+    if name not in USER_FILTERS:
+        raise ValueError(f"Unknown filter: {name}")
+    where = USER_FILTERS[name]
+    if where is None:
+        return "1 = 1", ()
+    if '{since}' in where:
+        since = ("datetime('now', '-' || %s || ' days')" if USE_SQLITE
+                 else "CURRENT_TIMESTAMP - make_interval(days => %s)")
+        return where.format(since=since), (int(raw),)
+    return where, (float(raw),)
+
+
+def _to_amount(raw):
+    """Signed whole MIGP (ledger.to_points); raises ValueError for NaN/infinity"""
+    value = float(raw)
+    if not math.isfinite(value):
+        raise ValueError(f"Amount is not a finite number: {raw}")
+    return to_points(value)
+
+
+def _parse_csv(text):
+    """Returns (key_column, [(key, amount), ...]); raises ValueError on bad input"""
+    reader = csv.DictReader(io.StringIO(text))
+    fields = [f.strip().lower() for f in reader.fieldnames or []]
+    reader.fieldnames = fields
+    key = 'user_id' if 'user_id' in fields else 'phone' if 'phone' in fields else None
+    if not key or 'amount' not in fields:
+        raise ValueError("CSV needs a 'phone' or 'user_id' column and an 'amount' column")
+
+    rows = []
+    for line, row in enumerate(reader, start=2):
+        try:
+            value = row[key].strip()
+            rows.append((int(value) if key == 'user_id' else value, _to_amount(row['amount'])))
+        except (TypeError, ValueError, AttributeError):
+            raise ValueError(f"Bad value on line {line}")
+    return key, rows
+
+
+def _stage(cursor, key, rows):
+    """Load CSV rows into bulk_staging (COPY on PostgreSQL)"""
+    column = 'user_id' if key == 'user_id' else 'phone'
+    if USE_SQLITE:
+        cursor.executemany(f"INSERT INTO bulk_staging ({column}, amount) VALUES (?, ?)", rows)
+        return
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY bulk_staging ({column}, amount) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _create_staging(cursor):
+    if USE_SQLITE:
+        cursor.execute("DROP TABLE IF EXISTS temp.bulk_staging")
+        cursor.execute("CREATE TEMP TABLE bulk_staging (user_id INTEGER, phone TEXT, amount REAL NOT NULL)")
+        cursor.execute("DROP TABLE IF EXISTS temp.bulk_targets")
+    else:
+        cursor.execute("""
+            CREATE TEMP TABLE bulk_staging (user_id INTEGER, phone TEXT, amount NUMERIC(14, 2) NOT NULL)
+            ON COMMIT DROP
+        """)
+
+
+# A debit target still covered by balance + pending deferred credits
+_FUNDED_SQL = """
+    (t.amount >= 0 OR {u}.balance + t.amount
+        + COALESCE((SELECT SUM(d.amount) FROM balance_deltas d WHERE d.user_id = {u}.id), 0) >= 0)
+"""
+
+# PostgreSQL: balances, transactions and both ledger legs in one statement.
+# updated < users means a debit target ran short; the caller rolls back.
+_APPLY_SQL_POSTGRES = """
+    WITH updated AS (
+        UPDATE users u
+        SET balance = u.balance + t.amount
+        FROM bulk_targets t
+        WHERE u.id = t.user_id AND """ + _FUNDED_SQL.format(u='u') + """
+        RETURNING u.id, u.balance
+    ), txn AS (
+        INSERT INTO transactions (user_id, type, amount, description)
+        SELECT t.user_id,
+               CASE WHEN t.amount < 0 THEN 'correction' ELSE %(type)s END,
+               ABS(t.amount), %(description)s
+        FROM bulk_targets t
+        ORDER BY t.user_id
+        RETURNING id, user_id, type, amount
+    ), legs AS (
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        SELECT txn.id, %(user_account)s, txn.user_id,
+               CASE WHEN txn.type = 'correction' THEN -txn.amount ELSE txn.amount END, updated.balance
+        FROM txn JOIN updated ON updated.id = txn.user_id
+        UNION ALL
+        SELECT txn.id,
+               CASE WHEN txn.type = 'correction' THEN %(debit_account)s ELSE %(counter_account)s END,
+               NULL, CASE WHEN txn.type = 'correction' THEN txn.amount ELSE -txn.amount END, NULL
+        FROM txn
+    )
+    SELECT COUNT(*) AS users, (SELECT COUNT(*) FROM updated) AS updated FROM txn
+"""
+
+
+def _apply_sqlite(cursor, txn_type, description, users):
+    """Returns (users updated, transactions posted); nothing is posted if a target ran short"""
+    cursor.execute("""
+        UPDATE users SET balance = users.balance + t.amount
+        FROM bulk_targets t WHERE users.id = t.user_id AND """ + _FUNDED_SQL.format(u='users') + """
+        RETURNING users.id, users.balance
+    """)
+    balances = dict(cursor.fetchall())
+    if len(balances) != users:
+        return len(balances), 0
+
+    cursor.execute("""
+        INSERT INTO transactions (user_id, type, amount, description)
+        SELECT user_id, CASE WHEN amount < 0 THEN 'correction' ELSE ? END, ABS(amount), ?
+        FROM bulk_targets ORDER BY user_id
+        RETURNING id, user_id, type, amount
+    """, (txn_type, description))
+    legs = []
+    for transaction_id, user_id, row_type, amount in cursor.fetchall():
+        delta = -amount if row_type == 'correction' else amount
+        legs.append((transaction_id, USER_ACCOUNT, user_id, delta, balances[user_id]))
+        legs.append((transaction_id, COUNTER_ACCOUNTS.get(row_type, 'adjustments'), None, -delta, None))
+    cursor.executemany("""
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        VALUES (?, ?, ?, ?, ?)
+    """, legs)
+    return len(balances), len(legs) // 2
+
+
+def bulk_adjust(txn_type, description, csv_text=None, user_filter=None, amount=None,
+                dry_run=False, progress=None):
+    """
+    Apply one adjustment to many users atomically
+
+    Args:
+        txn_type: One of BULK_TYPES, used for positive amounts
+        description: Transaction description shown in each user's history
+        csv_text: CSV contents (see module docstring), or
+        user_filter: A USER_FILTERS spec like 'active_days=7' together with
+        amount: MIGP per matched user (negative to debit), rounded to whole MIGP
+        dry_run: Apply everything, report the counts, then roll back
+        progress: Optional callable(stage, **info) for reporting
+
+    Returns:
+        BulkResult
+    """
+    started = time.time()
+    report = progress or (lambda stage, **info: None)
+
+    def done(ok, users=0, credited=0.0, debited=0.0, unmatched=0, reason=None):
+        result = BulkResult(ok, users, float(credited or 0), float(debited or 0), unmatched,
+                            round(time.time() - started, 2), reason)
+        log.info('bulk_adjust_finished', type=txn_type, ok=ok, users=users, credited=result.credited,
+                 debited=result.debited, unmatched=unmatched, dry_run=dry_run,
+                 seconds=result.seconds, reason=reason)
+        return result
+
+    if txn_type not in BULK_TYPES:
+        return done(False, reason='invalid_type')
+
+    try:
+        if csv_text is not None:
+            key, rows = _parse_csv(csv_text)
+            if not rows:
+                return done(False, reason='no_targets')
+        else:
+            where, params = parse_filter(user_filter or '')
+            amount = to_points(amount) if amount is not None and math.isfinite(amount) else 0
+            if not amount:
+                return done(False, reason='invalid_amount')
+    except ValueError as e:
+        log.warning('bulk_adjust_rejected', error=str(e))
+        return done(False, reason='invalid_csv' if csv_text is not None else 'invalid_filter')
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _create_staging(cursor)
+            if csv_text is not None:
+                _stage(cursor, key, rows)
+                staged = len(rows)
+            else:
+                cursor.execute(convert_query(f"""
+                    INSERT INTO bulk_staging (user_id, amount)
+                    SELECT u.id, %s FROM users u WHERE {where}
+                """), (amount,) + tuple(params))
+                staged = cursor.rowcount
+            report('staged', rows=staged)
+
+            # Resolve phones to ids, then merge duplicate rows per user and drop zero totals
+            cursor.execute("""
+                UPDATE bulk_staging SET user_id = (SELECT u.id FROM users u WHERE u.phone = bulk_staging.phone)
+                WHERE user_id IS NULL
+            """)
+            cursor.execute("""
+                CREATE TEMP TABLE bulk_targets {on_commit} AS
+                SELECT u.id AS user_id, SUM(s.amount) AS amount
+                FROM bulk_staging s
+                JOIN users u ON u.id = s.user_id
+                GROUP BY u.id
+                HAVING SUM(s.amount) <> 0
+            """.format(on_commit='' if USE_SQLITE else 'ON COMMIT DROP'))
+            if not USE_SQLITE:
+                cursor.execute("ANALYZE bulk_targets")
+            cursor.execute("""
+                SELECT COUNT(*) AS users,
+                       COALESCE(SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END), 0) AS credited,
+                       COALESCE(SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END), 0) AS debited
+                FROM bulk_targets
+            """)
+            row = cursor.fetchone()
+            users = safe_row_access(row, 'users', 0)
+            credited = safe_row_access(row, 'credited', 1)
+            debited = safe_row_access(row, 'debited', 2)
+
+            cursor.execute("""
+                SELECT COUNT(*) AS unmatched FROM bulk_staging s
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.user_id)
+            """)
+            unmatched = safe_row_access(cursor.fetchone(), 'unmatched', 0)
+            report('resolved', users=users, unmatched=unmatched)
+
+            if not users:
+                conn.rollback()
+                return done(False, unmatched=unmatched, reason='no_targets')
+
+            # Lock the targets (in id order, so two runs can't deadlock) before
+            # checking funds. SQLite has a single writer and needs no row locks.
+            if not USE_SQLITE:
+                cursor.execute("""
+                    SELECT u.id FROM users u
+                    JOIN bulk_targets t ON t.user_id = u.id
+                    ORDER BY u.id
+                    FOR UPDATE OF u
+                """)
+
+            # A debit may not overdraw anyone (pending deferred credits count)
+            cursor.execute("""
+                SELECT COUNT(*) AS short FROM bulk_targets t
+                JOIN users u ON u.id = t.user_id
+                WHERE t.amount < 0
+                  AND u.balance + t.amount
+                      + COALESCE((SELECT SUM(d.amount) FROM balance_deltas d WHERE d.user_id = u.id), 0) < 0
+            """)
+            if safe_row_access(cursor.fetchone(), 'short', 0):
+                conn.rollback()
+                return done(False, users, credited, debited, unmatched, reason='insufficient_funds')
+
+            if USE_SQLITE:
+                updated, posted = _apply_sqlite(cursor, txn_type, description, users)
+            else:
+                cursor.execute(_APPLY_SQL_POSTGRES, {
+                    'type': txn_type,
+                    'description': description,
+                    'user_account': USER_ACCOUNT,
+                    'counter_account': COUNTER_ACCOUNTS.get(txn_type, 'adjustments'),
+                    'debit_account': COUNTER_ACCOUNTS['correction']
+                })
+                row = cursor.fetchone()
+                posted = safe_row_access(row, 'users', 0)
+                updated = safe_row_access(row, 'updated', 1)
+            if updated != users:
+                # The UPDATE's own funds check skipped someone the check above let through
+                conn.rollback()
+                return done(False, users, credited, debited, unmatched, reason='insufficient_funds')
+            report('posted', transactions=posted)
+
+            for counted_type, total in ((txn_type, credited), ('correction', debited)):
+                if total and TRANSACTION_COUNTERS.get(counted_type):
+                    increment(cursor, TRANSACTION_COUNTERS[counted_type], total)
+
+            if dry_run:
+                conn.rollback()
+                report('rolled_back')
+            else:
+                conn.commit()
+                report('committed')
+        except Exception as e:
+            conn.rollback()
+            log.exception('bulk_adjust_failed', type=txn_type, error=str(e))
+            return done(False, reason='error')
+        finally:
+            if USE_SQLITE:
+                cursor.execute("DROP TABLE IF EXISTS temp.bulk_staging")
+                cursor.execute("DROP TABLE IF EXISTS temp.bulk_targets")
+            cursor.close()
+
+    return done(True, users, credited, debited, unmatched)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bulk balance adjustment')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help='CSV file with phone|user_id,amount')
+    source.add_argument('--filter', help=f"User filter: {', '.join(USER_FILTERS)} (e.g. active_days=7)")
+    parser.add_argument('--amount', type=float, help='MIGP per user (with --filter)')
+    parser.add_argument('--type', default='bonus', choices=BULK_TYPES)
+    parser.add_argument('--description', required=True)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    from models import init_db
+    init_db()
+
+    csv_text = open(args.csv, encoding='utf-8').read() if args.csv else None
+
+    def print_progress(stage, **info):
+        details = ' '.join(f"{k}={v}" for k, v in info.items())
+        print(f"  {stage} {details}")
+
+    result = bulk_adjust(args.type, args.description, csv_text=csv_text, user_filter=args.filter,
+                         amount=args.amount, dry_run=args.dry_run, progress=print_progress)
+    if not result.ok:
+        print(f"✗ Failed: {result.reason}")
+        sys.exit(1)
+    print(f"✓ {result.users} user(s), +{result.credited} / -{result.debited} MIGP, "
+          f"{result.unmatched} unmatched, {result.seconds}s" + (" (dry run)" if args.dry_run else ""))
@@ -0,0 +1,246 @@
+"""
+circuit_breaker.py - Per-provider circuit breakers
+Each ad provider gets a breaker that watches its recent calls. When too many
+of them fail or are slow, the breaker opens and the ad managers skip that
+provider without calling it, so an outage costs no latency after the first
+few failures.
+
+    closed     calls flow; outcomes are recorded in a rolling window
+    open       calls are skipped; after BREAKER_OPEN_SECONDS a background
+               probe calls the provider once
+    half_open  the probe is running; user traffic is still skipped
+               (without a probe function one user call is let through).
+               Outcomes of calls that were already in flight are ignored:
+               only the probe or trial call decides
+
+A successful probe closes the breaker. A failed probe reopens it with the
+open period doubled, up to BREAKER_MAX_OPEN_SECONDS.
+
+Providers swallow no-fills but raise ProviderError when the network could
+not be reached or answered with a server error, so a fast 5xx, a refused
+connection or a DNS failure counts as a failure too.
+
+Environment:
+    BREAKER_WINDOW_SECONDS=60
+    BREAKER_MIN_CALLS=5          calls in the window before the breaker can trip
+    BREAKER_ERROR_RATE=0.5       failed share that trips it
+    BREAKER_SLOW_SECONDS=2       calls slower than this count as slow
+    BREAKER_SLOW_RATE=0.8        slow share that trips it
+    BREAKER_OPEN_SECONDS=15
+    BREAKER_MAX_OPEN_SECONDS=300
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='provider')
+
+BREAKER_WINDOW_SECONDS = float(os.getenv('BREAKER_WINDOW_SECONDS', '60'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_SLOW_SECONDS = float(os.getenv('BREAKER_SLOW_SECONDS', '2'))
+BREAKER_SLOW_RATE = float(os.getenv('BREAKER_SLOW_RATE', '0.8'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '15'))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv('BREAKER_MAX_OPEN_SECONDS', '300'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Rolling error-rate / latency breaker for one provider"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._calls = deque()           # (timestamp, failed, slow)
+        self._opened_at = 0.0
+        self._open_seconds = BREAKER_OPEN_SECONDS
+        self._probe = None
+        self._trial = None              # thread making the half-open trial call (no probe)
+        self._trips = 0
+
+    def set_probe(self, probe):
+        """probe() -> True if the provider is healthy; run in a background thread"""
+        self._probe = probe
+
+    def allow(self):
+        """True if a user request may call the provider now (never blocks)"""
+        if self.state == CLOSED:
+            return True
+
+        start_probe = False
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self._open_seconds:
+                self.state = HALF_OPEN
+                if self._probe is None:
+                    # No probe function: this caller is the trial request
+                    self._trial = threading.get_ident()
+                    return True
+                start_probe = True
+
+        if start_probe:
+            threading.Thread(target=self._run_probe, name=f'breaker-probe-{self.name}', daemon=True).start()
+        return False
+
+    def record(self, failed, elapsed):
+        """Outcome of one call: failed = error or timeout, elapsed in seconds"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if self._trial != threading.get_ident():
+                    # Started before the breaker opened; the probe / trial decides
+                    return
+                # The trial request of a probe-less breaker
+                self._trial = None
+                if failed:
+                    self._reopen()
+                else:
+                    self._close()
+                return
+
+            self._calls.append((now, failed, elapsed >= BREAKER_SLOW_SECONDS))
+            while self._calls and now - self._calls[0][0] > BREAKER_WINDOW_SECONDS:
+                self._calls.popleft()
+
+            if self.state != CLOSED or len(self._calls) < BREAKER_MIN_CALLS:
+                return
+            total = len(self._calls)
+            error_rate = sum(1 for c in self._calls if c[1]) / total
+            slow_rate = sum(1 for c in self._calls if c[2]) / total
+            if error_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_RATE:
+                self._trips += 1
+                self._open_seconds = BREAKER_OPEN_SECONDS
+                self._open(error_rate=round(error_rate, 2), slow_rate=round(slow_rate, 2))
+
+    def _run_probe(self):
+        try:
+            healthy = bool(self._probe())
+        except Exception as e:
+            log.debug('breaker_probe_error', provider=self.name, error=str(e))
+            healthy = False
+        with self._lock:
+            if healthy:
+                self._close()
+            else:
+                self._reopen()
+
+    def _open(self, **why):
+        """Caller holds the lock"""
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        log.warning('breaker_opened', provider=self.name, open_seconds=self._open_seconds, **why)
+
+    def _reopen(self):
+        self._open_seconds = min(self._open_seconds * 2, BREAKER_MAX_OPEN_SECONDS)
+        self._open(reason='probe_failed')
+
+    def _close(self):
+        self.state = CLOSED
+        self._calls.clear()
+        self._open_seconds = BREAKER_OPEN_SECONDS
+        log.info('breaker_closed', provider=self.name)
+
+    def status(self):
+        with self._lock:
+            calls = len(self._calls)
+            failed = sum(1 for c in self._calls if c[1])
+            retry_in = (max(0.0, self._open_seconds - (time.monotonic() - self._opened_at))
+                        if self.state == OPEN else None)
+        return {
+            'provider': self.name,
+            'state': self.state,
+            'calls': calls,
+            'error_rate': round(failed / calls, 2) if calls else None,
+            'trips': self._trips,
+            'retry_in': round(retry_in, 1) if retry_in is not None else None
+        }
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for a provider name"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def all_breaker_status():
+    """Status of every breaker in this worker, for the admin provider page"""
+    return [breaker.status() for _, breaker in sorted(_breakers.items())]
+
+
+class ProviderError(Exception):
+    """The provider could not be reached or answered with a server error"""
+
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+
+
+class FetchOutcome(NamedTuple):
+    """Result of a fetch made through a breaker"""
+    ad: Optional[dict]
+    elapsed: float          # seconds; 0 when skipped
+    error: bool             # fetch raised (other than a timeout)
+    timed_out: bool         # request timed out, or no fill after using the whole timeout
+    skipped: bool           # breaker open, provider not called
+
+
+def guarded_fetch(provider, fetch, timeout=None):
+    """
+    Call fetch() through the provider's breaker; never raises
+
+    An exception (ProviderError included) or an empty response after the
+    whole timeout counts as a failure; an empty response (no fill) before
+    that does not.
+    """
+    breaker = get_breaker(provider.name)
+    if not breaker.allow():
+        log.debug('breaker_skip', provider=provider.name, state=breaker.state)
+        return FetchOutcome(None, 0.0, False, False, True)
+
+    timeout = timeout if timeout is not None else getattr(provider, 'timeout', None)
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        ad_data = fetch()
+        error = False
+    except ProviderError as e:
+        log.warning('provider_unavailable', provider=provider.name, error=str(e))
+        ad_data, error, timed_out = None, not e.timed_out, e.timed_out
+    except Exception as e:
+        log.error('fetch_failed', provider=provider.name, error=str(e))
+        ad_data, error = None, True
+    elapsed = time.perf_counter() - started
+    if not ad_data and not error and timeout is not None and elapsed >= timeout:
+        timed_out = True
+    breaker.record(error or timed_out, elapsed)
+    return FetchOutcome(ad_data, elapsed, error, timed_out, False)
+
+
+def make_probe(fetch, timeout):
+    """
+    Probe for set_probe(): healthy if fetch() returns inside the timeout.
+    A ProviderError (unreachable, 5xx) or any other exception is unhealthy;
+    a no-fill answer is healthy - the network is up, it just had no ad.
+    """
+    def probe():
+        started = time.perf_counter()
+        fetch()
+        return time.perf_counter() - started < timeout
+    return probe
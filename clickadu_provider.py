@@ -3,10 +3,11 @@ clickadu_provider.py - Clickadu Integration
 Provides Clickadu native ads and banners
 """
 
-import requests
 import json
 from datetime import datetime
 from config_clickadu import ClickaduConfig
+from http_client import http_get
+from ad_templates import compile_templates
 
 class ClickaduProvider:
     """Clickadu ad provider integration"""
@@ -15,6 +16,22 @@ class ClickaduProvider:
         self.api_token = ClickaduConfig.API_TOKEN
         self.zones = ClickaduConfig.ZONES
         self.script_url = ClickaduConfig.SCRIPT_URL
+        self.reload_templates()
+    
+    def reload_templates(self):
+        """Build each zone's ad code once; call again after changing ZONES or SCRIPT_URL"""
+        self.templates = compile_templates({
+            placement: {
+                'success': True,
+                'zone_id': zone['zone_id'],
+                'placement': placement,
+                'format': zone['format'],
+                'html': self._generate_html(zone['zone_id']),
+                'script': self._generate_script_tag(zone['zone_id']),
+                'ecpm': zone['ecpm']
+            }
+            for placement, zone in self.zones.items()
+        })
     
     def get_ad_code(self, placement='dashboard_top'):
         """
@@ -26,36 +43,15 @@ class ClickaduProvider:
         Returns:
             dict with ad code and metadata
         """
-        zone_config = ClickaduConfig.get_zone(placement)
+        template = self.templates.get(placement)
         
-        if not zone_config:
+        if not template:
             return {
                 'success': False,
                 'error': f'Invalid placement: {placement}'
             }
         
-        try:
-            zone_id = zone_config['zone_id']
-            
-            # Generate the ad container HTML
-            ad_code = {
-                'success': True,
-                'zone_id': zone_id,
-                'placement': placement,
-                'format': zone_config['format'],
-                'html': self._generate_html(zone_id),
-                'script': self._generate_script_tag(zone_id),
-                'ecpm': zone_config['ecpm'],
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            return ad_code
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        return template.render(timestamp=datetime.now().isoformat())
     
     def _generate_html(self, zone_id):
         """Generate Clickadu ad container HTML"""
@@ -107,7 +103,7 @@ class ClickaduProvider:
             if date_to:
                 params['dateTo'] = date_to
             
-            response = requests.get(
+            response = http_get(
                 ClickaduConfig.API_ENDPOINTS['stats'],
                 params=params,
                 timeout=10
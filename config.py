@@ -58,3 +58,29 @@ class AdConfig:
     
     # Fallback to demo if all providers fail
     FALLBACK_TO_DEMO = os.getenv('FALLBACK_TO_DEMO', 'True').lower() == 'true'
+    
+    # 'waterfall' tries providers one by one in priority order;
+    # 'auction' asks all of them at once and keeps the best-paying fill
+    AD_SELECTION_MODE = os.getenv('AD_SELECTION_MODE', 'waterfall').lower()
+    
+    # Auction: one deadline for the whole fan-out, and threads shared by all requests
+    AUCTION_DEADLINE = float(os.getenv('AUCTION_DEADLINE', str(REQUEST_TIMEOUT)))
+    AUCTION_MAX_WORKERS = int(os.getenv('AUCTION_MAX_WORKERS', '16'))
+    
+    # Expected eCPM (USD) when a provider's response carries no bid
+    EXPECTED_ECPM = {
+        'admob': 1.20,
+        'applovin': 1.00,
+        'unity': 0.90,
+        'facebook': 0.80,
+        'ironsource': 0.80,
+        'smaato': 0.50,
+        'demo': 0.0
+    }
+    
+    # Seconds a fill may be reused per (format, country, placement) - see response_cache.py.
+    # Response headers can only shorten it; 0 disables caching for that network.
+    RESPONSE_CACHE_TTL = {
+        name: int(os.getenv(f'{name.upper()}_CACHE_TTL', os.getenv('RESPONSE_CACHE_TTL', '120')))
+        for name in ('unity', 'facebook', 'smaato', 'applovin', 'ironsource')
+    }
@@ -0,0 +1,159 @@
+"""
+counters.py - Incrementally maintained platform counters
+Totals for the admin dashboard (users, ad views, MIGP earned and spent),
+updated in the same transaction as the rows they count. Each counter is
+split over COUNTER_SHARDS rows and writers pick a random shard, so busy earn
+paths do not queue on a single global row. Reading a counter sums its shards.
+
+recount() corrects drift from direct SQL or scripts without locking writers:
+    python counters.py recount
+"""
+
+import os
+import random
+import sys
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='db')
+
+COUNTER_SHARDS = int(os.getenv('COUNTER_SHARDS', '16'))
+
+# Counter name -> exact (slow) query used by recount()
+COUNTER_DEFINITIONS = {
+    'users': "SELECT COUNT(*) FROM users",
+    'ad_views': "SELECT COUNT(*) FROM watched_ads",
+    'earned': "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE type = 'earn'",
+    'spent': "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE type = 'spend'"
+}
+
+# Transaction type -> counter it feeds (used by ledger.post)
+TRANSACTION_COUNTERS = {
+    'earn': 'earned',
+    'spend': 'spent'
+}
+
+
+def init_counter_tables():
+    """Create the counters table; seed and recount it the first time"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS platform_counters (
+                name VARCHAR(50) NOT NULL,
+                shard INTEGER NOT NULL,
+                value REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, shard)
+            )
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS platform_counters (
+                name VARCHAR(50) NOT NULL,
+                shard INTEGER NOT NULL,
+                value NUMERIC(18, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, shard)
+            )
+            """
+        ]
+    )
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) as count FROM platform_counters')
+        is_new = safe_row_access(cursor.fetchone(), 'count', 0) == 0
+
+        # Missing shards (new counter or COUNTER_SHARDS raised) start at zero
+        cursor.executemany(convert_query("""
+            INSERT INTO platform_counters (name, shard, value) VALUES (%s, %s, 0)
+            ON CONFLICT (name, shard) DO NOTHING
+        """), [(name, shard) for name in COUNTER_DEFINITIONS for shard in range(COUNTER_SHARDS)])
+        conn.commit()
+        cursor.close()
+
+    if is_new:
+        recount()
+
+
+def pick_shard():
+    return random.randrange(COUNTER_SHARDS)
+
+
+def increment(cursor, name, amount=1):
+    """
+    Add to a counter on the caller's cursor, inside the caller's
+    transaction, so the counter commits or rolls back with the row it counts.
+    """
+    cursor.execute(convert_query("""
+        UPDATE platform_counters SET value = value + %s
+        WHERE name = %s AND shard = %s
+    """), (amount, name, pick_shard()))
+
+
+def get_counters(cursor=None):
+    """All counters as {name: value} - one small aggregate over the shard rows"""
+    def run(cur):
+        cur.execute('SELECT name, SUM(value) as value FROM platform_counters GROUP BY name')
+        return {safe_row_access(row, 'name', 0): safe_row_access(row, 'value', 1) for row in cur.fetchall()}
+
+    if cursor is not None:
+        values = run(cursor)
+    else:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            values = run(cur)
+            cur.close()
+    return {name: values.get(name, 0) or 0 for name in COUNTER_DEFINITIONS}
+
+
+def recount():
+    """
+    Correct every counter to its exact value
+
+    The exact value and the current shard sum are read in one statement,
+    so both see the same snapshot; the difference is then added to shard 0.
+    Increments committed in between are in neither number, so they are kept
+    and writers are never blocked.
+    """
+    corrections = {}
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for name, exact_sql in COUNTER_DEFINITIONS.items():
+            cursor.execute(convert_query(f"""
+                SELECT ({exact_sql}) as exact,
+                       (SELECT COALESCE(SUM(value), 0) FROM platform_counters WHERE name = %s) as counted
+            """), (name,))
+            row = cursor.fetchone()
+            drift = safe_row_access(row, 'exact', 0) - safe_row_access(row, 'counted', 1)
+            if drift:
+                cursor.execute(convert_query("""
+                    UPDATE platform_counters SET value = value + %s
+                    WHERE name = %s AND shard = 0
+                """), (drift, name))
+                corrections[name] = drift
+            conn.commit()
+        cursor.close()
+
+    if corrections:
+        log.warning('counters_corrected', **corrections)
+    else:
+        log.info('counters_verified', counters=len(COUNTER_DEFINITIONS))
+    return corrections
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'recount':
+        print("Usage: python counters.py recount")
+        sys.exit(1)
+
+    from models import init_db
+    init_db()
+
+    corrections = recount()
+    print(f"Corrected {len(corrections)} counter(s)")
+    for name, drift in corrections.items():
+        print(f"  {name}: {drift:+}")
@@ -0,0 +1,233 @@
+"""
+events.py - In-process pub/sub for live user updates
+Feeds the Server-Sent Events stream (/events) so pages can react to balance
+changes, cooldown expiries and new-ad availability without reloading
+
+A stream holds one server thread for its whole life. gunicorn.conf.py runs
+threaded (gthread) workers and the per-worker connection cap defaults to
+half of GUNICORN_THREADS. A server that can't hold a stream without
+blocking other requests (a single-threaded sync worker) gets no stream at
+all: /events answers 204 and pages fall back to reloading / polling.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, USE_SQLITE
+
+load_dotenv()
+
+# Threads per gunicorn worker (gunicorn.conf.py)
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '16'))
+
+# Max concurrent SSE connections held open by one worker process; the other
+# threads stay free for regular requests
+SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS', str(max(1, GUNICORN_THREADS // 2))))
+
+# gevent / eventlet workers report wsgi.multithread=False but can hold
+# streams without blocking; set this when running one of them
+SSE_ASYNC_WORKER = os.getenv('SSE_ASYNC_WORKER', 'False').lower() == 'true'
+
+# Seconds between keep-alive comments (stops proxies closing idle streams)
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
+# Streams are recycled after this long; EventSource reconnects automatically
+SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', '300'))
+
+# Pending events buffered per connection before the oldest are dropped
+SSE_QUEUE_SIZE = 32
+
+# Ad cooldown length (matches the 1 minute cooldown in blueprints/main.py)
+AD_COOLDOWN_SECONDS = 60
+
+
+class Subscription:
+    """One open SSE connection for a user"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, message):
+        """Queue a message without ever blocking the publisher"""
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                # Slow client: discard the oldest event, keep the newest
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class EventBus:
+    """
+    Per-worker publish/subscribe hub keyed by user ID
+
+    Publishers (complete_ad, wallet conversions) never block: each
+    subscriber has a small bounded queue. The number of open connections
+    per worker is capped so SSE streams cannot starve regular requests.
+    """
+
+    def __init__(self, max_connections=SSE_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._connections = 0
+
+    def subscribe(self, user_id):
+        """Register a connection, or return None if the worker is full"""
+        with self._lock:
+            if self._connections >= self.max_connections:
+                return None
+            sub = Subscription(user_id)
+            self._subscribers.setdefault(user_id, set()).add(sub)
+            self._connections += 1
+            return sub
+
+    def unsubscribe(self, sub):
+        """Remove a connection (safe to call more than once)"""
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs and sub in subs:
+                subs.discard(sub)
+                self._connections -= 1
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    def publish(self, user_id, event, data):
+        """Send an event to every open connection of a user"""
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+
+        message = (event, data)
+        for sub in subs:
+            sub.push(message)
+        return len(subs)
+
+    def get_stats(self):
+        """Connection counts for monitoring"""
+        with self._lock:
+            return {
+                'connections': self._connections,
+                'users': len(self._subscribers),
+                'max_connections': self.max_connections
+            }
+
+
+# Global bus for this worker process
+event_bus = EventBus()
+
+
+def streams_supported(environ):
+    """True if this server can hold an SSE stream without blocking other requests"""
+    return SSE_ASYNC_WORKER or bool(environ.get('wsgi.multithread'))
+
+
+def publish_balance(user_id, balance, delta=None):
+    """Notify a user that their balance changed"""
+    data = {'balance': float(balance)}
+    if delta is not None:
+        data['delta'] = float(delta)
+    event_bus.publish(user_id, 'balance', data)
+
+
+def publish_cooldown(user_id, ad_id, seconds=AD_COOLDOWN_SECONDS):
+    """Notify a user that an ad went on cooldown"""
+    event_bus.publish(user_id, 'cooldown', {
+        'ad_id': str(ad_id),
+        'seconds': int(seconds),
+        'until': time.time() + seconds
+    })
+
+
+def recent_cooldowns(user_id, seconds=AD_COOLDOWN_SECONDS):
+    """
+    {ad_id: wall-clock expiry} for the user's ads still on cooldown, from
+    watched_ads - a new stream picks up cooldowns started before it opened
+    (stream recycle, reconnect to another worker)
+    """
+    if USE_SQLITE:
+        since = "datetime('now', '-' || %s || ' seconds')"
+        age = "(julianday('now') - julianday(MAX(timestamp))) * 86400"
+    else:
+        since = "CURRENT_TIMESTAMP - make_interval(secs => %s)"
+        age = "EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - MAX(timestamp)))"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(f"""
+            SELECT ad_id, {age} AS seconds_ago
+            FROM watched_ads
+            WHERE user_id = %s AND timestamp >= {since}
+            GROUP BY ad_id
+        """), (user_id, seconds))
+        rows = cursor.fetchall()
+
+    now = time.time()
+    expiries = {}
+    for row in rows:
+        remaining = seconds - float(safe_row_access(row, 'seconds_ago', 1))
+        if remaining > 0:
+            expiries[str(safe_row_access(row, 'ad_id', 0))] = now + remaining
+    return expiries
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(sub):
+    """
+    Generator that yields SSE frames for a subscription
+
+    Cooldown expiries are tracked inside the generator itself: the
+    user's active cooldowns are loaded when the stream opens, and when a
+    'cooldown' event passes through its deadline is remembered too. A
+    'cooldown_expired' + 'ads_available' pair is emitted once one elapses.
+    No timers or extra threads are needed.
+    """
+    started = time.monotonic()
+
+    try:
+        expiries = recent_cooldowns(sub.user_id)  # ad_id -> wall-clock expiry
+
+        # Tell the browser how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        yield format_sse('ready', {'heartbeat': SSE_HEARTBEAT_SECONDS})
+
+        while time.monotonic() - started < SSE_MAX_STREAM_SECONDS:
+            now = time.time()
+
+            # Flush cooldowns that have run out
+            expired = [ad_id for ad_id, until in expiries.items() if until <= now]
+            for ad_id in expired:
+                del expiries[ad_id]
+                yield format_sse('cooldown_expired', {'ad_id': ad_id})
+            if expired:
+                yield format_sse('ads_available', {'ad_ids': expired})
+
+            timeout = SSE_HEARTBEAT_SECONDS
+            if expiries:
+                timeout = max(0.0, min(timeout, min(expiries.values()) - now))
+
+            try:
+                event, data = sub.queue.get(timeout=timeout)
+            except queue.Empty:
+                if not expiries or min(expiries.values()) > time.time():
+                    yield ": keep-alive\n\n"
+                continue
+
+            if event == 'cooldown':
+                expiries[data['ad_id']] = data['until']
+            yield format_sse(event, data)
+    finally:
+        event_bus.unsubscribe(sub)
@@ -0,0 +1,366 @@
+"""
+fraud_scoring.py - Batch fraud scoring over watch history
+Loads watched_ads for the last FRAUD_WINDOW_DAYS into NumPy arrays a chunk
+of users at a time and computes per-user features without Python loops:
+
+    fast_ratio      share of gaps between watches shorter than an ad can play
+    regularity      how machine-like the gaps are (low coefficient of variation)
+    reward_cv       variation of the client-reported reward (fixed per unit for humans)
+    ip_sharing      most other accounts seen on any of the user's IPs
+    device_sharing  same for the user agent
+    daily_rate      watches per active day
+
+The features are combined noisy-OR style into a 0-1 risk score and upserted
+into fraud_scores, where admins review them (/admin/fraud). A review keeps
+the score it was made on; a cleared user whose score later rises above it
+(and the threshold) goes back to pending.
+
+Usage:
+    python fraud_scoring.py
+
+Environment:
+    FRAUD_WINDOW_DAYS=30
+    FRAUD_CHUNK_USERS=5000
+    FRAUD_MIN_INTERVAL_SECONDS=30   shortest gap a real viewer can produce
+    FRAUD_REVIEW_THRESHOLD=0.5      scores at or above this are listed for review
+"""
+
+import json
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, ensure_columns, USE_SQLITE
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='reward')
+
+FRAUD_WINDOW_DAYS = int(os.getenv('FRAUD_WINDOW_DAYS', '30'))
+FRAUD_CHUNK_USERS = int(os.getenv('FRAUD_CHUNK_USERS', '5000'))
+FRAUD_MIN_INTERVAL_SECONDS = float(os.getenv('FRAUD_MIN_INTERVAL_SECONDS', '30'))
+FRAUD_REVIEW_THRESHOLD = float(os.getenv('FRAUD_REVIEW_THRESHOLD', '0.5'))
+
+# Feature -> weight in the noisy-OR; each feature is scaled to 0-1 first.
+# Every weight is below the review threshold, so no single signal flags a
+# user on its own - mobile carrier NAT puts many honest users on one IP, and
+# popular handsets share a user agent.
+FEATURE_WEIGHTS = {
+    'fast_ratio': 0.45,
+    'regularity': 0.4,
+    'reward_cv': 0.3,
+    'ip_sharing': 0.3,
+    'device_sharing': 0.2,
+    'daily_rate': 0.25
+}
+
+REVIEW_STATUSES = ('pending', 'cleared', 'blocked')
+
+
+def init_fraud_tables():
+    """Client fingerprint columns on watched_ads and the fraud_scores table"""
+    ensure_columns('watched_ads', {
+        'ip': 'VARCHAR(45)',
+        'user_agent': 'VARCHAR(255)'
+    })
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS fraud_scores (
+                user_id INTEGER PRIMARY KEY REFERENCES users(id),
+                score REAL NOT NULL,
+                events INTEGER NOT NULL,
+                features TEXT,
+                status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                reviewed_at TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_fraud_scores_score ON fraud_scores(score DESC)"
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS fraud_scores (
+                user_id INTEGER PRIMARY KEY REFERENCES users(id),
+                score REAL NOT NULL,
+                events INTEGER NOT NULL,
+                features TEXT,
+                status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                reviewed_at TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_fraud_scores_score ON fraud_scores(score DESC)"
+        ]
+    )
+    # Score the admin decision was based on
+    ensure_columns('fraud_scores', {'reviewed_score': 'REAL'})
+
+
+def client_fingerprint(req):
+    """(ip, user_agent) of a Flask request; Cloudflare's header wins over the proxy chain"""
+    ip = (req.headers.get('CF-Connecting-IP')
+          or (req.headers.get('X-Forwarded-For') or '').split(',')[0].strip()
+          or req.remote_addr or '')
+    return ip[:45], (req.headers.get('User-Agent') or '')[:255]
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def _window_sql():
+    if USE_SQLITE:
+        return "datetime('now', %s)", f'-{FRAUD_WINDOW_DAYS} days'
+    return "CURRENT_TIMESTAMP - make_interval(days => %s)", FRAUD_WINDOW_DAYS
+
+
+def _epoch_sql():
+    if USE_SQLITE:
+        return "(julianday(timestamp) - 2440587.5) * 86400.0"
+    return "EXTRACT(EPOCH FROM timestamp)"
+
+
+def _sharing_counts(cursor, column):
+    """{value: distinct users} for IPs / user agents used by more than one account"""
+    since, param = _window_sql()
+    cursor.execute(convert_query(f"""
+        SELECT {column} as value, COUNT(DISTINCT user_id) as users
+        FROM watched_ads
+        WHERE timestamp >= {since} AND {column} IS NOT NULL AND {column} <> ''
+        GROUP BY {column}
+        HAVING COUNT(DISTINCT user_id) > 1
+    """), (param,))
+    return {safe_row_access(row, 'value', 0): safe_row_access(row, 'users', 1) for row in cursor.fetchall()}
+
+
+def _user_chunks(cursor):
+    """Yield (first_id, last_id) ranges of FRAUD_CHUNK_USERS users with recent watches"""
+    since, param = _window_sql()
+    last_id = 0
+    while True:
+        cursor.execute(convert_query(f"""
+            SELECT MAX(user_id) as last_id, COUNT(*) as users FROM (
+                SELECT DISTINCT user_id FROM watched_ads
+                WHERE user_id > %s AND timestamp >= {since}
+                ORDER BY user_id
+                LIMIT %s
+            ) chunk
+        """), (last_id, param, FRAUD_CHUNK_USERS))
+        row = cursor.fetchone()
+        if not safe_row_access(row, 'users', 1):
+            return
+        chunk_end = safe_row_access(row, 'last_id', 0)
+        yield last_id + 1, chunk_end
+        last_id = chunk_end
+
+
+def _load_chunk(cursor, first_id, last_id):
+    """Columnar arrays for one user range, sorted by (user_id, time)"""
+    since, param = _window_sql()
+    cursor.execute(convert_query(f"""
+        SELECT user_id, {_epoch_sql()} as ts, COALESCE(reward, 0) as reward,
+               COALESCE(ip, '') as ip, COALESCE(user_agent, '') as user_agent
+        FROM watched_ads
+        WHERE user_id BETWEEN %s AND %s AND timestamp >= {since}
+        ORDER BY user_id, timestamp
+    """), (first_id, last_id, param))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    columns = list(zip(*[tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in rows]))
+    return {
+        'user_id': np.asarray(columns[0], dtype=np.int64),
+        'ts': np.asarray(columns[1], dtype=np.float64),
+        'reward': np.asarray(columns[2], dtype=np.float64),
+        'ip': np.asarray(columns[3], dtype=object),
+        'user_agent': np.asarray(columns[4], dtype=object)
+    }
+
+
+# ============================================================================
+# FEATURES
+# ============================================================================
+
+def _shared_counts(values, table):
+    """Accounts per value for every event; the dict is consulted once per distinct value"""
+    if not table:
+        return np.ones(len(values))
+    distinct, index = np.unique(values, return_inverse=True)
+    return np.array([table.get(value, 1) for value in distinct], dtype=np.float64)[index]
+
+
+def compute_features(events, ip_users, device_users):
+    """
+    Per-user features for one chunk of events sorted by (user_id, ts)
+
+    Returns:
+        (user_ids, event_counts, {feature: array}) - arrays aligned by user
+    """
+    user_ids = events['user_id']
+    n = len(user_ids)
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    users = user_ids[starts]
+    groups = np.repeat(np.arange(len(starts)), counts)
+    k = len(starts)
+
+    # Gaps between consecutive watches of the same user
+    gaps = np.diff(events['ts'])
+    same_user = groups[1:] == groups[:-1]
+    gap_groups = groups[1:][same_user]
+    gaps = np.maximum(gaps[same_user], 0.0)
+    gap_count = np.bincount(gap_groups, minlength=k)
+    gap_sum = np.bincount(gap_groups, weights=gaps, minlength=k)
+    gap_sq = np.bincount(gap_groups, weights=gaps * gaps, minlength=k)
+    fast = np.bincount(gap_groups, weights=(gaps < FRAUD_MIN_INTERVAL_SECONDS).astype(np.float64), minlength=k)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap_mean = np.where(gap_count > 0, gap_sum / gap_count, 0.0)
+        gap_std = np.sqrt(np.maximum(np.where(gap_count > 0, gap_sq / gap_count, 0.0) - gap_mean ** 2, 0.0))
+        gap_cv = np.where(gap_mean > 0, gap_std / gap_mean, 1.0)
+        fast_ratio = np.where(gap_count > 0, fast / gap_count, 0.0)
+
+        reward = events['reward']
+        reward_mean = np.bincount(groups, weights=reward, minlength=k) / counts
+        reward_sq = np.bincount(groups, weights=reward * reward, minlength=k) / counts
+        reward_std = np.sqrt(np.maximum(reward_sq - reward_mean ** 2, 0.0))
+        reward_cv = np.where(reward_mean > 0, reward_std / reward_mean, 0.0)
+
+    # Regularity only means something with enough gaps
+    regularity = np.where(gap_count >= 5, np.clip(1.0 - gap_cv / 0.5, 0.0, 1.0), 0.0)
+
+    # Accounts sharing an IP / device: worst value over the user's events
+    ip_shared = np.maximum.reduceat(_shared_counts(events['ip'], ip_users), starts)
+    device_shared = np.maximum.reduceat(_shared_counts(events['user_agent'], device_users), starts)
+
+    days = np.maximum((np.maximum.reduceat(events['ts'], starts) - np.minimum.reduceat(events['ts'], starts)) / 86400.0, 1.0)
+
+    features = {
+        'fast_ratio': fast_ratio,
+        'regularity': regularity,
+        'reward_cv': np.clip(reward_cv / 0.5, 0.0, 1.0),
+        'ip_sharing': np.clip((ip_shared - 1) / 20.0, 0.0, 1.0),
+        'device_sharing': np.clip((device_shared - 1) / 50.0, 0.0, 1.0),
+        'daily_rate': np.clip(counts / days / 200.0, 0.0, 1.0)
+    }
+    return users, counts, features
+
+
+def risk_scores(features):
+    """Noisy-OR of the weighted features: 1 - prod(1 - w * f)"""
+    keep = np.ones_like(next(iter(features.values())))
+    for name, weight in FEATURE_WEIGHTS.items():
+        keep *= 1.0 - weight * features[name]
+    return 1.0 - keep
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+def _save_scores(cursor, users, counts, scores, features):
+    rows = []
+    for i, user_id in enumerate(users.tolist()):
+        detail = {name: round(float(values[i]), 3) for name, values in features.items()}
+        rows.append((user_id, round(float(scores[i]), 4), int(counts[i]), json.dumps(detail),
+                     FRAUD_REVIEW_THRESHOLD))
+    # A cleared user is reopened once the score is flaggable and above the one that was cleared
+    cursor.executemany(convert_query("""
+        INSERT INTO fraud_scores (user_id, score, events, features, scored_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id) DO UPDATE SET
+            score = excluded.score,
+            events = excluded.events,
+            features = excluded.features,
+            scored_at = excluded.scored_at,
+            status = CASE
+                WHEN fraud_scores.status = 'cleared'
+                     AND excluded.score >= %s
+                     AND excluded.score > COALESCE(fraud_scores.reviewed_score, 0)
+                THEN 'pending'
+                ELSE fraud_scores.status
+            END
+    """), rows)
+
+
+def run_scoring():
+    """Score every user with watches in the window; returns (users, flagged)"""
+    started = time.time()
+    scored = flagged = 0
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            ip_users = _sharing_counts(cursor, 'ip')
+            device_users = _sharing_counts(cursor, 'user_agent')
+
+            for first_id, last_id in list(_user_chunks(cursor)):
+                events = _load_chunk(cursor, first_id, last_id)
+                if events is None:
+                    continue
+                users, counts, features = compute_features(events, ip_users, device_users)
+                scores = risk_scores(features)
+                _save_scores(cursor, users, counts, scores, features)
+                conn.commit()
+                scored += len(users)
+                flagged += int((scores >= FRAUD_REVIEW_THRESHOLD).sum())
+        finally:
+            cursor.close()
+
+    log.info('fraud_scoring_finished', users=scored, flagged=flagged,
+             seconds=round(time.time() - started, 2))
+    return scored, flagged
+
+
+# ============================================================================
+# REVIEW (admin)
+# ============================================================================
+
+def get_flagged(status='pending', limit=100):
+    """Users at or above the review threshold, riskiest first"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query("""
+            SELECT f.user_id, u.phone, u.name, f.score, f.events, f.features, f.status, f.scored_at
+            FROM fraud_scores f
+            JOIN users u ON u.id = f.user_id
+            WHERE f.score >= %s AND f.status = %s
+            ORDER BY f.score DESC
+            LIMIT %s
+        """), (FRAUD_REVIEW_THRESHOLD, status, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    fields = ('user_id', 'phone', 'name', 'score', 'events', 'features', 'status', 'scored_at')
+    flagged = [{key: safe_row_access(row, key, i) for i, key in enumerate(fields)} for row in rows]
+    for row in flagged:
+        row['features'] = json.loads(row['features'] or '{}')
+    return flagged
+
+
+def set_review_status(user_id, status):
+    """Record an admin decision; returns False for an unknown status or user"""
+    if status not in REVIEW_STATUSES:
+        return False
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query("""
+            UPDATE fraud_scores SET status = %s, reviewed_score = score, reviewed_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s
+        """), (status, user_id))
+        updated = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    if updated:
+        log.info('fraud_review', user_id=user_id, status=status)
+    return bool(updated)
+
+
+if __name__ == '__main__':
+    from models import init_db
+    init_db()
+
+    users, flagged = run_scoring()
+    print(f"Scored {users} user(s), {flagged} flagged for review")
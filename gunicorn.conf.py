@@ -0,0 +1,27 @@
+"""
+gunicorn.conf.py - Production server settings
+Picked up automatically by `gunicorn app:app` from the project root.
+
+Every signed-in page holds a Server-Sent Events stream (/events) open for
+up to SSE_MAX_STREAM_SECONDS. Under gunicorn's default sync workers each
+stream would occupy a whole worker, so workers run threads (gthread) and
+events.py lets at most half of a worker's threads hold streams; the rest
+keep serving regular requests.
+
+Environment:
+    PORT=5000
+    WEB_CONCURRENCY=2        worker processes
+    GUNICORN_THREADS=16      threads per worker
+    GUNICORN_TIMEOUT=30
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+# Open streams are idle most of the time; keep-alive connections beyond them are cheap
+keepalive = 5
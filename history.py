@@ -0,0 +1,195 @@
+"""
+history.py - Keyset-paginated and streamed transaction history
+Pages walk (timestamp, id) backwards instead of using OFFSET, so page 500
+costs the same as page 1. Exports stream rows through a server-side cursor
+so memory stays flat no matter how long a user's history is.
+"""
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime, date
+from decimal import Decimal
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+
+# Columns shown in history pages and exports (covered by the index below)
+HISTORY_FIELDS = ('id', 'type', 'amount', 'description', 'timestamp')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rows pulled from the server per round trip while exporting
+EXPORT_BATCH_SIZE = 2000
+
+
+def init_history_tables():
+    """Create the covering index used by keyset pagination"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_keyset
+            ON transactions(user_id, timestamp DESC, id DESC, type, amount, description)
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_keyset
+            ON transactions(user_id, timestamp DESC, id DESC)
+            INCLUDE (type, amount, description)
+            """
+        ]
+    )
+
+
+# ============================================================================
+# CURSORS
+# ============================================================================
+
+def encode_cursor(timestamp, txn_id):
+    """Opaque page cursor for the last row of a page"""
+    raw = f"{timestamp}|{txn_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor_value):
+    """Reverse of encode_cursor(); returns (timestamp, id) or None if invalid"""
+    if not cursor_value:
+        return None
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        timestamp, txn_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        return timestamp, int(txn_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _plain_value(value):
+    """Convert DB values to str/float/int for JSON and CSV output"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _row_dict(row):
+    return {key: safe_row_access(row, key, i) for i, key in enumerate(HISTORY_FIELDS)}
+
+
+# ============================================================================
+# PAGINATION
+# ============================================================================
+
+def fetch_transactions_page(user_id, cursor_value=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    One page of a user's transactions, newest first
+
+    Args:
+        user_id: Owner of the transactions
+        cursor_value: Cursor returned with the previous page (None = newest)
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: Optional open DB cursor to reuse
+
+    Returns:
+        (rows, next_cursor) - next_cursor is None on the last page
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    position = decode_cursor(cursor_value)
+
+    sql = """
+        SELECT id, type, amount, description, timestamp
+        FROM transactions
+        WHERE user_id = %s
+    """
+    params = [user_id]
+    if position:
+        sql += " AND (timestamp, id) < (%s, %s)"
+        params.extend(position)
+    # Fetch one extra row to learn whether another page exists
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    def run(cur):
+        cur.execute(convert_query(sql), tuple(params))
+        return [_row_dict(row) for row in cur.fetchall()]
+
+    if cursor is not None:
+        rows = run(cursor)
+    else:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            rows = run(cur)
+            cur.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['timestamp'], last['id'])
+    return rows, next_cursor
+
+
+# ============================================================================
+# STREAMED EXPORT
+# ============================================================================
+
+def iter_transactions(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield every transaction of a user, newest first, one dict at a time
+
+    PostgreSQL uses a named (server-side) cursor so only batch_size rows
+    are held in memory; SQLite steps its cursor with fetchmany().
+    """
+    with get_db_connection() as conn:
+        if USE_SQLITE:
+            cur = conn.cursor()
+        else:
+            cur = conn.cursor(name=f'txn_export_{user_id}')
+            cur.itersize = batch_size
+
+        try:
+            cur.execute(convert_query("""
+                SELECT id, type, amount, description, timestamp
+                FROM transactions
+                WHERE user_id = %s
+                ORDER BY timestamp DESC, id DESC
+            """), (user_id,))
+
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield {k: _plain_value(v) for k, v in _row_dict(row).items()}
+        finally:
+            cur.close()
+            if not USE_SQLITE:
+                # Named cursors live inside a transaction - end it
+                conn.rollback()
+
+
+def export_csv(user_id):
+    """Generator of CSV text chunks for a user's full history"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HISTORY_FIELDS)
+
+    for i, row in enumerate(iter_transactions(user_id), 1):
+        writer.writerow([row[key] for key in HISTORY_FIELDS])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def export_json(user_id):
+    """Generator of JSON array chunks for a user's full history"""
+    yield '['
+    first = True
+    for row in iter_transactions(user_id):
+        yield ('' if first else ',') + json.dumps(row, separators=(',', ':'))
+        first = False
+    yield ']'
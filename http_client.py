@@ -0,0 +1,176 @@
+"""
+http_client.py - Pooled keep-alive HTTP for ad network calls
+One requests.Session per host, each with its own connection pool, so calls
+to the same network reuse warm TCP+TLS connections instead of paying a new
+handshake every time. Timeouts are split into connect and read, and failed
+connects / 502-504 responses are retried with jittered exponential backoff.
+Retries share one budget (the caller's timeout by default): a retry is
+only made while a full connect timeout still fits after its backoff, and
+its read timeout is cut to what is left, so retrying never stretches a
+call past the timeout the breaker and auction deadline are sized for.
+
+Use it like requests:
+    from http_client import http_get, http_post
+    response = http_get(url, params=..., timeout=5)
+
+get_http_stats() returns per-host counters for this worker: requests,
+errors, timeouts, retries, connections opened (reuse = 1 - opened/requests)
+and mean latency.
+
+Environment:
+    HTTP_POOL_SIZE=10            connections kept per host
+    HTTP_CONNECT_TIMEOUT=2       seconds; the read timeout comes from the caller
+    HTTP_RETRIES=2               extra attempts for connect errors and 502/503/504
+    HTTP_BACKOFF=0.2             base backoff in seconds (doubles per attempt, +/-50% jitter)
+"""
+
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='provider')
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '2'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.2'))
+
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _host(url):
+    parts = urlsplit(url if '://' in url else 'https:' + url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def get_session(url):
+    """The shared Session for the URL's scheme and host"""
+    host = _host(url)
+    session = _sessions.get(host)
+    if session is None:
+        with _lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries are done in request() so they can be jittered and counted
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+                session.mount(host, adapter)
+                _sessions[host] = session
+                _stats[host] = {'requests': 0, 'errors': 0, 'timeouts': 0, 'retries': 0, 'total_ms': 0.0}
+    return session
+
+
+def _timeout(timeout):
+    """Caller's timeout (read seconds or a (connect, read) tuple) -> (connect, read)"""
+    if isinstance(timeout, tuple):
+        return timeout
+    read = timeout if timeout is not None else 10
+    return (min(HTTP_CONNECT_TIMEOUT, read), read)
+
+
+def _count(host, **deltas):
+    with _lock:
+        stats = _stats[host]
+        for key, value in deltas.items():
+            stats[key] += value
+
+
+def request(method, url, timeout=None, retries=None, budget=None, **kwargs):
+    """
+    requests.request() over the host's pooled session
+
+    Connect errors are always safe to retry; 502/503/504 are retried for
+    every method since ad network calls are idempotent requests for a
+    creative. Read timeouts are not retried - the caller's budget is spent.
+    budget is the seconds all attempts and backoff may take together
+    (default: the read timeout); retries that would not fit are skipped.
+    Raises the same exceptions as requests.
+    """
+    session = get_session(url)
+    host = _host(url)
+    retries = HTTP_RETRIES if retries is None else retries
+    timeout = _timeout(timeout)
+    deadline = time.monotonic() + (timeout[1] if budget is None else budget)
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        remaining = max(deadline - time.monotonic(), 0.001)
+        attempt_timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+        try:
+            response = session.request(method, url, timeout=attempt_timeout, **kwargs)
+        except requests.ConnectionError as e:
+            # ConnectTimeout is a ConnectionError too; ReadTimeout is not
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            backoff = _backoff(attempt)
+            if attempt < retries and _retry_fits(deadline, backoff, timeout):
+                _count(host, requests=1, errors=1, retries=1, total_ms=elapsed_ms)
+                time.sleep(backoff)
+                continue
+            _count(host, requests=1, errors=1, total_ms=elapsed_ms,
+                   timeouts=1 if isinstance(e, requests.ConnectTimeout) else 0)
+            raise
+        except requests.Timeout:
+            _count(host, requests=1, errors=1, timeouts=1, total_ms=(time.perf_counter() - started) * 1000)
+            raise
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            backoff = _backoff(attempt)
+            if _retry_fits(deadline, backoff, timeout):
+                _count(host, requests=1, errors=1, retries=1, total_ms=elapsed_ms)
+                response.close()
+                time.sleep(backoff)
+                continue
+
+        _count(host, requests=1, errors=1 if response.status_code >= 500 else 0, total_ms=elapsed_ms)
+        log.debug('http_call', host=host, method=method, status=response.status_code,
+                  ms=round(elapsed_ms, 1), attempt=attempt + 1)
+        return response
+
+
+def _backoff(attempt):
+    """Jittered exponential backoff before retry number attempt + 1 (seconds)"""
+    return HTTP_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _retry_fits(deadline, backoff, timeout):
+    """True if a full connect timeout is still left after sleeping backoff"""
+    return time.monotonic() + backoff + timeout[0] <= deadline
+
+
+def http_get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def get_http_stats():
+    """Per-host counters for this worker, with connection reuse and mean latency"""
+    with _lock:
+        snapshot = {host: dict(stats) for host, stats in _stats.items()}
+        sessions = dict(_sessions)
+
+    for host, stats in snapshot.items():
+        opened = 0
+        adapter = sessions[host].get_adapter(host)
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            opened += getattr(pool, 'num_connections', 0) if pool else 0
+        stats['connections_opened'] = opened
+        stats['reuse_rate'] = round(1 - opened / stats['requests'], 3) if stats['requests'] else None
+        stats['mean_ms'] = round(stats.pop('total_ms') / stats['requests'], 1) if stats['requests'] else None
+    return snapshot
@@ -0,0 +1,535 @@
+"""
+ledger.py - Double-entry ledger for MIGP balances
+All money movement goes through post(): one call moves the user's
+materialized balance, appends two ledger_entries legs (the user's, carrying
+the running balance, and the counter account's) and writes the legacy
+transactions row - a single statement on PostgreSQL.
+
+debit() and credit() are thin wrappers for spend and payout paths.
+
+Deferred credits (LEDGER_DEFERRED_CREDITS=true): earns and bonuses append
+to balance_deltas instead of locking the user's row, so back-to-back earns
+never wait on each other. merge_deltas() - run by 'python ledger.py merge' -
+folds them into users.balance and writes their ledger legs. The visible
+balance is users.balance plus pending deltas (models.USER_COLUMNS_SQL), and
+debits fold the user's pending deltas first so the funds check is exact.
+"""
+
+import os
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+from counters import TRANSACTION_COUNTERS, increment, pick_shard
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='wallet')
+
+LEDGER_DEFERRED_CREDITS = os.getenv('LEDGER_DEFERRED_CREDITS', 'false').lower() == 'true'
+LEDGER_MERGE_INTERVAL = float(os.getenv('LEDGER_MERGE_INTERVAL', '2'))
+LEDGER_MERGE_BATCH = int(os.getenv('LEDGER_MERGE_BATCH', '5000'))
+
+# Transaction types that take MIGP away; every other type adds MIGP.
+# 'correction' is the debit counterpart of 'adjustment' (reconciliation repairs).
+DEBIT_TYPES = ('spend', 'correction')
+
+# Signed transaction amount, for summing a user's ledger in SQL
+SIGNED_AMOUNT_SQL = "CASE WHEN type IN ('spend', 'correction') THEN -amount ELSE amount END"
+
+# System account on the other side of each transaction type
+COUNTER_ACCOUNTS = {
+    'earn': 'ad_rewards',
+    'bonus': 'bonuses',
+    'spend': 'redemptions',
+    'refund': 'redemptions',
+    'adjustment': 'adjustments',
+    'correction': 'adjustments'
+}
+
+USER_ACCOUNT = 'user'
+
+
+def to_points(amount):
+    """
+    amount as stored in users.balance / transactions.amount (INTEGER),
+    half rounded up. post() rounds once so every row it writes agrees.
+    """
+    return int(Decimal(str(amount)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def init_ledger_tables():
+    """Create the append-only ledger_entries table and the pending delta queue"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS balance_deltas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                amount REAL NOT NULL,
+                counter_account VARCHAR(30) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_balance_deltas_user
+            ON balance_deltas(user_id)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ledger_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                account VARCHAR(30) NOT NULL,
+                user_id INTEGER REFERENCES users(id),
+                amount REAL NOT NULL,
+                running_balance REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_ledger_entries_user
+            ON ledger_entries(user_id, id DESC)
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS ledger_entries_no_update
+            BEFORE UPDATE ON ledger_entries
+            BEGIN SELECT RAISE(ABORT, 'ledger_entries is append-only'); END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS ledger_entries_no_delete
+            BEFORE DELETE ON ledger_entries
+            BEGIN SELECT RAISE(ABORT, 'ledger_entries is append-only'); END
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS balance_deltas (
+                id BIGSERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                amount NUMERIC(14, 2) NOT NULL,
+                counter_account VARCHAR(30) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_balance_deltas_user
+            ON balance_deltas(user_id)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ledger_entries (
+                id BIGSERIAL PRIMARY KEY,
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                account VARCHAR(30) NOT NULL,
+                user_id INTEGER REFERENCES users(id),
+                amount NUMERIC(14, 2) NOT NULL,
+                running_balance NUMERIC(14, 2),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_ledger_entries_user
+            ON ledger_entries(user_id, id DESC)
+            WHERE user_id IS NOT NULL
+            """,
+            """
+            CREATE OR REPLACE FUNCTION ledger_entries_append_only() RETURNS trigger AS $$
+            BEGIN
+                RAISE EXCEPTION 'ledger_entries is append-only';
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'ledger_entries_append_only') THEN
+                    CREATE TRIGGER ledger_entries_append_only
+                    BEFORE UPDATE OR DELETE ON ledger_entries
+                    FOR EACH ROW EXECUTE FUNCTION ledger_entries_append_only();
+                END IF;
+            END
+            $$
+            """
+        ]
+    )
+
+
+class PostResult(NamedTuple):
+    """Outcome of a ledger posting"""
+    ok: bool
+    balance: Optional[float]           # balance after posting (or current balance on failure)
+    transaction_id: Optional[int]      # transactions row written, None on failure
+    reason: Optional[str] = None       # 'insufficient_funds', 'invalid_amount', 'unknown_user'
+
+
+# Balance move + transaction + both ledger legs (+ platform counter) in one statement. If the
+# funds check fails the UPDATE matches no row and nothing else is written.
+_POST_SQL_POSTGRES = """
+    WITH account AS (
+        UPDATE users
+        SET balance = balance + %(balance_delta)s
+        WHERE id = %(user_id)s
+          AND (NOT %(require_funds)s OR balance + %(balance_delta)s >= 0)
+        RETURNING id, balance
+    ), txn AS (
+        INSERT INTO transactions (user_id, type, amount, description)
+        SELECT id, %(type)s, %(amount)s, %(description)s FROM account
+        RETURNING id
+    ), legs AS (
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        SELECT txn.id, %(user_account)s, account.id, %(delta)s, account.balance FROM account, txn
+        UNION ALL
+        SELECT txn.id, %(counter_account)s, NULL, %(counter_delta)s, NULL FROM account, txn
+    ), counted AS (
+        UPDATE platform_counters SET value = value + %(amount)s
+        WHERE name = %(counter)s AND shard = %(shard)s AND EXISTS (SELECT 1 FROM txn)
+    )
+    SELECT account.balance, txn.id AS transaction_id
+    FROM account, txn
+"""
+
+
+def _post_sqlite(cursor, user_id, delta, balance_delta, amount, txn_type, description, counter_account,
+                 require_funds):
+    """SQLite has no data-modifying CTEs: same statements, one transaction"""
+    cursor.execute("""
+        UPDATE users SET balance = balance + ?
+        WHERE id = ? AND (NOT ? OR balance + ? >= 0)
+        RETURNING balance
+    """, (balance_delta, user_id, require_funds, balance_delta))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    balance = row[0]
+
+    cursor.execute("""
+        INSERT INTO transactions (user_id, type, amount, description)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, txn_type, amount, description))
+    transaction_id = cursor.lastrowid
+
+    cursor.executemany("""
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(transaction_id, USER_ACCOUNT, user_id, delta, balance),
+          (transaction_id, counter_account, None, -delta, None)])
+    return balance, transaction_id
+
+
+# Deferred credit: transaction + pending delta, no lock on the users row.
+# Rows inserted by a CTE are invisible to the same statement, hence + delta.
+_DEFER_SQL_POSTGRES = """
+    WITH txn AS (
+        INSERT INTO transactions (user_id, type, amount, description)
+        VALUES (%(user_id)s, %(type)s, %(amount)s, %(description)s)
+        RETURNING id
+    ), pending AS (
+        INSERT INTO balance_deltas (user_id, transaction_id, amount, counter_account)
+        SELECT %(user_id)s, id, %(delta)s, %(counter_account)s FROM txn
+    ), counted AS (
+        UPDATE platform_counters SET value = value + %(amount)s
+        WHERE name = %(counter)s AND shard = %(shard)s
+    )
+    SELECT txn.id AS transaction_id,
+           (SELECT balance FROM users WHERE id = %(user_id)s)
+           + COALESCE((SELECT SUM(amount) FROM balance_deltas WHERE user_id = %(user_id)s), 0)
+           + %(delta)s AS balance
+    FROM txn
+"""
+
+
+def _defer_sqlite(cursor, user_id, delta, amount, txn_type, description, counter_account):
+    cursor.execute("""
+        INSERT INTO transactions (user_id, type, amount, description)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, txn_type, amount, description))
+    transaction_id = cursor.lastrowid
+    cursor.execute("""
+        INSERT INTO balance_deltas (user_id, transaction_id, amount, counter_account)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, transaction_id, delta, counter_account))
+    cursor.execute("""
+        SELECT u.balance + COALESCE((SELECT SUM(amount) FROM balance_deltas WHERE user_id = u.id), 0)
+        FROM users u WHERE u.id = ?
+    """, (user_id,))
+    return cursor.fetchone()[0], transaction_id
+
+
+def post(user_id, amount, txn_type, description, counter_account=None,
+         require_funds=None, move_balance=True, conn=None):
+    """
+    Record a money movement for a user
+
+    Args:
+        user_id: User whose balance moves
+        amount: Positive number of MIGP; the direction comes from txn_type.
+                Rounded to whole MIGP (to_points) for every row written
+        txn_type: 'earn', 'bonus', 'spend', 'refund', 'adjustment', 'correction'
+        description: Transaction description shown in history
+        counter_account: System account for the other leg
+                         (defaults from COUNTER_ACCOUNTS)
+        require_funds: Refuse to take the balance below zero
+                       (defaults to True for debit types)
+        move_balance: False writes the transaction, legs and counter but
+                      leaves users.balance as it is - for reconciliation,
+                      when the balance is right and the ledger is short
+        conn: Optional open connection; when given the caller owns the
+              transaction and must commit it
+
+    Returns:
+        PostResult
+    """
+    amount = to_points(amount) if amount is not None else 0
+    if amount <= 0:
+        return PostResult(False, None, None, 'invalid_amount')
+
+    delta = -amount if txn_type in DEBIT_TYPES else amount
+    counter_account = counter_account or COUNTER_ACCOUNTS.get(txn_type, 'adjustments')
+    if require_funds is None:
+        require_funds = txn_type in DEBIT_TYPES
+
+    deferred = LEDGER_DEFERRED_CREDITS and delta > 0 and not require_funds and move_balance
+    balance_delta = delta if move_balance else 0
+    platform_counter = TRANSACTION_COUNTERS.get(txn_type)
+
+    def run(c):
+        cursor = c.cursor()
+        try:
+            if deferred:
+                if USE_SQLITE:
+                    result = _defer_sqlite(cursor, user_id, delta, amount, txn_type,
+                                           description, counter_account)
+                    if platform_counter:
+                        increment(cursor, platform_counter, amount)
+                else:
+                    cursor.execute(_DEFER_SQL_POSTGRES, {
+                        'user_id': user_id,
+                        'delta': delta,
+                        'amount': amount,
+                        'type': txn_type,
+                        'description': description,
+                        'counter_account': counter_account,
+                        'counter': platform_counter,
+                        'shard': pick_shard()
+                    })
+                    row = cursor.fetchone()
+                    result = (row['balance'], row['transaction_id'])
+                return PostResult(True, result[0], result[1])
+
+            if require_funds and LEDGER_DEFERRED_CREDITS:
+                # Pending credits count towards the funds check
+                _merge(cursor, user_id=user_id)
+
+            if USE_SQLITE:
+                result = _post_sqlite(cursor, user_id, delta, balance_delta, amount, txn_type,
+                                      description, counter_account, require_funds)
+                if result and platform_counter:
+                    increment(cursor, platform_counter, amount)
+            else:
+                cursor.execute(_POST_SQL_POSTGRES, {
+                    'user_id': user_id,
+                    'delta': delta,
+                    'balance_delta': balance_delta,
+                    'counter_delta': -delta,
+                    'amount': amount,
+                    'type': txn_type,
+                    'description': description,
+                    'user_account': USER_ACCOUNT,
+                    'counter_account': counter_account,
+                    'require_funds': require_funds,
+                    'counter': platform_counter,
+                    'shard': pick_shard()
+                })
+                row = cursor.fetchone()
+                result = (row['balance'], row['transaction_id']) if row else None
+
+            if result:
+                return PostResult(True, result[0], result[1])
+
+            # Failure path only: read the balance for the error message
+            cursor.execute(convert_query('SELECT balance FROM users WHERE id = %s'), (user_id,))
+            row = cursor.fetchone()
+            if not row:
+                return PostResult(False, None, None, 'unknown_user')
+            return PostResult(False, safe_row_access(row, 'balance', 0), None, 'insufficient_funds')
+        finally:
+            cursor.close()
+
+    if conn is not None:
+        result = run(conn)
+    else:
+        with get_db_connection() as own_conn:
+            result = run(own_conn)
+            if result.ok:
+                own_conn.commit()
+            else:
+                own_conn.rollback()
+
+    if result.ok:
+        log.event('posted', user_id=user_id, amount=amount, type=txn_type, deferred=deferred,
+                  moved_balance=move_balance, balance=result.balance, transaction_id=result.transaction_id)
+    else:
+        log.event('post_rejected', user_id=user_id, amount=amount, type=txn_type, reason=result.reason)
+    return result
+
+
+def debit(user_id, amount, description, txn_type='spend', conn=None):
+    """
+    Atomically take `amount` MIGP from a user
+
+    ok is False when funds are insufficient; the balance is never
+    overdrawn, even under concurrent redemptions.
+    """
+    return post(user_id, amount, txn_type, description, require_funds=True, conn=conn)
+
+
+def credit(user_id, amount, description, txn_type='earn', conn=None):
+    """Give `amount` MIGP to a user (earnings, bonuses, refunds)"""
+    return post(user_id, amount, txn_type, description, require_funds=False, conn=conn)
+
+
+def get_account_entries(user_id, limit=50):
+    """Most recent ledger legs of a user, newest first, with running balances"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query("""
+            SELECT id, transaction_id, amount, running_balance, created_at
+            FROM ledger_entries
+            WHERE user_id = %s
+            ORDER BY id DESC
+            LIMIT %s
+        """), (user_id, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    fields = ('id', 'transaction_id', 'amount', 'running_balance', 'created_at')
+    return [{key: safe_row_access(row, key, i) for i, key in enumerate(fields)} for row in rows]
+
+
+# ============================================================================
+# DELTA MERGER
+# ============================================================================
+
+# Claim pending deltas, fold them into users.balance and append their ledger
+# legs. Running balances are rebuilt backwards from each user's new balance.
+# post() only defers whole MIGP; ROUND / to_points cover deltas queued before
+# it rounded, so the legs match the INTEGER balance they are added to.
+_MERGE_SQL_POSTGRES = """
+    WITH moved AS (
+        DELETE FROM balance_deltas
+        WHERE id IN (
+            SELECT id FROM balance_deltas
+            WHERE %(user_id)s::int IS NULL OR user_id = %(user_id)s::int
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, transaction_id, ROUND(amount) AS amount, counter_account
+    ), totals AS (
+        SELECT user_id, SUM(amount) AS total FROM moved GROUP BY user_id
+    ), updated AS (
+        UPDATE users u
+        SET balance = u.balance + totals.total
+        FROM totals
+        WHERE u.id = totals.user_id
+        RETURNING u.id, u.balance
+    ), legs AS (
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        SELECT m.transaction_id, %(user_account)s, m.user_id, m.amount,
+               updated.balance - COALESCE(SUM(m.amount) OVER (
+                   PARTITION BY m.user_id ORDER BY m.id DESC
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ), 0)
+        FROM moved m
+        JOIN updated ON updated.id = m.user_id
+        UNION ALL
+        SELECT m.transaction_id, m.counter_account, NULL, 0 - m.amount, NULL
+        FROM moved m
+    )
+    SELECT COUNT(*) AS merged FROM moved
+"""
+
+
+def _merge_sqlite(cursor, user_id, limit):
+    sql = 'SELECT id, user_id, transaction_id, amount, counter_account FROM balance_deltas'
+    params = []
+    if user_id is not None:
+        sql += ' WHERE user_id = ?'
+        params.append(user_id)
+    sql += ' ORDER BY id LIMIT ?'
+    params.append(limit)
+    cursor.execute(sql, tuple(params))
+    deltas = cursor.fetchall()
+    if not deltas:
+        return 0
+
+    by_user = {}
+    for delta_id, uid, transaction_id, amount, counter_account in deltas:
+        by_user.setdefault(uid, []).append((delta_id, uid, transaction_id, to_points(amount), counter_account))
+
+    legs = []
+    for uid, items in by_user.items():
+        cursor.execute('UPDATE users SET balance = balance + ? WHERE id = ? RETURNING balance',
+                       (sum(d[3] for d in items), uid))
+        running = cursor.fetchone()[0] - sum(d[3] for d in items)
+        for _, _, transaction_id, amount, counter_account in items:
+            running += amount
+            legs.append((transaction_id, USER_ACCOUNT, uid, amount, running))
+            legs.append((transaction_id, counter_account, None, -amount, None))
+
+    cursor.executemany("""
+        INSERT INTO ledger_entries (transaction_id, account, user_id, amount, running_balance)
+        VALUES (?, ?, ?, ?, ?)
+    """, legs)
+    cursor.executemany('DELETE FROM balance_deltas WHERE id = ?', [(d[0],) for d in deltas])
+    return len(deltas)
+
+
+def _merge(cursor, user_id=None, limit=LEDGER_MERGE_BATCH):
+    """Fold up to `limit` pending deltas (optionally one user's) on an open cursor"""
+    if USE_SQLITE:
+        return _merge_sqlite(cursor, user_id, limit)
+    cursor.execute(_MERGE_SQL_POSTGRES, {'user_id': user_id, 'limit': limit,
+                                         'user_account': USER_ACCOUNT})
+    return cursor.fetchone()['merged']
+
+
+def merge_deltas(user_id=None, limit=LEDGER_MERGE_BATCH):
+    """Merge one batch of pending deltas in its own transaction. Returns rows merged."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        merged = _merge(cursor, user_id=user_id, limit=limit)
+        conn.commit()
+        cursor.close()
+    if merged:
+        log.event('deltas_merged', merged=merged)
+    return merged
+
+
+def run_merger(once=False):
+    """Merge pending deltas every LEDGER_MERGE_INTERVAL seconds"""
+    log.info('delta_merger_started', interval=LEDGER_MERGE_INTERVAL, batch=LEDGER_MERGE_BATCH)
+    while True:
+        merged = merge_deltas()
+        if once:
+            return merged
+        if merged < LEDGER_MERGE_BATCH:
+            time.sleep(LEDGER_MERGE_INTERVAL)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'merge':
+        print("Usage: python ledger.py merge [--once]")
+        sys.exit(1)
+
+    from models import init_db
+    init_db()
+
+    try:
+        run_merger(once='--once' in sys.argv)
+    except KeyboardInterrupt:
+        print("\nMerger stopped")
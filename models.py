@@ -10,6 +10,9 @@ from dotenv import load_dotenv
 from contextlib import contextmanager
 import atexit
 import sqlite3
+from app_logging import get_logger
+
+log = get_logger(__name__, category='db')
 
 # Load .env file
 load_dotenv()
@@ -141,7 +144,7 @@ def get_db_connection():
             conn.commit()
         except Exception as e:
             conn.rollback()
-            print(f"Database error: {e}")
+            log.error('database_error', error=str(e))
             raise
         finally:
             conn.close()
@@ -158,7 +161,7 @@ def get_db_connection():
         except Exception as e:
             if conn:
                 conn.rollback()
-            print(f"Database error: {e}")
+            log.error('database_error', error=str(e))
             raise
         finally:
             if conn:
@@ -186,7 +189,7 @@ def get_db():
             conn.cursor_factory = RealDictCursor
             return conn
         except Exception as e:
-            print(f"Error getting connection: {e}")
+            log.error('get_connection_failed', error=str(e))
             raise
 
 def return_db(conn):
@@ -207,7 +210,7 @@ def return_db(conn):
                     conn.rollback()
                 db_pool.putconn(conn)
             except Exception as e:
-                print(f"Error returning connection: {e}")
+                log.error('return_connection_failed', error=str(e))
 
 def close_all_connections():
     """Close all connections in pool (called on shutdown)"""
@@ -272,6 +275,7 @@ def init_db():
             
             if cursor.fetchone():
                 print("✓ Database already initialized")
+                init_feature_tables()
                 return
             
             print("🔧 Initializing database...")
@@ -419,11 +423,88 @@ def init_db():
             
         finally:
             cursor.close()
+    
+    init_feature_tables()
+
+
+def run_ddl(sqlite_statements, postgres_statements):
+    """
+    Run idempotent CREATE ... IF NOT EXISTS statements for the active database.
+    Feature modules use this from their init_*_tables() functions.
+    """
+    statements = sqlite_statements if USE_SQLITE else postgres_statements
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def ensure_columns(table, columns):
+    """
+    Add missing columns to an existing table (idempotent).
+    columns: {name: type} - the type must be valid on both databases.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if USE_SQLITE:
+                # SQLite has no ADD COLUMN IF NOT EXISTS
+                cursor.execute(f'PRAGMA table_info({table})')
+                existing = {row[1] for row in cursor.fetchall()}
+                for name, column_type in columns.items():
+                    if name not in existing:
+                        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+            else:
+                for name, column_type in columns.items():
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {column_type}')
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def init_feature_tables():
+    """
+    Create tables and indexes owned by feature modules.
+    Safe to run on every deploy - everything is IF NOT EXISTS.
+    """
+    from history import init_history_tables
+    from ledger import init_ledger_tables
+    from redemptions import init_redemption_tables
+    from reconcile import init_reconcile_tables
+    from counters import init_counter_tables
+    from admin_listings import init_admin_listing_indexes
+    from analytics import init_analytics_tables
+    from provider_metrics import init_provider_metrics_tables
+    from fraud_scoring import init_fraud_tables
+    from unit_bandit import init_bandit_tables
+    from providers.base_provider import init_impression_tables
+    
+    init_history_tables()
+    init_ledger_tables()
+    init_redemption_tables()
+    init_reconcile_tables()
+    init_counter_tables()
+    init_admin_listing_indexes()
+    init_analytics_tables()
+    init_provider_metrics_tables()
+    init_fraud_tables()
+    init_bandit_tables()
+    init_impression_tables()
 
 # ============================================================================
 # USER MODEL
 # ============================================================================
 
+# Same column order as SELECT * FROM users, but balance includes earnings
+# still waiting in balance_deltas to be merged (see ledger.py)
+USER_COLUMNS_SQL = """u.id, u.phone, u.password_hash, u.name, u.is_admin,
+    u.balance + COALESCE((SELECT SUM(d.amount) FROM balance_deltas d WHERE d.user_id = u.id), 0) AS balance,
+    u.created_at"""
+
 class User(UserMixin):
     def __init__(self, id, phone, name, is_admin, balance):
         self.id = id
@@ -437,7 +518,7 @@ class User(UserMixin):
         """Get user by ID using context manager"""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(convert_query('SELECT * FROM users WHERE id = %s'), (user_id,))
+            cursor.execute(convert_query(f'SELECT {USER_COLUMNS_SQL} FROM users u WHERE u.id = %s'), (user_id,))
             user_data = cursor.fetchone()
             cursor.close()
             
@@ -462,6 +543,9 @@ class User(UserMixin):
                     VALUES (%s, %s, %s, 0)
                 '''), (phone, generate_password_hash(password), name))
                 
+                from counters import increment
+                increment(cursor, 'users')
+                
                 conn.commit()
                 
                 # Get the created user
@@ -479,7 +563,7 @@ class User(UserMixin):
         """Verify user credentials using context manager"""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(convert_query('SELECT * FROM users WHERE phone = %s'), (phone,))
+            cursor.execute(convert_query(f'SELECT {USER_COLUMNS_SQL} FROM users u WHERE u.phone = %s'), (phone,))
             user_data = cursor.fetchone()
             cursor.close()
             
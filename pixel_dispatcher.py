@@ -0,0 +1,209 @@
+"""
+pixel_dispatcher.py - Background delivery of tracking pixels
+Impression and click pixels used to be fetched inline, so a slow tracking
+endpoint added up to its timeout to the user's request. Handlers now call
+dispatch_pixel(url), which puts the URL on a bounded queue and returns at
+once; a small pool of worker threads fetches it over the pooled
+http_client sessions.
+
+    - the queue holds PIXEL_QUEUE_SIZE pixels; when it is full new pixels
+      are dropped (and counted) rather than blocking the request
+    - at most PIXEL_HOST_CONCURRENCY requests run per host; the rest wait
+      their turn in a per-host line without tying up a worker
+    - connection errors and 5xx responses are retried PIXEL_RETRIES times
+      with jittered exponential backoff
+    - get_pixel_stats() reports sent/failed/dropped/retried counts, queue
+      depth and the lag from enqueue to send
+
+Environment:
+    PIXEL_QUEUE_SIZE=5000
+    PIXEL_WORKERS=4
+    PIXEL_HOST_CONCURRENCY=2
+    PIXEL_TIMEOUT=2              seconds per attempt
+    PIXEL_RETRIES=2
+    PIXEL_BACKOFF=0.5            base backoff in seconds
+"""
+
+import atexit
+import heapq
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from http_client import http_get
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='provider')
+
+PIXEL_QUEUE_SIZE = int(os.getenv('PIXEL_QUEUE_SIZE', '5000'))
+PIXEL_WORKERS = int(os.getenv('PIXEL_WORKERS', '4'))
+PIXEL_HOST_CONCURRENCY = int(os.getenv('PIXEL_HOST_CONCURRENCY', '2'))
+PIXEL_TIMEOUT = float(os.getenv('PIXEL_TIMEOUT', '2'))
+PIXEL_RETRIES = int(os.getenv('PIXEL_RETRIES', '2'))
+PIXEL_BACKOFF = float(os.getenv('PIXEL_BACKOFF', '0.5'))
+
+
+class PixelDispatcher:
+    """Bounded queue + worker threads that fire tracking pixels off the request path"""
+
+    def __init__(self, queue_size=PIXEL_QUEUE_SIZE, workers=PIXEL_WORKERS,
+                 host_concurrency=PIXEL_HOST_CONCURRENCY, timeout=PIXEL_TIMEOUT,
+                 retries=PIXEL_RETRIES, backoff=PIXEL_BACKOFF):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.host_concurrency = host_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._active = {}           # host -> requests in flight
+        self._waiting = {}          # host -> deque of pixels over the host limit
+        self._delayed = []          # heap of (due, seq, pixel) retries
+        self._seq = 0
+        self._threads = []
+        self._stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retries': 0,
+                       'lag_samples': 0, 'lag_ms_total': 0.0, 'lag_ms_max': 0.0}
+
+    def dispatch(self, url, kind='pixel'):
+        """Queue a GET of url; never blocks. False if the pixel was dropped."""
+        if not url:
+            return False
+        self._ensure_workers()
+        # pixel = [url, kind, enqueued_at, attempt]
+        try:
+            self._queue.put_nowait([url, kind, time.monotonic(), 0])
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            log.debug('pixel_dropped', kind=kind, reason='queue_full')
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'pixel-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.drain)
+
+    def _next(self):
+        """Next pixel to send: a due retry first, else the queue (waits briefly)"""
+        with self._lock:
+            if self._delayed and self._delayed[0][0] <= time.monotonic():
+                return heapq.heappop(self._delayed)[2]
+            wait = min(0.5, self._delayed[0][0] - time.monotonic()) if self._delayed else 0.5
+        try:
+            return self._queue.get(timeout=max(wait, 0.01))
+        except queue.Empty:
+            return None
+
+    def _work(self):
+        while True:
+            pixel = self._next()
+            if pixel is None:
+                continue
+            host = urlsplit(pixel[0]).netloc
+
+            # Over the host limit: park it; the worker holding the slot sends it next
+            with self._lock:
+                if self._active.get(host, 0) >= self.host_concurrency:
+                    line = self._waiting.setdefault(host, deque())
+                    if len(line) >= self.queue_size:
+                        self._stats['dropped'] += 1
+                    else:
+                        line.append(pixel)
+                    continue
+                self._active[host] = self._active.get(host, 0) + 1
+
+            while pixel is not None:
+                self._send(pixel)
+                with self._lock:
+                    line = self._waiting.get(host)
+                    if line:
+                        pixel = line.popleft()
+                    else:
+                        pixel = None
+                        self._active[host] -= 1
+
+    def _send(self, pixel):
+        url, kind, enqueued_at, attempt = pixel
+        if attempt == 0:
+            lag_ms = (time.monotonic() - enqueued_at) * 1000
+            with self._lock:
+                self._stats['lag_samples'] += 1
+                self._stats['lag_ms_total'] += lag_ms
+                self._stats['lag_ms_max'] = max(self._stats['lag_ms_max'], lag_ms)
+
+        try:
+            response = http_get(url, timeout=self.timeout, retries=0)
+            response.close()
+            failed = response.status_code >= 500
+            error = f'status {response.status_code}' if failed else None
+        except Exception as e:
+            failed, error = True, str(e)
+
+        with self._lock:
+            if not failed:
+                self._stats['sent'] += 1
+                return
+            if attempt < self.retries:
+                self._stats['retries'] += 1
+                pixel[3] = attempt + 1
+                due = time.monotonic() + self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                self._seq += 1
+                heapq.heappush(self._delayed, (due, self._seq, pixel))
+                return
+            self._stats['failed'] += 1
+        log.warning('pixel_failed', kind=kind, attempts=attempt + 1, error=error)
+
+    def pending(self):
+        """Pixels not yet sent: queued, parked behind a host limit or awaiting retry"""
+        with self._lock:
+            parked = sum(len(line) for line in self._waiting.values()) + len(self._delayed)
+            in_flight = sum(self._active.values())
+        return self._queue.qsize() + parked + in_flight
+
+    def drain(self, timeout=2.0):
+        """Give queued pixels up to timeout seconds to go out (called at exit)"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def stats(self):
+        """Counters for this worker; lag is enqueue -> first send attempt"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['retry_pending'] = len(self._delayed)
+            stats['host_waiting'] = sum(len(line) for line in self._waiting.values())
+        samples = stats.pop('lag_samples')
+        stats['queued'] = self._queue.qsize()
+        stats['lag_ms_mean'] = round(stats.pop('lag_ms_total') / samples, 1) if samples else None
+        stats['lag_ms_max'] = round(stats['lag_ms_max'], 1)
+        return stats
+
+
+dispatcher = PixelDispatcher()
+
+
+def dispatch_pixel(url, kind='pixel'):
+    """Fire-and-forget GET of a tracking URL from the shared dispatcher"""
+    return dispatcher.dispatch(url, kind)
+
+
+def get_pixel_stats():
+    return dispatcher.stats()
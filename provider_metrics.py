@@ -0,0 +1,375 @@
+"""
+provider_metrics.py - Streaming per-provider performance aggregates
+Every ad fetch, impression and completion is counted in memory in this
+worker: requests, fills, timeouts, errors, a fetch-latency histogram,
+impressions, completions and revenue. Recording costs one lock and a few
+integer adds. A background thread flushes the deltas every
+PROVIDER_METRICS_FLUSH_SECONDS into hourly rollup rows with additive
+upserts, so all workers' numbers merge in the database. The same flush
+adds each provider's impressions and completions to the all-time
+provider_stats totals - one upsert per provider, never a per-event write.
+
+Latency is kept as fixed histogram buckets, not raw samples, so p50/p95/p99
+can be computed across workers and hours from the summed bucket counts.
+
+Environment:
+    PROVIDER_METRICS_FLUSH_SECONDS=30
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='provider')
+
+PROVIDER_METRICS_FLUSH_SECONDS = int(os.getenv('PROVIDER_METRICS_FLUSH_SECONDS', '30'))
+
+# Upper bounds (ms) of the latency buckets; the last one catches everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 60000)
+
+COUNT_FIELDS = ('requests', 'fills', 'timeouts', 'errors', 'impressions', 'completions')
+
+
+def init_provider_metrics_tables():
+    """Create the hourly provider rollups and the legacy provider_stats table"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS provider_metrics (
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                fills INTEGER NOT NULL DEFAULT 0,
+                timeouts INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                completions INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_start, provider)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS provider_latency (
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL,
+                le_ms INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_start, provider, le_ms)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS provider_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT UNIQUE NOT NULL,
+                impressions INTEGER DEFAULT 0,
+                completions INTEGER DEFAULT 0,
+                last_served DATETIME,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS provider_metrics (
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL,
+                requests BIGINT NOT NULL DEFAULT 0,
+                fills BIGINT NOT NULL DEFAULT 0,
+                timeouts BIGINT NOT NULL DEFAULT 0,
+                errors BIGINT NOT NULL DEFAULT 0,
+                impressions BIGINT NOT NULL DEFAULT 0,
+                completions BIGINT NOT NULL DEFAULT 0,
+                revenue NUMERIC(18, 6) NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_start, provider)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS provider_latency (
+                bucket_start TIMESTAMP NOT NULL,
+                provider VARCHAR(50) NOT NULL,
+                le_ms INTEGER NOT NULL,
+                count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_start, provider, le_ms)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS provider_stats (
+                id SERIAL PRIMARY KEY,
+                provider VARCHAR(50) UNIQUE NOT NULL,
+                impressions INTEGER DEFAULT 0,
+                completions INTEGER DEFAULT 0,
+                last_served TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]
+    )
+
+
+def _bucket_index(latency_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS) - 1
+
+
+def _new_counts():
+    counts = dict.fromkeys(COUNT_FIELDS, 0)
+    counts['revenue'] = 0.0
+    counts['latency'] = [0] * len(LATENCY_BUCKETS_MS)
+    counts['last_served'] = None    # epoch seconds of the latest impression/completion
+    return counts
+
+
+def _hour_start(ts):
+    return datetime.utcfromtimestamp(ts).replace(minute=0, second=0, microsecond=0)
+
+
+class ProviderMetrics:
+    """
+    In-memory aggregates for this worker, keyed by (hour, provider)
+
+    flush() swaps the whole dict out under the lock and writes it without
+    holding the lock, so recording never waits on the database. A failed
+    flush merges the deltas back for the next attempt.
+    """
+
+    def __init__(self, flush_seconds=PROVIDER_METRICS_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flusher = None
+
+    def _counts(self, provider):
+        """Counts for the current hour; caller holds the lock"""
+        key = (_hour_start(time.time()), provider)
+        counts = self._pending.get(key)
+        if counts is None:
+            counts = self._pending[key] = _new_counts()
+        return counts
+
+    def record_fetch(self, provider, latency_seconds, filled, timed_out=False, error=False):
+        """One fetch_ad call; latency is wall-clock seconds"""
+        index = _bucket_index(latency_seconds * 1000)
+        with self._lock:
+            counts = self._counts(provider)
+            counts['requests'] += 1
+            counts['fills'] += 1 if filled else 0
+            counts['timeouts'] += 1 if timed_out else 0
+            counts['errors'] += 1 if error else 0
+            counts['latency'][index] += 1
+        self._ensure_flusher()
+
+    def record_impression(self, provider):
+        with self._lock:
+            counts = self._counts(provider)
+            counts['impressions'] += 1
+            counts['last_served'] = time.time()
+        self._ensure_flusher()
+
+    def record_completion(self, provider, revenue=0.0):
+        """A completed view; revenue is what the network pays us for it (USD)"""
+        with self._lock:
+            counts = self._counts(provider)
+            counts['completions'] += 1
+            counts['revenue'] += revenue or 0.0
+            counts['last_served'] = time.time()
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='provider-metrics', daemon=True)
+            self._flusher.start()
+        import atexit
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self):
+        """Write pending deltas; returns the number of (hour, provider) rows flushed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            _write(pending)
+        except Exception as e:
+            log.error('provider_metrics_flush_failed', rows=len(pending), error=str(e))
+            with self._lock:
+                for key, counts in pending.items():
+                    current = self._pending.setdefault(key, _new_counts())
+                    for field in COUNT_FIELDS + ('revenue',):
+                        current[field] += counts[field]
+                    current['latency'] = [a + b for a, b in zip(current['latency'], counts['latency'])]
+                    current['last_served'] = max(filter(None, (current['last_served'], counts['last_served'])),
+                                                 default=None)
+            return 0
+
+        log.debug('provider_metrics_flushed', rows=len(pending))
+        return len(pending)
+
+
+def _format_ts(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if USE_SQLITE else value
+
+
+def _write(pending):
+    """
+    Additive upserts for every pending (hour, provider) in one transaction,
+    plus one row per provider into the all-time provider_stats totals
+    """
+    metric_rows = []
+    latency_rows = []
+    totals = {}
+    for (hour, provider), counts in pending.items():
+        bucket = _format_ts(hour)
+        metric_rows.append((bucket, provider) + tuple(counts[f] for f in COUNT_FIELDS) + (counts['revenue'],))
+        latency_rows.extend((bucket, provider, bound, count)
+                            for bound, count in zip(LATENCY_BUCKETS_MS, counts['latency']) if count)
+        if counts['last_served']:
+            impressions, completions, last_served = totals.get(provider, (0, 0, 0.0))
+            totals[provider] = (impressions + counts['impressions'], completions + counts['completions'],
+                                max(last_served, counts['last_served']))
+    stats_rows = [(provider, impressions, completions, _format_ts(datetime.utcfromtimestamp(last_served)))
+                  for provider, (impressions, completions, last_served) in totals.items()]
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(convert_query("""
+                INSERT INTO provider_metrics
+                    (bucket_start, provider, requests, fills, timeouts, errors, impressions, completions, revenue)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (bucket_start, provider) DO UPDATE SET
+                    requests = provider_metrics.requests + excluded.requests,
+                    fills = provider_metrics.fills + excluded.fills,
+                    timeouts = provider_metrics.timeouts + excluded.timeouts,
+                    errors = provider_metrics.errors + excluded.errors,
+                    impressions = provider_metrics.impressions + excluded.impressions,
+                    completions = provider_metrics.completions + excluded.completions,
+                    revenue = provider_metrics.revenue + excluded.revenue
+            """), metric_rows)
+            if latency_rows:
+                cursor.executemany(convert_query("""
+                    INSERT INTO provider_latency (bucket_start, provider, le_ms, count)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (bucket_start, provider, le_ms) DO UPDATE
+                    SET count = provider_latency.count + excluded.count
+                """), latency_rows)
+            if stats_rows:
+                # Flushes from other workers can arrive out of order: keep the latest last_served
+                cursor.executemany(convert_query("""
+                    INSERT INTO provider_stats (provider, impressions, completions, last_served)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (provider) DO UPDATE SET
+                        impressions = provider_stats.impressions + excluded.impressions,
+                        completions = provider_stats.completions + excluded.completions,
+                        last_served = CASE
+                            WHEN provider_stats.last_served IS NULL
+                              OR excluded.last_served > provider_stats.last_served THEN excluded.last_served
+                            ELSE provider_stats.last_served
+                        END
+                """), stats_rows)
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+# Per-worker singleton used by the ad managers
+metrics = ProviderMetrics()
+
+
+# ============================================================================
+# REPORTING (admin provider page)
+# ============================================================================
+
+def percentile(histogram, q):
+    """
+    Approximate latency percentile (ms) from {le_ms: count}
+
+    Interpolates linearly inside the bucket that holds the q-th sample.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    lower = 0
+    for bound in LATENCY_BUCKETS_MS:
+        count = histogram.get(bound, 0)
+        if count and seen + count >= target:
+            return round(lower + (bound - lower) * (target - seen) / count, 1)
+        seen += count
+        lower = bound
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def get_provider_report(hours=24):
+    """
+    Performance per provider over the last `hours` hours (flushed data only)
+
+    Returns:
+        list of dicts sorted by requests: provider, requests, fill_rate,
+        p50_ms, p95_ms, p99_ms, timeouts, errors, impressions, completions,
+        completion_rate, revenue, ecpm
+    """
+    since = _format_ts(datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1))
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query("""
+            SELECT provider, SUM(requests) as requests, SUM(fills) as fills,
+                   SUM(timeouts) as timeouts, SUM(errors) as errors,
+                   SUM(impressions) as impressions, SUM(completions) as completions,
+                   SUM(revenue) as revenue
+            FROM provider_metrics
+            WHERE bucket_start >= %s
+            GROUP BY provider
+        """), (since,))
+        totals = cursor.fetchall()
+
+        cursor.execute(convert_query("""
+            SELECT provider, le_ms, SUM(count) as count
+            FROM provider_latency
+            WHERE bucket_start >= %s
+            GROUP BY provider, le_ms
+        """), (since,))
+        histograms = {}
+        for row in cursor.fetchall():
+            provider = safe_row_access(row, 'provider', 0)
+            histograms.setdefault(provider, {})[safe_row_access(row, 'le_ms', 1)] = safe_row_access(row, 'count', 2)
+        cursor.close()
+
+    report = []
+    for row in totals:
+        provider = safe_row_access(row, 'provider', 0)
+        stats = {field: safe_row_access(row, field, i + 1) or 0 for i, field in enumerate(COUNT_FIELDS)}
+        revenue = float(safe_row_access(row, 'revenue', 7) or 0)
+        histogram = histograms.get(provider, {})
+        report.append(dict(
+            stats,
+            provider=provider,
+            fill_rate=round(stats['fills'] / stats['requests'] * 100, 1) if stats['requests'] else None,
+            completion_rate=round(stats['completions'] / stats['impressions'] * 100, 1) if stats['impressions'] else None,
+            p50_ms=percentile(histogram, 0.50),
+            p95_ms=percentile(histogram, 0.95),
+            p99_ms=percentile(histogram, 0.99),
+            revenue=round(revenue, 4),
+            ecpm=round(revenue / stats['impressions'] * 1000, 3) if stats['impressions'] else None
+        ))
+    report.sort(key=lambda r: r['requests'], reverse=True)
+    return report
@@ -5,7 +5,9 @@ Copy this template and customize for each new provider you want to add.
 """
 
 from .base_provider import BaseProvider
-from models import get_db_connection
+from app_logging import get_logger
+
+log = get_logger(__name__, category='ads')
 
 
 class PROVIDER_TEMPLATEProvider(BaseProvider):
@@ -34,11 +36,9 @@ class PROVIDER_TEMPLATEProvider(BaseProvider):
         self.base_ecpm = 1.65  # Expected CPM in USD
         self.timeout = 5
         
-        print(f"\n[{self.name}] Initialized")
-        print(f"  Enabled: {self.enabled}")
-        print(f"  Expected CPM: ${self.base_ecpm}")
+        log.info('provider_initialized', provider=self.name, enabled=self.enabled, ecpm=self.base_ecpm)
     
-    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0):
+    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0, placement='rewarded'):
         """
         Fetch an ad from this provider
         
@@ -46,7 +46,7 @@ class PROVIDER_TEMPLATEProvider(BaseProvider):
         Return dict with ad data or None if unavailable.
         """
         if not self.enabled:
-            print(f"[{self.name}] Not enabled")
+            log.debug('provider_disabled', provider=self.name)
             return None
         
         try:
@@ -75,47 +75,5 @@ class PROVIDER_TEMPLATEProvider(BaseProvider):
             }
         
         except Exception as e:
-            print(f"[{self.name}] Error: {e}")
+            log.error('fetch_failed', provider=self.name, error=str(e))
             return None
-    
-    def track_impression(self, ad_id, user_id, impression_url=None):
-        """Track when an ad is shown"""
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO ad_impressions 
-                    (provider, ad_id, user_id, timestamp, status) 
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'shown')
-                ''', (self.name, ad_id, user_id))
-                conn.commit()
-            
-            # Optional: Fire impression tracking pixel
-            if impression_url:
-                try:
-                    import requests
-                    requests.get(impression_url, timeout=2)
-                except:
-                    pass
-        
-        except Exception as e:
-            print(f"Error tracking impression: {e}")
-    
-    def track_completion(self, ad_id, user_id, watch_time):
-        """Track when an ad is completed"""
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE ad_impressions 
-                    SET status = 'completed', 
-                        watch_time = %s, 
-                        completed_at = CURRENT_TIMESTAMP
-                    WHERE provider = %s 
-                    AND ad_id = %s 
-                    AND user_id = %s 
-                    AND status = 'shown'
-                ''', (watch_time, self.name, ad_id, user_id))
-                conn.commit()
-        except Exception as e:
-            print(f"Error tracking completion: {e}")
@@ -2,17 +2,28 @@
 providers/ - Ad Network Providers
 
 Modular ad provider system for easy addition of new networks.
-Each provider should inherit from BaseProvider and implement required methods.
+Each provider should inherit from BaseProvider and implement required methods,
+then be registered by name in registry.py (or through the
+'migpoint.ad_providers' entry point group).
+
+Provider modules are imported lazily: only the enabled ones are loaded.
 """
 
-from .base_provider import BaseProvider
-from .adsterra_provider import AdsterraProvider
-from .demo_provider import DemoProvider
-from .provider_manager import ProviderManager
+import importlib
+
+_EXPORTS = {
+    'BaseProvider': 'base_provider',
+    'AdsterraProvider': 'adsterra_provider',
+    'DemoProvider': 'demo_provider',
+    'ProviderManager': 'provider_manager',
+    'create_providers': 'registry',
+    'registered_providers': 'registry',
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = [
-    'BaseProvider',
-    'AdsterraProvider',
-    'DemoProvider',
-    'ProviderManager'
-]
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
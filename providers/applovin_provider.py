@@ -0,0 +1,55 @@
+"""
+applovin_provider.py - AppLovin MAX (server-side ad load)
+"""
+
+import random
+from .network_provider import NetworkProvider
+from config import AdConfig
+from http_client import http_post
+
+
+class AppLovinProvider(NetworkProvider):
+    """AppLovin MAX - Real API Integration"""
+    
+    REQUIRED_SETTING = 'SDK key'
+    
+    def __init__(self, enabled=True):
+        super().__init__('applovin', enabled)
+        self.sdk_key = AdConfig.APPLOVIN_SDK_KEY
+        self.base_url = 'https://api.applovin.com/v1'
+    
+    def is_configured(self):
+        return bool(self.sdk_key)
+    
+    def _send(self, ad_format, user_country):
+        # AppLovin typically uses SDK, but supports server-side
+        return http_post(
+            f'{self.base_url}/ad/load',
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.sdk_key}'
+            },
+            json={
+                'sdk_key': self.sdk_key,
+                'ad_format': 'rewarded',
+                'platform': 'android',
+                'country_code': user_country
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, ad_data):
+        return {
+            'provider': 'applovin',
+            'ad_id': ad_data.get('ad_id', f'al_{random.randint(1000, 9999)}'),
+            'video_url': ad_data.get('video_url'),
+            'title': ad_data.get('title', 'Rewarded Video'),
+            'advertiser': ad_data.get('advertiser', 'AppLovin'),
+            'duration': ad_data.get('duration', 30),
+            'reward': 5,
+            'format': 'video',
+            'is_embed': False,
+            'tracking_url': ad_data.get('impression_url'),
+            'image_url': ad_data.get('image_url',
+                'https://via.placeholder.com/400x300/2D6FF7/FFF?text=AppLovin')
+        }
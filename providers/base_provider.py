@@ -5,6 +5,53 @@ All providers should inherit from this class and implement the required methods.
 """
 
 from abc import ABC, abstractmethod
+from models import get_db_connection, convert_query, ensure_columns, run_ddl
+from app_logging import get_logger
+from pixel_dispatcher import dispatch_pixel
+
+log = get_logger(__name__, category='ads')
+
+
+def init_impression_tables():
+    """ad_impressions, with one impression_id per served view"""
+    run_ddl(
+        sqlite_statements=[
+            """CREATE TABLE IF NOT EXISTS ad_impressions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider VARCHAR(50) NOT NULL,
+                ad_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(20) DEFAULT 'shown',
+                watch_time INTEGER,
+                completed_at TIMESTAMP,
+                impression_id VARCHAR(32)
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_impressions_user ON ad_impressions(user_id, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_impressions_provider ON ad_impressions(provider, status)",
+        ],
+        postgres_statements=[
+            """CREATE TABLE IF NOT EXISTS ad_impressions (
+                id SERIAL PRIMARY KEY,
+                provider VARCHAR(50) NOT NULL,
+                ad_id VARCHAR(255) NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(20) DEFAULT 'shown',
+                watch_time INTEGER,
+                completed_at TIMESTAMP,
+                impression_id VARCHAR(32)
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_impressions_user ON ad_impressions(user_id, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_impressions_provider ON ad_impressions(provider, status)",
+        ]
+    )
+    # Tables created by create_offline_db.py / setup_adsterra.py predate impression_id
+    ensure_columns('ad_impressions', {'impression_id': 'VARCHAR(32)'})
+    run_ddl(
+        sqlite_statements=["CREATE INDEX IF NOT EXISTS idx_impressions_impression_id ON ad_impressions(impression_id)"],
+        postgres_statements=["CREATE INDEX IF NOT EXISTS idx_impressions_impression_id ON ad_impressions(impression_id)"]
+    )
 
 
 class BaseProvider(ABC):
@@ -14,9 +61,10 @@ class BaseProvider(ABC):
         self.name = name
         self.enabled = enabled
         self.priority = 0  # Higher = more important
+        self.timeout = 5  # Seconds; also the circuit breaker's slow-call budget
     
     @abstractmethod
-    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0):
+    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0, placement='rewarded'):
         """
         Fetch an ad from this provider
         
@@ -24,20 +72,85 @@ class BaseProvider(ABC):
             ad_format: Preferred ad format
             user_country: ISO country code
             view_count: Number of ads user has viewed
+            placement: Where the ad will be shown (response cache key)
         
         Returns:
             Dict with ad data or None
         """
         pass
     
-    @abstractmethod
-    def track_impression(self, ad_id, user_id, impression_url=None):
-        """Track when an ad is shown"""
+    def track_impression(self, ad_id, user_id, impression_url=None, impression_id=None):
+        """Record the view in ad_impressions and fire the network's impression pixel"""
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(convert_query('''
+                    INSERT INTO ad_impressions
+                    (provider, ad_id, user_id, timestamp, status, impression_id)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'shown', %s)
+                '''), (self.name, ad_id, user_id, impression_id))
+                conn.commit()
+
+            # Queued, sent in the background
+            if impression_url:
+                dispatch_pixel(impression_url, kind='impression')
+
+        except Exception as e:
+            log.error('track_impression_failed', provider=self.name, ad_id=ad_id, error=str(e))
+
+    def track_completion(self, ad_id, user_id, watch_time, impression_id=None):
+        """
+        Mark the view completed
+
+        With impression_id only that view is updated; without it (older
+        clients) every open view of ad_id by the user is.
+        """
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                if impression_id:
+                    cursor.execute(convert_query('''
+                        UPDATE ad_impressions
+                        SET status = 'completed',
+                            watch_time = %s,
+                            completed_at = CURRENT_TIMESTAMP
+                        WHERE impression_id = %s
+                        AND provider = %s
+                        AND user_id = %s
+                        AND status = 'shown'
+                    '''), (watch_time, impression_id, self.name, user_id))
+                else:
+                    cursor.execute(convert_query('''
+                        UPDATE ad_impressions
+                        SET status = 'completed',
+                            watch_time = %s,
+                            completed_at = CURRENT_TIMESTAMP
+                        WHERE provider = %s
+                        AND ad_id = %s
+                        AND user_id = %s
+                        AND status = 'shown'
+                    '''), (watch_time, self.name, ad_id, user_id))
+                conn.commit()
+        except Exception as e:
+            log.error('track_completion_failed', provider=self.name, ad_id=ad_id, error=str(e))
+    
+    def probe(self):
+        """
+        One request for the circuit breaker's recovery probe; raises
+        ProviderError when the network is still down
+        """
+        return self.fetch_ad()
+    
+    def estimated_revenue(self, ad_id):
+        """What the network pays for one completed view of ad_id (USD)"""
+        return 0.0
+    
+    def record_serve(self, ad_data, user_country, ad_format):
+        """Hook: an ad from this provider was shown (after track_impression)"""
         pass
     
-    @abstractmethod
-    def track_completion(self, ad_id, user_id, watch_time):
-        """Track when an ad is completed"""
+    def record_completion(self, ad_id, user_country, ad_format, revenue):
+        """Hook: a view was completed; country/format are those it was served for"""
         pass
     
     def get_status(self):
@@ -6,12 +6,24 @@ Fallback provider with demo ads for testing when real providers are unavailable.
 
 import random
 from .base_provider import BaseProvider
-from models import get_db_connection
+from app_logging import get_logger
+from ad_templates import compile_template
+
+log = get_logger(__name__, category='ads')
 
 
 class DemoProvider(BaseProvider):
     """Demo/Fallback ads when real providers are unavailable"""
     
+    # Ensure is_embed is set to False for demo ads
+    NON_EMBED_FIELDS = {
+        'is_embed': False,
+        'embed_script': None,
+        'embed_container': None,
+        'embed_script_id': None,
+        'unit_name': 'Demo'
+    }
+    
     def __init__(self, enabled=True):
         super().__init__('demo', enabled)
         self.priority = 0  # Lowest priority - fallback only
@@ -24,10 +36,9 @@ class DemoProvider(BaseProvider):
                 'description': 'Get 50% more data on all recharges this month!',
                 'advertiser': 'MTN South Africa',
                 'duration': 30,
-                'reward': 0.5,
+                'reward': 2.0,
                 'format': 'native',
-                'image_url': 'https://via.placeholder.com/400x300/0066CC/FFF?text=MTN',
-                'is_embed': False
+                'image_url': 'https://via.placeholder.com/400x300/0066CC/FFF?text=MTN'
             },
             {
                 'provider': 'demo',
@@ -37,10 +48,9 @@ class DemoProvider(BaseProvider):
                 'description': 'Fresh produce at unbeatable prices all week!',
                 'advertiser': 'Shoprite',
                 'duration': 20,
-                'reward': 0.3,
+                'reward': 1.5,
                 'format': 'banner',
-                'image_url': 'https://via.placeholder.com/400x300/00AA00/FFF?text=Shoprite',
-                'is_embed': False
+                'image_url': 'https://via.placeholder.com/400x300/00AA00/FFF?text=Shoprite'
             },
             {
                 'provider': 'demo',
@@ -50,49 +60,22 @@ class DemoProvider(BaseProvider):
                 'description': 'Unlimited streaming with LTE upgrade!',
                 'advertiser': 'Vodacom',
                 'duration': 25,
-                'reward': 0.4,
+                'reward': 2.0,
                 'format': 'native',
-                'image_url': 'https://via.placeholder.com/400x300/E60000/FFF?text=Vodacom',
-                'is_embed': False
+                'image_url': 'https://via.placeholder.com/400x300/E60000/FFF?text=Vodacom'
             }
         ]
+        self.reload_templates()
+    
+    def reload_templates(self):
+        """Compile demo_ads once; demo ads are never embeds"""
+        self.templates = tuple(
+            compile_template(ad['ad_id'], {**ad, **self.NON_EMBED_FIELDS}) for ad in self.demo_ads
+        )
     
-    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0):
+    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0, placement='rewarded'):
         """Return random demo ad"""
         if not self.enabled:
             return None
-        print(f"[{self.name}] Returning demo ad")
-        return random.choice(self.demo_ads)
-    
-    def track_impression(self, ad_id, user_id, impression_url=None):
-        """Track demo ad impression"""
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO ad_impressions 
-                    (provider, ad_id, user_id, timestamp, status) 
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'shown')
-                ''', (self.name, ad_id, user_id))
-                conn.commit()
-        except Exception as e:
-            print(f"Error tracking impression: {e}")
-    
-    def track_completion(self, ad_id, user_id, watch_time):
-        """Track demo ad completion"""
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE ad_impressions 
-                    SET status = 'completed', 
-                        watch_time = %s, 
-                        completed_at = CURRENT_TIMESTAMP
-                    WHERE provider = %s 
-                    AND ad_id = %s 
-                    AND user_id = %s 
-                    AND status = 'shown'
-                ''', (watch_time, self.name, ad_id, user_id))
-                conn.commit()
-        except Exception as e:
-            print(f"Error tracking completion: {e}")
+        log.debug('demo_ad', provider=self.name)
+        return random.choice(self.templates).render()
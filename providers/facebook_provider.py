@@ -0,0 +1,51 @@
+"""
+facebook_provider.py - Facebook Audience Network
+"""
+
+import random
+from .network_provider import NetworkProvider
+from config import AdConfig
+from http_client import http_get
+
+
+class FacebookAudienceNetworkProvider(NetworkProvider):
+    """Facebook Audience Network - Real API Integration"""
+    
+    REQUIRED_SETTING = 'placement ID'
+    
+    def __init__(self, enabled=True):
+        super().__init__('facebook', enabled)
+        self.placement_id = AdConfig.FACEBOOK_PLACEMENT_ID
+        self.api_key = AdConfig.FACEBOOK_API_KEY
+        self.base_url = 'https://graph.facebook.com/v18.0'
+    
+    def is_configured(self):
+        return bool(self.placement_id)
+    
+    def _send(self, ad_format, user_country):
+        # Facebook Audience Network API
+        return http_get(
+            f'{self.base_url}/network/{self.placement_id}/ad',
+            headers={'Authorization': f'Bearer {self.api_key}'},
+            params={
+                'format': 'rewarded_video',
+                'platform': 'android'
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, ad_data):
+        return {
+            'provider': 'facebook',
+            'ad_id': ad_data.get('id', f'fb_{random.randint(1000, 9999)}'),
+            'video_url': ad_data.get('video_url'),
+            'title': ad_data.get('title', 'Sponsored'),
+            'advertiser': ad_data.get('advertiser_name', 'Facebook Network'),
+            'duration': ad_data.get('duration', 30),
+            'reward': 5,
+            'format': 'video',
+            'is_embed': False,
+            'tracking_url': ad_data.get('impression_url'),
+            'image_url': ad_data.get('image_url',
+                'https://via.placeholder.com/400x300/1877F2/FFF?text=Facebook+Ads')
+        }
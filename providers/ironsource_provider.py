@@ -0,0 +1,54 @@
+"""
+ironsource_provider.py - ironSource (partner showAd API)
+"""
+
+import random
+from .network_provider import NetworkProvider
+from config import AdConfig
+from http_client import http_post
+
+
+class IronSourceProvider(NetworkProvider):
+    """ironSource - Real API Integration"""
+    
+    REQUIRED_SETTING = 'app key'
+    
+    def __init__(self, enabled=True):
+        super().__init__('ironsource', enabled)
+        self.app_key = AdConfig.IRONSOURCE_APP_KEY
+        self.base_url = 'https://platform.ironsrc.com/partners/api/v1'
+    
+    def is_configured(self):
+        return bool(self.app_key)
+    
+    def _send(self, ad_format, user_country):
+        return http_post(
+            f'{self.base_url}/showAd',
+            headers={
+                'Authorization': f'Bearer {self.app_key}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                'appKey': self.app_key,
+                'placementName': 'RewardedVideo',
+                'platform': 'android',
+                'country': user_country
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, ad_data):
+        return {
+            'provider': 'ironsource',
+            'ad_id': ad_data.get('instanceId', f'is_{random.randint(1000, 9999)}'),
+            'video_url': ad_data.get('videoUrl'),
+            'title': ad_data.get('adTitle', 'Rewarded Video'),
+            'advertiser': ad_data.get('advertiser', 'ironSource'),
+            'duration': ad_data.get('duration', 30),
+            'reward': 5,
+            'format': 'video',
+            'is_embed': False,
+            'tracking_url': ad_data.get('impressionUrl'),
+            'image_url': ad_data.get('imageUrl',
+                'https://via.placeholder.com/400x300/FF5722/FFF?text=ironSource')
+        }
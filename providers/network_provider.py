@@ -0,0 +1,106 @@
+"""
+network_provider.py - Shared base for API-served networks
+
+Unity, Facebook, Smaato, AppLovin and ironSource return creative metadata
+from an HTTP API. Each subclass only builds its request (_send) and maps
+the response (_parse); this base adds what they all share:
+
+    - credentials and timeout from config.AdConfig
+    - the response cache (response_cache.py): a fill is reused per
+      (provider, format, country, placement) for up to the network's TTL,
+      and concurrent misses share one request
+    - estimated revenue from AdConfig.EXPECTED_ECPM
+    - transport errors and 5xx answers raise ProviderError for the circuit
+      breaker; other non-200 answers are a no-fill
+"""
+
+import requests
+from .base_provider import BaseProvider
+from config import AdConfig
+from app_logging import get_logger
+from circuit_breaker import ProviderError
+from response_cache import response_cache, response_ttl, RESPONSE_CACHE_ENABLED
+
+log = get_logger(__name__, category='provider')
+
+
+class NetworkProvider(BaseProvider):
+    """An ad network reached over its HTTP API"""
+
+    # What the network needs before it can be called, for the unconfigured log line
+    REQUIRED_SETTING = 'API key'
+
+    def __init__(self, name, enabled=True):
+        super().__init__(name, enabled)
+        self.priority = AdConfig.PROVIDER_PRIORITY.get(name, 0)
+        self.timeout = AdConfig.REQUEST_TIMEOUT
+        self.cache_ttl = AdConfig.RESPONSE_CACHE_TTL.get(name, 0)
+
+    def is_configured(self):
+        """True once the network's credentials are set"""
+        raise NotImplementedError
+
+    def _send(self, ad_format, user_country):
+        """Make the network's ad request; returns the HTTP response"""
+        raise NotImplementedError
+
+    def _parse(self, ad_data):
+        """Map the network's JSON to the standard ad dict"""
+        raise NotImplementedError
+
+    def fetch_ad(self, ad_format='native', user_country='ZA', view_count=0, placement='rewarded'):
+        """
+        Fetch an ad, reused for up to cache_ttl seconds per placement
+
+        Every caller gets its own copy of a cached fill.
+        """
+        if not self.enabled or not self.is_configured():
+            log.debug('provider_unconfigured', provider=self.name, missing=self.REQUIRED_SETTING)
+            return None
+
+        if not (RESPONSE_CACHE_ENABLED and self.cache_ttl):
+            return self._request_ad(ad_format, user_country)[0]
+
+        ad = response_cache.get_or_load(
+            (self.name, ad_format, user_country, placement),
+            lambda: self._request_ad(ad_format, user_country),
+            wait=self.timeout
+        )
+        return dict(ad) if ad else None
+
+    def _request_ad(self, ad_format, user_country):
+        """
+        One live request -> (ad or None, seconds it may be cached)
+
+        Raises ProviderError if the network can't be reached, times out or
+        answers 5xx.
+        """
+        try:
+            log.debug('fetching_ad', provider=self.name)
+            response = self._send(ad_format, user_country)
+        except requests.Timeout:
+            raise ProviderError(f'timed out after {self.timeout}s', timed_out=True)
+        except requests.RequestException as e:
+            raise ProviderError(str(e))
+
+        if response.status_code >= 500:
+            raise ProviderError(f'HTTP {response.status_code}')
+        if response.status_code != 200:
+            log.warning('provider_http_error', provider=self.name, status=response.status_code)
+            return None, 0
+
+        try:
+            return self._parse(response.json()), response_ttl(response, self.cache_ttl)
+        except Exception as e:
+            log.error('fetch_failed', provider=self.name, error=str(e))
+            return None, 0
+
+    def probe(self):
+        """A live request, never answered from the response cache"""
+        if not self.enabled or not self.is_configured():
+            return None
+        return self._request_ad('native', 'ZA')[0]
+
+    def estimated_revenue(self, ad_id):
+        """Configured eCPM / 1000 - these networks don't report per-view revenue"""
+        return AdConfig.EXPECTED_ECPM.get(self.name, 0.0) / 1000
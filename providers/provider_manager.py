@@ -1,113 +1,252 @@
 """
 provider_manager.py - Orchestrates multiple ad providers
 
-Manages provider initialization, prioritization, and fallback logic.
+Builds the enabled providers from the plugin registry (see registry.py),
+serves from the warm ad pool, and falls back to a live fetch through the
+shared waterfall or auction (see selection.py). Demo ads are never
+pooled: demo stays the live last resort behind the paying networks. Every provider goes
+through the same circuit breaker, metrics, pool and tracking path.
 """
 
+import threading
+import uuid
+from collections import OrderedDict
+from config import AdConfig
 from config_adsterra import AdsterraConfig
+from app_logging import get_logger
+from provider_metrics import metrics
+from pixel_dispatcher import dispatch_pixel
+from circuit_breaker import get_breaker, make_probe
+from ad_inventory import AdInventory, AD_POOL_ENABLED
+from .registry import create_providers, enabled_provider_names
+from .selection import fetch_with_metrics, run_waterfall, run_auction, expected_ecpm
+
+log = get_logger(__name__, category='ads')
+
+# Recent serves remembered per worker so completions credit the context they were served for
+SERVED_CONTEXT_LIMIT = 10000
 
 
 class ProviderManager:
     """Manages multiple ad providers with fallback strategy"""
-    
-    def __init__(self, adsterra_enabled=True, demo_enabled=True, fallback_to_demo=True):
-        from .adsterra_provider import AdsterraProvider
-        from .demo_provider import DemoProvider
-        
-        self.providers = []
-        self.fallback_to_demo = fallback_to_demo
-        
-        # Initialize Adsterra (primary)
-        if adsterra_enabled:
-            self.providers.append(AdsterraProvider(enabled=True))
-            self.providers[-1].priority = 5
-        
-        # Initialize Demo (fallback)
-        if demo_enabled:
-            self.providers.append(DemoProvider(enabled=True))
-            self.providers[-1].priority = 1
-        
-        # Sort by priority (highest first)
-        self.providers.sort(key=lambda p: p.priority, reverse=True)
-        
+
+    def __init__(self, adsterra_enabled=None, demo_enabled=None, fallback_to_demo=None,
+                 provider_names=None, selection_mode=None):
+        """
+        Args:
+            adsterra_enabled / demo_enabled: override the configured flags
+            fallback_to_demo: serve demo even when real providers are enabled
+            provider_names: explicit registry names (default: AD_PROVIDERS / config)
+            selection_mode: 'waterfall' or 'auction' (default: AD_SELECTION_MODE)
+        """
+        names = list(provider_names) if provider_names is not None else enabled_provider_names()
+        for name, enabled in (('adsterra', adsterra_enabled), ('demo', demo_enabled)):
+            if enabled is True and name not in names:
+                names.append(name)
+            elif enabled is False and name in names:
+                names.remove(name)
+
+        # Only the enabled providers' modules are imported
+        self.providers = create_providers(names)
+        self.fallback_to_demo = AdsterraConfig.FALLBACK_TO_DEMO if fallback_to_demo is None else fallback_to_demo
+        self.selection_mode = selection_mode or AdConfig.AD_SELECTION_MODE
+
+        # Open breakers are probed in the background with a default request
+        for p in self.providers:
+            self._register_probe(p)
+
+        # (user_id, ad_id) -> (country, format) of recent serves, for completion hooks
+        self._served = OrderedDict()
+        self._served_lock = threading.Lock()
+
+        # Warm pool filled in the background; get_ad fetches live only when it is empty
+        self.inventory = AdInventory(self._fetch, self._pooled_providers) if AD_POOL_ENABLED else None
+
         # Log status
         enabled = [p.name for p in self.providers if p.enabled]
-        print(f"\n{'='*60}")
-        print(f"🎬 PROVIDER MANAGER INITIALIZED")
-        print(f"{'='*60}")
-        print(f"Enabled providers: {', '.join(enabled)}")
-        print(f"Total providers: {len(self.providers)}")
-        for p in self.providers:
-            if p.enabled:
-                print(f"  • {p.name.upper()} (priority: {p.priority})")
-        print(f"Fallback to demo: {self.fallback_to_demo}")
-        print(f"{'='*60}\n")
-    
-    def get_ad(self, ad_format='native', user_id=None, user_country='ZA', view_count=0):
+        log.info('provider_manager_initialized', providers=','.join(enabled),
+                 total=len(self.providers), fallback_to_demo=self.fallback_to_demo,
+                 mode=self.selection_mode, ad_pool=self.inventory is not None)
+
+    def _serving_providers(self):
+        """Enabled providers in fallback order; demo only if it may serve"""
+        others = [p for p in self.providers if p.enabled and p.name != 'demo']
+        return [p for p in self.providers
+                if p.enabled and (p.name != 'demo' or self.fallback_to_demo or not others)]
+
+    def _pooled_providers(self):
+        """Providers the warm pool stocks: the paying ones, never demo"""
+        return [p for p in self._serving_providers() if p.name != 'demo']
+
+    def _fetch(self, provider, ad_format, user_country, view_count=0, timeout=None, placement='rewarded'):
+        """One fetch through the provider's breaker, with metrics; None if skipped or no fill"""
+        return fetch_with_metrics(
+            provider,
+            lambda: provider.fetch_ad(ad_format=ad_format, user_country=user_country,
+                                      view_count=view_count, placement=placement),
+            timeout=timeout
+        )
+
+    def get_ad(self, ad_format='native', user_id=None, user_country='ZA', view_count=0, placement='rewarded'):
         """
         Fetch ad from providers with fallback strategy
-        
-        Tries primary providers first, falls back to demo if needed
+
+        Serves from the warm pool when it has a fresh ad (in auction mode
+        the pooled ad with the highest expected eCPM); otherwise asks the
+        providers live (waterfall or auction), demo last.
+
+        Args:
+            ad_format: 'native', 'banner', or 'social_bar'
+            user_id: Current user ID
+            user_country: ISO country code
+            view_count: Number of ads the user has viewed
+            placement: Where the ad will be shown
+
+        Returns:
+            Ad data dict (a copy, labelled with its provider) or None
         """
-        print(f"\n{'='*60}")
-        print(f"🎬 Fetching ad from {len(self.providers)} provider(s)")
-        print(f"{'='*60}")
-        
-        for provider in self.providers:
-            if not provider.enabled:
-                print(f"⊘ Provider '{provider.name}' is disabled, skipping")
-                continue
-            
-            print(f"→ Trying provider: {provider.name}")
-            
-            try:
-                ad = provider.fetch_ad(
-                    ad_format=ad_format,
-                    user_country=user_country,
-                    view_count=view_count
+        log.debug('fetch_ad', format=ad_format, country=user_country, providers=len(self.providers))
+
+        # Pooled ads first: no provider call inside the request
+        if self.inventory:
+            rank = None
+            if self.selection_mode == 'auction':
+                rank = lambda p, ad: (expected_ecpm(p, ad), getattr(p, 'priority', 0))
+            pooled = self.inventory.take(ad_format, user_country, rank=rank)
+            if pooled:
+                provider_name, ad_data = pooled
+                provider = self.get_provider(provider_name)
+                if provider:
+                    return self._serve(provider, ad_data, user_id, ad_format, user_country, pooled=True)
+
+        # Pool empty: live fetch
+        serving = self._serving_providers()
+        if self.selection_mode == 'auction':
+            bidders = [p for p in serving if p.name != 'demo']
+            provider, ad_data = run_auction(
+                bidders,
+                lambda p: self._fetch(p, ad_format, user_country, view_count,
+                                      timeout=AdConfig.AUCTION_DEADLINE, placement=placement)
+            )
+            if not ad_data:
+                provider, ad_data = run_waterfall(
+                    [p for p in serving if p.name == 'demo'],
+                    lambda p: self._fetch(p, ad_format, user_country, view_count, placement=placement)
                 )
-                
-                if ad:
-                    print(f"✓ Ad fetched from {provider.name}")
-                    print(f"  Title: {ad.get('title', 'N/A')}")
-                    print(f"  Reward: {ad.get('reward', 'N/A')} MIGP")
-                    print(f"{'='*60}\n")
-                    return ad
-                else:
-                    print(f"✗ {provider.name} returned no ad")
-            
-            except Exception as e:
-                print(f"✗ Error from {provider.name}: {e}")
-        
+        else:
+            provider, ad_data = run_waterfall(
+                serving, lambda p: self._fetch(p, ad_format, user_country, view_count, placement=placement)
+            )
+
+        if ad_data:
+            return self._serve(provider, dict(ad_data), user_id, ad_format, user_country)
+
         # All providers failed
-        print(f"\n✗ No ads available from any provider")
-        print(f"{'='*60}\n")
+        log.warning('no_ads_available', format=ad_format, country=user_country)
         return None
-    
+
+    def _serve(self, provider, ad_data, user_id, ad_format, user_country, pooled=False):
+        """
+        Track the impression and label the ad with its provider
+
+        Each view gets an impression_id; the client sends it back with the
+        completion so exactly that ad_impressions row is completed.
+        """
+        ad_data['impression_id'] = uuid.uuid4().hex
+        log.event('ad_served', provider=provider.name, title=ad_data.get('title'),
+                  reward=ad_data.get('reward'), user_id=user_id, pooled=pooled)
+
+        # Track impression
+        if user_id:
+            metrics.record_impression(provider.name)
+            provider.track_impression(ad_data['ad_id'], user_id, ad_data.get('impression_url'),
+                                      impression_id=ad_data['impression_id'])
+            provider.record_serve(ad_data, user_country, ad_format)
+            self._remember_context(user_id, ad_data['ad_id'], user_country, ad_format)
+
+        # Add provider info
+        ad_data['provider_name'] = provider.name
+        ad_data['provider'] = provider.name  # Also set 'provider' field
+        return ad_data
+
+    def _remember_context(self, user_id, ad_id, user_country, ad_format):
+        """Keep the serving context until the completion comes back (bounded, this worker only)"""
+        with self._served_lock:
+            self._served[(user_id, ad_id)] = (user_country, ad_format)
+            self._served.move_to_end((user_id, ad_id))
+            while len(self._served) > SERVED_CONTEXT_LIMIT:
+                self._served.popitem(last=False)
+
+    def get_provider(self, provider_name):
+        return next((p for p in self.providers if p.name == provider_name), None)
+
+    def estimated_revenue(self, provider_name, ad_id):
+        """What the network pays for one completed view of ad_id (USD); 0 if unknown"""
+        provider = self.get_provider(provider_name)
+        return provider.estimated_revenue(ad_id) if provider else 0.0
+
+    def record_completion(self, provider_name, ad_id, user_id):
+        """
+        Feed a completed view back to the provider's completion hook
+
+        The country and format come from the matching serve in this worker;
+        if another worker served it, get_ad's defaults are assumed.
+        """
+        provider = self.get_provider(provider_name)
+        if not provider:
+            return
+        with self._served_lock:
+            user_country, ad_format = self._served.pop((user_id, ad_id), ('ZA', 'native'))
+        provider.record_completion(ad_id, user_country, ad_format, provider.estimated_revenue(ad_id))
+
+    def complete_ad(self, provider_name, ad_id, user_id, watch_time, click_url=None, impression_id=None):
+        """
+        Mark ad as completed
+
+        Args:
+            provider_name: Provider that served the ad
+            ad_id: Ad ID
+            user_id: User ID
+            watch_time: Seconds watched
+            click_url: Optional click tracking URL
+            impression_id: The served view's impression_id, if the client sent it
+        """
+        provider = self.get_provider(provider_name)
+        if provider:
+            provider.track_completion(ad_id, user_id, watch_time, impression_id=impression_id)
+
+            # Fire click tracking if provided (queued, sent in the background)
+            if click_url:
+                dispatch_pixel(click_url, kind='click')
+
     def add_provider(self, provider_instance):
         """Add a new provider at runtime"""
         self.providers.append(provider_instance)
         self.providers.sort(key=lambda p: p.priority, reverse=True)
-        print(f"✓ Added provider: {provider_instance.name} (priority: {provider_instance.priority})")
-    
+        self._register_probe(provider_instance)
+        log.info('provider_added', provider=provider_instance.name, priority=provider_instance.priority)
+
+    def _register_probe(self, provider):
+        get_breaker(provider.name).set_probe(make_probe(provider.probe, getattr(provider, 'timeout', 5)))
+
     def disable_provider(self, provider_name):
         """Disable a provider"""
         for p in self.providers:
             if p.name == provider_name:
                 p.enabled = False
-                print(f"⊘ Disabled provider: {provider_name}")
+                log.info('provider_disabled', provider=provider_name)
                 return
-        print(f"✗ Provider '{provider_name}' not found")
-    
+        log.warning('provider_not_found', provider=provider_name)
+
     def enable_provider(self, provider_name):
         """Enable a provider"""
         for p in self.providers:
             if p.name == provider_name:
                 p.enabled = True
-                print(f"✓ Enabled provider: {provider_name}")
+                log.info('provider_enabled', provider=provider_name)
                 return
-        print(f"✗ Provider '{provider_name}' not found")
-    
+        log.warning('provider_not_found', provider=provider_name)
+
     def get_provider_status(self):
         """Get status of all providers"""
         return {
@@ -115,10 +254,12 @@ class ProviderManager:
                 {
                     'name': p.name,
                     'enabled': p.enabled,
-                    'priority': p.priority
+                    'priority': p.priority,
+                    'breaker': get_breaker(p.name).status()
                 }
                 for p in self.providers
             ],
             'total': len(self.providers),
-            'active': len([p for p in self.providers if p.enabled])
+            'active': len([p for p in self.providers if p.enabled]),
+            'mode': self.selection_mode
         }
@@ -0,0 +1,110 @@
+"""
+registry.py - Ad provider plugins, loaded lazily
+
+Every provider is a BaseProvider subclass registered by name as a
+'module:Class' path. Nothing is imported until a manager asks for an
+enabled provider, so a disabled network costs no import time and no
+startup work.
+
+Discovery:
+    - built-in providers below
+    - packages exposing the 'migpoint.ad_providers' entry point group,
+      e.g. in their pyproject.toml:
+          [project.entry-points."migpoint.ad_providers"]
+          propellerads = "propeller_plugin:PropellerAdsProvider"
+
+Which providers run, in priority order:
+    AD_PROVIDERS=adsterra,demo   explicit list (any registered name)
+    otherwise ADSTERRA_ENABLED / DEMO_ENABLED from config_adsterra, plus
+    UNITY_ENABLED, FACEBOOK_ENABLED, ... from config.AdConfig
+
+Priorities come from AdsterraConfig.PROVIDER_PRIORITY, falling back to
+the provider's own priority attribute (AdConfig.PROVIDER_PRIORITY for
+the API networks).
+"""
+
+import importlib
+import os
+from importlib.metadata import entry_points
+from dotenv import load_dotenv
+from config import AdConfig
+from config_adsterra import AdsterraConfig
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='ads')
+
+ENTRY_POINT_GROUP = 'migpoint.ad_providers'
+
+BUILTIN_PROVIDERS = {
+    'adsterra': 'providers.adsterra_provider:AdsterraProvider',
+    'demo': 'providers.demo_provider:DemoProvider',
+    'unity': 'providers.unity_provider:UnityAdsProvider',
+    'facebook': 'providers.facebook_provider:FacebookAudienceNetworkProvider',
+    'smaato': 'providers.smaato_provider:SmaatoProvider',
+    'applovin': 'providers.applovin_provider:AppLovinProvider',
+    'ironsource': 'providers.ironsource_provider:IronSourceProvider',
+}
+
+_registry = None
+_classes = {}
+
+
+def registered_providers():
+    """{name: 'module:Class'} for the built-ins plus installed entry points"""
+    global _registry
+    if _registry is None:
+        registry = dict(BUILTIN_PROVIDERS)
+        try:
+            for entry in entry_points(group=ENTRY_POINT_GROUP):
+                registry[entry.name] = entry.value
+        except Exception as e:
+            log.warning('provider_entry_points_failed', error=str(e))
+        _registry = registry
+    return _registry
+
+
+def enabled_provider_names():
+    """Names of the providers to run, highest priority first"""
+    configured = os.getenv('AD_PROVIDERS')
+    if configured:
+        names = [name.strip() for name in configured.split(',') if name.strip()]
+    else:
+        names = [name for name, enabled in (('adsterra', AdsterraConfig.ADSTERRA_ENABLED),
+                                            ('unity', AdConfig.UNITY_ENABLED),
+                                            ('facebook', AdConfig.FACEBOOK_ENABLED),
+                                            ('smaato', AdConfig.SMAATO_ENABLED),
+                                            ('applovin', AdConfig.APPLOVIN_ENABLED),
+                                            ('ironsource', AdConfig.IRONSOURCE_ENABLED),
+                                            ('demo', AdsterraConfig.DEMO_ENABLED)) if enabled]
+
+    registry = registered_providers()
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        log.warning('unknown_providers', providers=','.join(unknown))
+    return [name for name in names if name in registry]
+
+
+def load_provider_class(name):
+    """Import the provider's module on first use and return its class"""
+    cls = _classes.get(name)
+    if cls is None:
+        module_name, _, class_name = registered_providers()[name].partition(':')
+        cls = _classes[name] = getattr(importlib.import_module(module_name), class_name)
+    return cls
+
+
+def create_provider(name, enabled=True):
+    """Instantiate one registered provider with its configured priority"""
+    provider = load_provider_class(name)(enabled=enabled)
+    provider.priority = AdsterraConfig.PROVIDER_PRIORITY.get(name, provider.priority)
+    return provider
+
+
+def create_providers(names=None):
+    """Instances of the given (default: enabled) providers, highest priority first"""
+    names = enabled_provider_names() if names is None else names
+    providers = [create_provider(name) for name in names]
+    providers.sort(key=lambda p: p.priority, reverse=True)
+    return providers
@@ -0,0 +1,101 @@
+"""
+selection.py - Shared waterfall and auction for every ad manager
+
+All managers fetch through fetch_with_metrics(), so every provider gets
+the same circuit breaker and provider_metrics accounting, and choose a
+fill with the same two strategies:
+
+    waterfall   ask providers in priority order, first fill wins;
+                worst case is the sum of their timeouts
+    auction     ask every bidder at once, keep the fill with the highest
+                expected eCPM (priority breaks ties); the whole auction
+                waits at most the deadline
+
+Managers pass a fetch(provider) -> ad dict or None callable, which hides
+the different fetch_ad signatures of the provider stacks.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import AdConfig
+from provider_metrics import metrics
+from circuit_breaker import guarded_fetch
+from app_logging import get_logger
+
+log = get_logger(__name__, category='provider')
+
+
+def fetch_with_metrics(provider, call, timeout=None):
+    """
+    call() through the provider's circuit breaker, recording the outcome.
+    Returns None at once, without calling, while the breaker is open.
+    Providers return None for a no-fill and raise ProviderError when the
+    network is down; a fetch that returned nothing after using the whole
+    timeout is counted as a timeout as well.
+    """
+    outcome = guarded_fetch(provider, call, timeout=timeout)
+    if outcome.skipped:
+        return None
+    metrics.record_fetch(provider.name, outcome.elapsed, filled=bool(outcome.ad),
+                         timed_out=outcome.timed_out, error=outcome.error)
+    return outcome.ad
+
+
+def run_waterfall(providers, fetch):
+    """(provider, ad) from the first provider that fills, else (None, None)"""
+    for provider in providers:
+        log.debug('trying_provider', provider=provider.name)
+        ad_data = fetch(provider)
+        if ad_data:
+            return provider, ad_data
+    return None, None
+
+
+def expected_ecpm(provider, ad_data):
+    """The fill's own bid when the network sends one, else the configured estimate"""
+    bid = ad_data.get('ecpm') or ad_data.get('bid_price')
+    try:
+        return float(bid)
+    except (TypeError, ValueError):
+        return AdConfig.EXPECTED_ECPM.get(provider.name, 0.0)
+
+
+def run_auction(bidders, fetch, deadline=None, priority=None):
+    """
+    (provider, ad) with the highest expected eCPM among the fills that
+    arrive within deadline seconds, else (None, None)
+
+    Queued stragglers are cancelled and running ones are abandoned - their
+    own request timeout ends them. priority(provider) breaks eCPM ties.
+    """
+    if not bidders:
+        return None, None
+    deadline = AdConfig.AUCTION_DEADLINE if deadline is None else deadline
+    priority = priority or (lambda provider: getattr(provider, 'priority', 0))
+
+    executor = _auction_executor()
+    futures = {executor.submit(fetch, provider): provider for provider in bidders}
+    done, pending = wait(futures, timeout=deadline)
+    for future in pending:
+        future.cancel()
+    fills = [(futures[f], f.result()) for f in done if f.result()]
+
+    log.debug('auction_closed', bidders=len(bidders), fills=len(fills), late=len(pending))
+    if not fills:
+        return None, None
+    return max(fills, key=lambda fill: (expected_ecpm(*fill), priority(fill[0])))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _auction_executor():
+    """Thread pool shared by all auctions, created on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AdConfig.AUCTION_MAX_WORKERS,
+                                               thread_name_prefix='ad-auction')
+    return _executor
@@ -0,0 +1,59 @@
+"""
+smaato_provider.py - Smaato SOMA API (good fill in African markets)
+"""
+
+import random
+from .network_provider import NetworkProvider
+from config import AdConfig
+from http_client import http_post
+
+
+class SmaatoProvider(NetworkProvider):
+    """Smaato - Real API Integration (Great for African markets)"""
+    
+    REQUIRED_SETTING = 'publisher ID'
+    
+    def __init__(self, enabled=True):
+        super().__init__('smaato', enabled)
+        self.publisher_id = AdConfig.SMAATO_PUBLISHER_ID
+        self.adspace_id = AdConfig.SMAATO_ADSPACE_ID
+        self.base_url = 'https://soma.smaato.net/oapi'
+    
+    def is_configured(self):
+        return bool(self.publisher_id)
+    
+    def _send(self, ad_format, user_country):
+        # Smaato SOMA API
+        return http_post(
+            f'{self.base_url}/ad',
+            headers={
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            },
+            json={
+                'publisherId': self.publisher_id,
+                'adSpaceId': self.adspace_id,
+                'format': 'video',
+                'device': {
+                    'os': 'android',
+                    'geo': {'country': user_country}
+                }
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, ad_data):
+        return {
+            'provider': 'smaato',
+            'ad_id': ad_data.get('adId', f'smaato_{random.randint(1000, 9999)}'),
+            'video_url': ad_data.get('videoUrl'),
+            'title': ad_data.get('title', 'Sponsored Content'),
+            'advertiser': ad_data.get('advertiser', 'Smaato Network'),
+            'duration': ad_data.get('duration', 30),
+            'reward': 5,
+            'format': 'video',
+            'is_embed': False,
+            'tracking_url': ad_data.get('impressionUrl'),
+            'image_url': ad_data.get('imageUrl',
+                'https://via.placeholder.com/400x300/00B8D4/FFF?text=Smaato')
+        }
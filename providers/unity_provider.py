@@ -0,0 +1,55 @@
+"""
+unity_provider.py - Unity Ads (Mediation API)
+"""
+
+import random
+from .network_provider import NetworkProvider
+from config import AdConfig
+from http_client import http_post
+
+
+class UnityAdsProvider(NetworkProvider):
+    """Unity Ads - Real API Integration"""
+    
+    REQUIRED_SETTING = 'game ID'
+    
+    def __init__(self, enabled=True):
+        super().__init__('unity', enabled)
+        self.game_id = AdConfig.UNITY_GAME_ID
+        self.api_key = AdConfig.UNITY_API_KEY
+        self.base_url = 'https://monetization.api.unity.com/v1'
+    
+    def is_configured(self):
+        return bool(self.game_id)
+    
+    def _send(self, ad_format, user_country):
+        # Unity Ads Mediation API
+        return http_post(
+            f'{self.base_url}/games/{self.game_id}/mediation/ads',
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                'placement': 'rewardedVideo',
+                'platform': 'android',
+                'country': user_country
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, ad_data):
+        return {
+            'provider': 'unity',
+            'ad_id': ad_data.get('id', f'unity_{random.randint(1000, 9999)}'),
+            'video_url': ad_data.get('video_url'),
+            'title': ad_data.get('creative_name', 'Sponsored Content'),
+            'advertiser': ad_data.get('advertiser', 'Unity Network'),
+            'duration': ad_data.get('duration', 30),
+            'reward': 5,
+            'format': 'video',
+            'is_embed': False,
+            'tracking_url': ad_data.get('tracking_url'),
+            'image_url': ad_data.get('thumbnail_url',
+                'https://via.placeholder.com/400x300/FF6C00/FFF?text=Unity+Ads')
+        }
@@ -0,0 +1,355 @@
+"""
+reconcile.py - Incremental ledger reconciliation
+Checks that users.balance agrees with the signed sum of each user's
+transactions without re-summing the whole table every night.
+
+Per-user running sums live in ledger_sums. Each run folds in only the
+transactions after the stored checkpoint (a primary-key range scan), then
+compares every balance against sum + not-yet-checkpointed tail in a single
+statement. A full rebuild splits the id range into chunks summed in parallel.
+
+Usage:
+    python reconcile.py                     # incremental run + drift report
+    python reconcile.py --repair ledger     # ...and write adjustment transactions
+    python reconcile.py --repair balance    # ...and correct users.balance instead
+    python reconcile.py --rebuild --workers 8
+
+Environment:
+    RECONCILE_SETTLE_SECONDS=60    ignore transactions younger than this
+    RECONCILE_WORKERS=4            parallel chunks on rebuild
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+from ledger import SIGNED_AMOUNT_SQL, post
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='db')
+
+# Transactions commit in roughly id order; skipping the last minute keeps a
+# slow in-flight transaction from being jumped over by the checkpoint
+RECONCILE_SETTLE_SECONDS = int(os.getenv('RECONCILE_SETTLE_SECONDS', '60'))
+RECONCILE_WORKERS = int(os.getenv('RECONCILE_WORKERS', '4'))
+
+CHECKPOINT_NAME = 'reconcile'
+WRITE_BATCH_SIZE = 1000
+
+
+def init_reconcile_tables():
+    """Create the checkpoint and per-user running sum tables"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+                name VARCHAR(50) PRIMARY KEY,
+                last_transaction_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ledger_sums (
+                user_id INTEGER PRIMARY KEY,
+                ledger_sum INTEGER NOT NULL DEFAULT 0,
+                last_transaction_id INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+                name VARCHAR(50) PRIMARY KEY,
+                last_transaction_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ledger_sums (
+                user_id INTEGER PRIMARY KEY,
+                ledger_sum BIGINT NOT NULL DEFAULT 0,
+                last_transaction_id INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        ]
+    )
+
+
+# ============================================================================
+# CHECKPOINTS
+# ============================================================================
+
+def get_checkpoint(cursor):
+    cursor.execute(convert_query(
+        'SELECT last_transaction_id FROM ledger_checkpoints WHERE name = %s'
+    ), (CHECKPOINT_NAME,))
+    row = cursor.fetchone()
+    return safe_row_access(row, 'last_transaction_id', 0) if row else 0
+
+
+def _set_checkpoint(cursor, transaction_id):
+    cursor.execute(convert_query("""
+        INSERT INTO ledger_checkpoints (name, last_transaction_id, updated_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE
+        SET last_transaction_id = excluded.last_transaction_id,
+            updated_at = excluded.updated_at
+    """), (CHECKPOINT_NAME, transaction_id))
+
+
+def _high_water_mark(cursor):
+    """Newest transaction id old enough to be considered settled"""
+    # Compare on the database clock - transactions.timestamp is its default
+    if USE_SQLITE:
+        cursor.execute(
+            "SELECT MAX(id) as max_id FROM transactions WHERE timestamp < datetime('now', ?)",
+            (f'-{RECONCILE_SETTLE_SECONDS} seconds',)
+        )
+    else:
+        cursor.execute(
+            "SELECT MAX(id) as max_id FROM transactions WHERE timestamp < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (RECONCILE_SETTLE_SECONDS,)
+        )
+    row = cursor.fetchone()
+    return safe_row_access(row, 'max_id', 0) or 0
+
+
+def _sum_range(cursor, after_id, up_to_id):
+    """Signed per-user sums for transactions with after_id < id <= up_to_id"""
+    cursor.execute(convert_query(f"""
+        SELECT user_id, SUM({SIGNED_AMOUNT_SQL}) as total, MAX(id) as last_id
+        FROM transactions
+        WHERE id > %s AND id <= %s
+        GROUP BY user_id
+    """), (after_id, up_to_id))
+    return {
+        safe_row_access(row, 'user_id', 0): (safe_row_access(row, 'total', 1),
+                                             safe_row_access(row, 'last_id', 2))
+        for row in cursor.fetchall()
+    }
+
+
+def _apply_sums(cursor, sums):
+    """Add per-user partial sums into ledger_sums"""
+    rows = [(user_id, total, last_id) for user_id, (total, last_id) in sums.items()]
+    sql = convert_query("""
+        INSERT INTO ledger_sums (user_id, ledger_sum, last_transaction_id)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE
+        SET ledger_sum = ledger_sums.ledger_sum + excluded.ledger_sum,
+            last_transaction_id = excluded.last_transaction_id
+    """)
+    for i in range(0, len(rows), WRITE_BATCH_SIZE):
+        cursor.executemany(sql, rows[i:i + WRITE_BATCH_SIZE])
+
+
+# ============================================================================
+# INCREMENTAL RUN
+# ============================================================================
+
+def advance():
+    """
+    Fold transactions since the checkpoint into ledger_sums
+
+    Returns:
+        (previous_checkpoint, new_checkpoint, users_touched)
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        checkpoint = get_checkpoint(cursor)
+        high_water = _high_water_mark(cursor)
+
+        if high_water <= checkpoint:
+            cursor.close()
+            return checkpoint, checkpoint, 0
+
+        sums = _sum_range(cursor, checkpoint, high_water)
+        _apply_sums(cursor, sums)
+        _set_checkpoint(cursor, high_water)
+        conn.commit()
+        cursor.close()
+
+    return checkpoint, high_water, len(sums)
+
+
+def find_drift(limit=None):
+    """
+    Users whose balance disagrees with their ledger
+
+    Sum + tail (transactions past the checkpoint) is compared with the
+    visible balance (base + unmerged deltas) in one statement, so both
+    sides come from the same snapshot.
+
+    Returns:
+        list of dicts: user_id, balance, expected, drift (balance - expected)
+    """
+    sql = f"""
+        SELECT u.id as user_id, u.balance + COALESCE(p.pending, 0) as balance,
+               COALESCE(s.ledger_sum, 0) + COALESCE(t.tail, 0) as expected
+        FROM users u
+        LEFT JOIN ledger_sums s ON s.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, SUM(amount) as pending
+            FROM balance_deltas
+            GROUP BY user_id
+        ) p ON p.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, SUM({SIGNED_AMOUNT_SQL}) as tail
+            FROM transactions
+            WHERE id > %s
+            GROUP BY user_id
+        ) t ON t.user_id = u.id
+        WHERE u.balance + COALESCE(p.pending, 0) <> COALESCE(s.ledger_sum, 0) + COALESCE(t.tail, 0)
+        ORDER BY u.id
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        checkpoint = get_checkpoint(cursor)
+        params = [checkpoint]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(convert_query(sql), tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    report = []
+    for row in rows:
+        balance = safe_row_access(row, 'balance', 1)
+        expected = safe_row_access(row, 'expected', 2)
+        report.append({
+            'user_id': safe_row_access(row, 'user_id', 0),
+            'balance': balance,
+            'expected': expected,
+            'drift': balance - expected
+        })
+    return report
+
+
+def repair(drift_rows, mode='ledger'):
+    """
+    Fix drift reported by find_drift()
+
+    mode='ledger'  - trust users.balance; post an 'adjustment' (or
+                     'correction' for negative drift) for the gap through
+                     ledger.post, with its legs and counter, leaving the
+                     balance where it is
+    mode='balance' - trust the ledger; move users.balance by -drift.
+                     Nothing is posted: the transactions and legs are
+                     already right, a posting would move them as well
+    """
+    if mode not in ('ledger', 'balance'):
+        raise ValueError(f"Unknown repair mode: {mode}")
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for item in drift_rows:
+            drift = item['drift']
+            if mode == 'ledger':
+                result = post(item['user_id'], abs(drift), 'adjustment' if drift > 0 else 'correction',
+                              'Ledger reconciliation', require_funds=False, move_balance=False, conn=conn)
+                if not result.ok:
+                    log.error('ledger_drift_repair_failed', user_id=item['user_id'], drift=drift,
+                              reason=result.reason)
+                    continue
+            else:
+                # Relative update so concurrent earns are not overwritten
+                cursor.execute(convert_query("""
+                    UPDATE users SET balance = balance - %s WHERE id = %s
+                """), (drift, item['user_id']))
+            log.warning('ledger_drift_repaired', user_id=item['user_id'], drift=drift, mode=mode)
+        conn.commit()
+        cursor.close()
+    return len(drift_rows)
+
+
+# ============================================================================
+# FULL REBUILD
+# ============================================================================
+
+def _sum_chunk(bounds):
+    """Worker: per-user sums for one id range, on its own connection"""
+    after_id, up_to_id = bounds
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        sums = _sum_range(cursor, after_id, up_to_id)
+        cursor.close()
+    return sums
+
+
+def rebuild(workers=RECONCILE_WORKERS, chunks_per_worker=4):
+    """
+    Recompute ledger_sums from scratch
+
+    The transaction id range is split into workers * chunks_per_worker
+    slices summed concurrently; partial sums are merged in memory and
+    written back in batches. Returns (high_water_mark, users).
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        high_water = _high_water_mark(cursor)
+        cursor.execute('SELECT MIN(id) as min_id FROM transactions')
+        low = (safe_row_access(cursor.fetchone(), 'min_id', 0) or 1) - 1
+        cursor.close()
+
+    slices = max(1, workers * chunks_per_worker)
+    step = max(1, -(-(high_water - low) // slices))
+    bounds = [(start, min(start + step, high_water)) for start in range(low, high_water, step)]
+
+    totals = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for sums in pool.map(_sum_chunk, bounds):
+            for user_id, (total, last_id) in sums.items():
+                prev_total, prev_last = totals.get(user_id, (0, 0))
+                totals[user_id] = (prev_total + total, max(prev_last, last_id))
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM ledger_sums')
+        _apply_sums(cursor, totals)
+        _set_checkpoint(cursor, high_water)
+        conn.commit()
+        cursor.close()
+
+    return high_water, len(totals)
+
+
+def run(repair_mode=None, full=False, workers=RECONCILE_WORKERS):
+    """Advance (or rebuild), report drift and optionally repair it"""
+    started = time.time()
+
+    if full:
+        checkpoint, users = rebuild(workers)
+        log.info('ledger_rebuilt', checkpoint=checkpoint, users=users, workers=workers)
+    else:
+        previous, checkpoint, users = advance()
+        log.info('ledger_advanced', previous=previous, checkpoint=checkpoint, users=users)
+
+    drift = find_drift()
+    for item in drift:
+        log.warning('ledger_drift', **item)
+
+    repaired = repair(drift, repair_mode) if (drift and repair_mode) else 0
+    log.info('ledger_reconciled', drifted=len(drift), repaired=repaired,
+             seconds=round(time.time() - started, 2))
+    return drift
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconcile users.balance against transactions')
+    parser.add_argument('--rebuild', action='store_true', help='recompute all sums in parallel chunks')
+    parser.add_argument('--workers', type=int, default=RECONCILE_WORKERS)
+    parser.add_argument('--repair', choices=['ledger', 'balance'], help='fix drift after reporting it')
+    args = parser.parse_args()
+
+    from models import init_db
+    init_db()
+
+    drift = run(repair_mode=args.repair, full=args.rebuild, workers=args.workers)
+    print(f"{len(drift)} user(s) with drift")
+    for item in drift:
+        print(f"  user {item['user_id']}: balance {item['balance']} vs ledger {item['expected']} ({item['drift']:+})")
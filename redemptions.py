@@ -0,0 +1,405 @@
+"""
+redemptions.py - Durable queue for airtime/data fulfillment
+Wallet conversions debit the user and enqueue a redemption in the same
+transaction, then return immediately. Worker processes claim batches from
+the queue and hand them to a fulfillment backend (telco API), retrying with
+exponential backoff and refunding the points when a redemption finally fails.
+
+Run a worker:
+    python redemptions.py worker            # loop forever
+    python redemptions.py worker --once     # drain one batch and exit
+
+Environment:
+    REDEMPTION_BACKEND=local          fulfillment backend name
+    REDEMPTION_BATCH_SIZE=20          redemptions per backend call
+    REDEMPTION_MAX_ATTEMPTS=5         attempts before refunding
+    REDEMPTION_POLL_SECONDS=2         worker sleep when the queue is empty
+    REDEMPTION_LEASE_SECONDS=300      reclaim 'processing' rows after this
+"""
+
+import os
+import random
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl, USE_SQLITE
+from ledger import credit
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='wallet')
+
+REDEMPTION_BACKEND = os.getenv('REDEMPTION_BACKEND', 'local')
+REDEMPTION_BATCH_SIZE = int(os.getenv('REDEMPTION_BATCH_SIZE', '20'))
+REDEMPTION_MAX_ATTEMPTS = int(os.getenv('REDEMPTION_MAX_ATTEMPTS', '5'))
+REDEMPTION_POLL_SECONDS = float(os.getenv('REDEMPTION_POLL_SECONDS', '2'))
+REDEMPTION_LEASE_SECONDS = int(os.getenv('REDEMPTION_LEASE_SECONDS', '300'))
+
+# Backoff between attempts: 5s, 10s, 20s ... capped at 10 minutes
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+
+STATUS_QUEUED = 'queued'
+STATUS_PROCESSING = 'processing'
+STATUS_FULFILLED = 'fulfilled'
+STATUS_FAILED = 'failed'
+
+REDEMPTION_FIELDS = ('id', 'user_id', 'transaction_id', 'kind', 'product', 'points', 'phone',
+                     'status', 'attempts', 'last_error', 'provider_ref', 'created_at', 'updated_at')
+
+
+def init_redemption_tables():
+    """Create the redemption queue and its claim index"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS redemptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                transaction_id INTEGER REFERENCES transactions(id),
+                kind VARCHAR(20) NOT NULL,
+                product VARCHAR(50) NOT NULL,
+                points INTEGER NOT NULL,
+                phone VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL,
+                locked_by VARCHAR(100),
+                locked_at TIMESTAMP,
+                last_error TEXT,
+                provider_ref VARCHAR(100),
+                created_at TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_redemptions_claim
+            ON redemptions(status, next_attempt_at)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_redemptions_user
+            ON redemptions(user_id, id DESC)
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS redemptions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                transaction_id INTEGER REFERENCES transactions(id),
+                kind VARCHAR(20) NOT NULL,
+                product VARCHAR(50) NOT NULL,
+                points INTEGER NOT NULL,
+                phone VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL,
+                locked_by VARCHAR(100),
+                locked_at TIMESTAMP,
+                last_error TEXT,
+                provider_ref VARCHAR(100),
+                created_at TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_redemptions_claim
+            ON redemptions(next_attempt_at)
+            WHERE status IN ('queued', 'processing')
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_redemptions_user
+            ON redemptions(user_id, id DESC)
+            """
+        ]
+    )
+
+
+def _now():
+    """UTC timestamp in a form both databases compare correctly"""
+    now = datetime.utcnow().replace(microsecond=0)
+    return now.strftime('%Y-%m-%d %H:%M:%S') if USE_SQLITE else now
+
+
+def _after(seconds):
+    later = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=seconds)
+    return later.strftime('%Y-%m-%d %H:%M:%S') if USE_SQLITE else later
+
+
+def _row_dict(row):
+    return {key: safe_row_access(row, key, i) for i, key in enumerate(REDEMPTION_FIELDS)}
+
+
+# ============================================================================
+# FULFILLMENT BACKENDS
+# ============================================================================
+
+class FulfillmentResult(NamedTuple):
+    """Backend outcome for one redemption"""
+    redemption_id: int
+    ok: bool
+    reference: Optional[str] = None    # telco reference on success
+    error: Optional[str] = None
+    retryable: bool = True             # False = give up and refund now
+
+
+class FulfillmentBackend:
+    """
+    Base class for telco fulfillment backends.
+    fulfill_batch() receives a list of redemption dicts and must return one
+    FulfillmentResult per item; raising marks the whole batch for retry.
+    """
+
+    name = 'base'
+
+    def fulfill_batch(self, redemptions):
+        raise NotImplementedError
+
+
+class LocalFulfillmentBackend(FulfillmentBackend):
+    """
+    Stand-in backend for development and tests - no network calls.
+    LOCAL_FULFILLMENT_DELAY and LOCAL_FULFILLMENT_FAILURE_RATE simulate a
+    slow or flaky upstream.
+    """
+
+    name = 'local'
+
+    def __init__(self, delay=None, failure_rate=None):
+        self.delay = float(os.getenv('LOCAL_FULFILLMENT_DELAY', '0') if delay is None else delay)
+        self.failure_rate = float(os.getenv('LOCAL_FULFILLMENT_FAILURE_RATE', '0')
+                                  if failure_rate is None else failure_rate)
+
+    def fulfill_batch(self, redemptions):
+        if self.delay:
+            time.sleep(self.delay)
+
+        results = []
+        for item in redemptions:
+            if random.random() < self.failure_rate:
+                results.append(FulfillmentResult(item['id'], False, error='simulated upstream failure'))
+            else:
+                results.append(FulfillmentResult(item['id'], True, reference=f"LOCAL-{item['id']}"))
+        return results
+
+
+# Backends selectable through REDEMPTION_BACKEND
+BACKENDS = {
+    'local': LocalFulfillmentBackend
+}
+
+
+def register_backend(name, backend_class):
+    """Make a FulfillmentBackend subclass selectable by name"""
+    BACKENDS[name] = backend_class
+
+
+def get_backend(name=None):
+    name = name or REDEMPTION_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown redemption backend: {name}")
+    return BACKENDS[name]()
+
+
+# ============================================================================
+# QUEUE OPERATIONS
+# ============================================================================
+
+def enqueue_redemption(conn, user_id, transaction_id, kind, product, points, phone):
+    """
+    Queue a redemption on the caller's connection, so it commits together
+    with the debit that paid for it. Returns the redemption id.
+    """
+    now = _now()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(convert_query("""
+            INSERT INTO redemptions
+                (user_id, transaction_id, kind, product, points, phone,
+                 status, next_attempt_at, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """), (user_id, transaction_id, kind, product, points, phone,
+               STATUS_QUEUED, now, now, now))
+        return safe_row_access(cursor.fetchone(), 'id', 0)
+    finally:
+        cursor.close()
+
+
+def get_redemption(redemption_id, user_id=None):
+    """Fetch one redemption (optionally scoped to its owner) as a dict"""
+    sql = f"SELECT {', '.join(REDEMPTION_FIELDS)} FROM redemptions WHERE id = %s"
+    params = [redemption_id]
+    if user_id is not None:
+        sql += " AND user_id = %s"
+        params.append(user_id)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(sql), tuple(params))
+        row = cursor.fetchone()
+        cursor.close()
+    return _row_dict(row) if row else None
+
+
+def claim_batch(worker_id, limit=REDEMPTION_BATCH_SIZE):
+    """
+    Atomically move up to `limit` due redemptions to 'processing'
+
+    PostgreSQL uses FOR UPDATE SKIP LOCKED so concurrent workers never wait
+    on or double-claim each other's rows. SQLite serializes writers, so the
+    same single UPDATE is already exclusive there. Rows stuck in
+    'processing' past the lease (crashed worker) are claimed again.
+    """
+    now = _now()
+    lease_expired = _after(-REDEMPTION_LEASE_SECONDS)
+    due = """
+        (status = %s AND next_attempt_at <= %s)
+        OR (status = %s AND locked_at < %s)
+    """
+    lock = '' if USE_SQLITE else 'FOR UPDATE SKIP LOCKED'
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(convert_query(f"""
+            UPDATE redemptions
+            SET status = %s, locked_by = %s, locked_at = %s,
+                attempts = attempts + 1, updated_at = %s
+            WHERE id IN (
+                SELECT id FROM redemptions
+                WHERE {due}
+                ORDER BY next_attempt_at, id
+                LIMIT %s
+                {lock}
+            )
+            RETURNING {', '.join(REDEMPTION_FIELDS)}
+        """), (STATUS_PROCESSING, worker_id, now, now,
+               STATUS_QUEUED, now, STATUS_PROCESSING, lease_expired, limit))
+        rows = [_row_dict(row) for row in cursor.fetchall()]
+        conn.commit()
+        cursor.close()
+    return rows
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter for the given attempt count"""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def record_results(batch, results, worker_id):
+    """
+    Apply backend results: fulfil, reschedule or fail-and-refund
+
+    Each update only applies while worker_id still holds the row. If the
+    lease expired and another worker reclaimed it, that worker owns the
+    outcome, so the result is dropped (counted as 'stale') and nothing is
+    refunded.
+    """
+    by_id = {item['id']: item for item in batch}
+    now = _now()
+    counts = {STATUS_FULFILLED: 0, STATUS_QUEUED: 0, STATUS_FAILED: 0, 'stale': 0}
+    held = "id = %s AND locked_by = %s AND status = %s"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for result in results:
+            item = by_id.get(result.redemption_id)
+            if item is None:
+                continue
+
+            if result.ok:
+                status = STATUS_FULFILLED
+                cursor.execute(convert_query(f"""
+                    UPDATE redemptions
+                    SET status = %s, provider_ref = %s, last_error = NULL,
+                        locked_by = NULL, updated_at = %s
+                    WHERE {held}
+                """), (status, result.reference, now, item['id'], worker_id, STATUS_PROCESSING))
+            elif result.retryable and item['attempts'] < REDEMPTION_MAX_ATTEMPTS:
+                status = STATUS_QUEUED
+                cursor.execute(convert_query(f"""
+                    UPDATE redemptions
+                    SET status = %s, last_error = %s, next_attempt_at = %s,
+                        locked_by = NULL, updated_at = %s
+                    WHERE {held}
+                """), (status, result.error, _after(backoff_seconds(item['attempts'])), now,
+                       item['id'], worker_id, STATUS_PROCESSING))
+            else:
+                status = STATUS_FAILED
+                cursor.execute(convert_query(f"""
+                    UPDATE redemptions
+                    SET status = %s, last_error = %s, locked_by = NULL, updated_at = %s
+                    WHERE {held}
+                """), (status, result.error, now, item['id'], worker_id, STATUS_PROCESSING))
+
+            if cursor.rowcount != 1:
+                log.warning('redemption_lease_lost', redemption_id=item['id'], worker=worker_id, result=status)
+                counts['stale'] += 1
+                continue
+
+            if status == STATUS_FAILED:
+                credit(item['user_id'], item['points'],
+                       f"Refund: {item['kind'].title()} {item['product']}",
+                       txn_type='refund', conn=conn)
+                log.warning('redemption_failed', redemption_id=item['id'],
+                            user_id=item['user_id'], attempts=item['attempts'], error=result.error)
+
+            counts[status] += 1
+        conn.commit()
+        cursor.close()
+    return counts
+
+
+def process_batch(backend, worker_id, limit=REDEMPTION_BATCH_SIZE):
+    """Claim, fulfil and record one batch. Returns the number claimed."""
+    batch = claim_batch(worker_id, limit)
+    if not batch:
+        return 0
+
+    try:
+        results = backend.fulfill_batch(batch)
+    except Exception as e:
+        log.exception('fulfillment_batch_failed', backend=backend.name, size=len(batch), error=str(e))
+        results = [FulfillmentResult(item['id'], False, error=str(e)) for item in batch]
+
+    # Anything the backend did not answer for is retried
+    answered = {r.redemption_id for r in results}
+    results = list(results) + [FulfillmentResult(item['id'], False, error='no result from backend')
+                               for item in batch if item['id'] not in answered]
+
+    counts = record_results(batch, results, worker_id)
+    log.event('redemption_batch', backend=backend.name, size=len(batch), **counts)
+    return len(batch)
+
+
+def run_worker(backend=None, once=False, batch_size=REDEMPTION_BATCH_SIZE):
+    """Process the queue until interrupted (or one pass with once=True)"""
+    backend = backend or get_backend()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    log.info('redemption_worker_started', worker=worker_id, backend=backend.name, batch_size=batch_size)
+
+    while True:
+        claimed = process_batch(backend, worker_id, batch_size)
+        if once:
+            return claimed
+        if claimed < batch_size:
+            time.sleep(REDEMPTION_POLL_SECONDS)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'worker':
+        print("Usage: python redemptions.py worker [--once]")
+        sys.exit(1)
+
+    from models import init_db
+    init_db()
+
+    try:
+        run_worker(once='--once' in sys.argv)
+    except KeyboardInterrupt:
+        print("\nWorker stopped")
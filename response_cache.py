@@ -0,0 +1,170 @@
+"""
+response_cache.py - Short-lived cache of provider ad responses
+Networks that return creative metadata (Unity, Facebook, Smaato, AppLovin,
+ironSource) were asked once per ad view although their creatives change
+far less often. A fill is now kept per (provider, format, country,
+placement) for the provider's TTL and reused for later views.
+
+    - TTL: AdConfig.RESPONSE_CACHE_TTL per provider, shortened by the
+      response's Cache-Control (no-store / no-cache / private, max-age,
+      s-maxage), Expires and Age headers; no-fills are never stored
+    - single flight: concurrent misses for one key make one request and
+      the others wait for its result (up to the provider's timeout)
+    - at most RESPONSE_CACHE_MAX_ENTRIES keys, least recently used evicted
+
+Cached values are shared; callers must copy before changing them
+(providers/network_provider.py hands each caller its own copy).
+
+Environment:
+    RESPONSE_CACHE_ENABLED=True
+    RESPONSE_CACHE_MAX_ENTRIES=1000
+    RESPONSE_CACHE_TTL=120        default seconds; <PROVIDER>_CACHE_TTL per network
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='provider')
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+
+def response_ttl(response, ttl):
+    """
+    Seconds the response may be reused: at most ttl, less if its headers
+    say so, 0 if they forbid caching
+    """
+    headers = response.headers
+    directives = {}
+    for part in headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    if directives.keys() & {'no-store', 'no-cache', 'private'}:
+        return 0
+
+    allowed = None
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                allowed = int(directives[name])
+                break
+            except ValueError:
+                return 0
+    if allowed is None and headers.get('Expires'):
+        try:
+            expires = parsedate_to_datetime(headers['Expires'])
+            date = parsedate_to_datetime(headers['Date']) if headers.get('Date') else datetime.now(timezone.utc)
+            allowed = int((expires - date).total_seconds())
+        except (TypeError, ValueError):
+            return 0    # invalid Expires means already expired
+
+    if allowed is not None:
+        try:
+            allowed -= int(headers.get('Age') or 0)
+        except ValueError:
+            pass
+        ttl = min(ttl, allowed)
+    return max(ttl, 0)
+
+
+class _Flight:
+    """One in-progress load that concurrent misses wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    """TTL + LRU cache with single-flight loading"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}             # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'stored': 0,
+                       'uncacheable': 0, 'evictions': 0}
+
+    def get_or_load(self, key, load, wait=None):
+        """
+        Cached value for key, else load() -> (value, ttl). The value is
+        stored for ttl seconds unless it is falsy or ttl is 0. Callers that
+        miss while another load of key is running wait up to `wait`
+        seconds for it and share its value (None if it took longer).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait(wait)
+            return flight.value
+
+        value, ttl = None, 0
+        try:
+            value, ttl = load()
+            return value
+        finally:
+            with self._lock:
+                if value and ttl > 0:
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(key)
+                    self._stats['stored'] += 1
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._stats['evictions'] += 1
+                elif value:
+                    self._stats['uncacheable'] += 1
+                del self._inflight[key]
+            flight.value = value
+            flight.done.set()
+
+    def invalidate(self, provider=None):
+        """Drop every entry, or only one provider's (keys start with the provider name)"""
+        with self._lock:
+            if provider is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == provider]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['loading'] = len(self._inflight)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = round((stats['hits'] + stats['coalesced']) / lookups, 3) if lookups else None
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def get_response_cache_stats():
+    return response_cache.stats()
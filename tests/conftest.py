@@ -0,0 +1,54 @@
+"""
+conftest.py - Shared fixtures
+Tests run against a throwaway SQLite database (offline mode), created
+empty and initialised by models.init_db() for every test.
+"""
+
+import os
+import tempfile
+
+# models picks the database when it is imported, and offline mode needs the file to exist
+_bootstrap_db = os.path.join(tempfile.mkdtemp(prefix='migpoint-tests-'), 'bootstrap.db')
+open(_bootstrap_db, 'a').close()
+os.environ['DB_MODE'] = 'offline'
+os.environ['OFFLINE_DB_PATH'] = _bootstrap_db
+
+import pytest
+import models
+from provider_metrics import metrics
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """Path of a new, empty SQLite file that models now connects to"""
+    path = tmp_path / 'test.db'
+    path.touch()
+    monkeypatch.setattr(models, 'OFFLINE_DB_PATH', str(path))
+    return path
+
+
+@pytest.fixture
+def db(empty_db):
+    """A fresh database with the core and feature tables and the demo users"""
+    models.init_db()
+    yield empty_db
+    # Buffered provider stats belong to this database, not to the next test's
+    metrics.flush()
+
+
+@pytest.fixture
+def client(db):
+    """Test client logged in as John Doe (user 2) via quick login"""
+    from app import app
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.get('/auth/quick-login/0829876543')
+    return client
+
+
+def query(sql, params=()):
+    """Rows of one query against the test database, as sqlite3.Row"""
+    with models.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(models.convert_query(sql), params)
+        return cursor.fetchall()
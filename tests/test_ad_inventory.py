@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from ad_inventory import AdInventory
+from providers.provider_manager import ProviderManager
+
+
+def _inventory(providers):
+    inventory = AdInventory(lambda provider, ad_format, country: {'ad_id': provider.name, **provider.ad},
+                            lambda: providers, size=2, low_watermark=0)
+    inventory._ensure_worker = lambda: None
+    inventory.warm('native', 'ZA')
+    inventory.refill()
+    return inventory
+
+
+def test_take_serves_the_first_provider_in_order():
+    low = SimpleNamespace(name='low', ad={'ecpm': 0.5})
+    high = SimpleNamespace(name='high', ad={'ecpm': 2.0})
+    inventory = _inventory([low, high])
+
+    assert inventory.take('native', 'ZA')[0] == 'low'
+
+
+def test_take_with_rank_serves_the_best_head():
+    low = SimpleNamespace(name='low', ad={'ecpm': 0.5})
+    high = SimpleNamespace(name='high', ad={'ecpm': 2.0})
+    inventory = _inventory([low, high])
+
+    rank = lambda provider, ad: ad['ecpm']
+    assert [inventory.take('native', 'ZA', rank=rank)[0] for _ in range(3)] == ['high', 'high', 'low']
+
+
+def test_demo_is_never_pooled():
+    manager = ProviderManager(provider_names=['adsterra', 'demo'], fallback_to_demo=True)
+
+    assert 'demo' in [p.name for p in manager._serving_providers()]
+    assert 'demo' not in [p.name for p in manager._pooled_providers()]
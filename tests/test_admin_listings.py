@@ -0,0 +1,34 @@
+import admin_listings
+from admin_listings import list_users
+import models
+from conftest import query
+
+
+def _add_users(names):
+    with models.get_db_connection() as conn:
+        conn.executemany("INSERT INTO users (phone, password_hash, name, balance) VALUES (?, 'x', ?, 0)",
+                         [(f'07{i:08d}', name) for i, name in enumerate(names)])
+
+
+def test_name_sort_pages_case_insensitively(db):
+    _add_users(['alice', 'Bob', 'carol', 'Dave', 'eve'])
+
+    names, cursor_value = [], None
+    while True:
+        rows, cursor_value, _ = list_users(sort='name', cursor_value=cursor_value, limit=2)
+        names.extend(row['name'] for row in rows)
+        if not cursor_value:
+            break
+
+    assert names == sorted(names, key=str.lower)
+    assert len(names) == 8
+
+
+def test_name_sort_uses_the_nocase_index(db):
+    sql = "SELECT u.id FROM users u ORDER BY {} ASC, u.id ASC LIMIT 3".format(
+        'u.name COLLATE ' + admin_listings.SORT_COLLATIONS['u.name'])
+
+    plan = ' '.join(row[3] for row in query('EXPLAIN QUERY PLAN ' + sql))
+
+    assert 'idx_users_name_id' in plan
+    assert 'TEMP B-TREE' not in plan
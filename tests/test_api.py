@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.mark.parametrize('count, expected', [('abc', 4), ('', 4), ('0', 1), ('-3', 1), ('2', 2), ('50', 10)])
+def test_ads_count_is_clamped(client, count, expected):
+    response = client.get(f'/api/v1/ads?count={count}')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['ads']) == expected
+
+
+def test_ads_have_no_etag(client):
+    response = client.get('/api/v1/ads', headers={'If-None-Match': '*'})
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_dashboard_still_answers_304(client):
+    etag = client.get('/api/v1/dashboard').headers['ETag']
+
+    response = client.get('/api/v1/dashboard', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
@@ -0,0 +1,93 @@
+import pytest
+
+import bulk_adjust
+from bulk_adjust import bulk_adjust as run_bulk_adjust
+from conftest import query
+
+
+def _balances():
+    return {row['id']: row['balance'] for row in query('SELECT id, balance FROM users ORDER BY id')}
+
+
+def _counts():
+    return (query('SELECT COUNT(*) AS n FROM transactions')[0]['n'],
+            query('SELECT COUNT(*) AS n FROM ledger_entries')[0]['n'])
+
+
+def test_csv_credit_and_debit(db):
+    result = run_bulk_adjust('bonus', 'Promo', csv_text='user_id,amount\n2,10\n3,-30\n2,5\n')
+
+    assert result.ok and result.users == 2
+    assert (result.credited, result.debited) == (15, 30)
+    balances = _balances()
+    assert (balances[2], balances[3]) == (465, 250)
+    types = query('SELECT user_id, type, amount FROM transactions ORDER BY user_id')
+    assert [tuple(row) for row in types] == [(2, 'bonus', 15), (3, 'correction', 30)]
+    assert _counts() == (2, 4)
+
+
+def test_overdraft_rolls_back_everything(db):
+    before = _balances()
+
+    result = run_bulk_adjust('bonus', 'Promo', csv_text='user_id,amount\n2,10\n3,-281\n')
+
+    assert not result.ok and result.reason == 'insufficient_funds'
+    assert _balances() == before
+    assert _counts() == (0, 0)
+
+
+def test_short_target_caught_by_update_guard_rolls_back(db, monkeypatch):
+    # Simulate a spend landing between the funds check and the UPDATE:
+    # the check passes, the UPDATE's own guard must still refuse
+    real_apply = bulk_adjust._apply_sqlite
+
+    def apply_after_concurrent_spend(cursor, txn_type, description, users):
+        cursor.execute('UPDATE users SET balance = 0 WHERE id = 3')
+        return real_apply(cursor, txn_type, description, users)
+
+    monkeypatch.setattr(bulk_adjust, '_apply_sqlite', apply_after_concurrent_spend)
+    before = _balances()
+
+    result = run_bulk_adjust('bonus', 'Promo', csv_text='user_id,amount\n2,10\n3,-30\n')
+
+    assert not result.ok and result.reason == 'insufficient_funds'
+    assert _balances() == before
+    assert _counts() == (0, 0)
+
+
+def test_dry_run_rolls_back(db):
+    before = _balances()
+
+    result = run_bulk_adjust('adjustment', 'Test', user_filter='all', amount=5, dry_run=True)
+
+    assert result.ok and result.users == 3
+    assert _balances() == before
+    assert _counts() == (0, 0)
+
+
+@pytest.mark.parametrize('amount', ['nan', 'inf', '-inf'])
+def test_non_finite_csv_amount_is_rejected(db, amount):
+    before = _balances()
+
+    result = run_bulk_adjust('bonus', 'Promo', csv_text=f'user_id,amount\n2,10\n3,{amount}\n')
+
+    assert not result.ok and result.reason == 'invalid_csv'
+    assert _balances() == before
+
+
+@pytest.mark.parametrize('amount', [float('nan'), float('inf'), 0.4])
+def test_filter_amount_must_be_a_finite_point(db, amount):
+    result = run_bulk_adjust('bonus', 'Promo', user_filter='all', amount=amount)
+
+    assert not result.ok and result.reason == 'invalid_amount'
+
+
+def test_amounts_are_rounded_to_whole_points(db):
+    before = _balances()
+
+    result = run_bulk_adjust('bonus', 'Promo', csv_text='user_id,amount\n2,10.555\n3,-2.5\n')
+
+    assert result.ok
+    after = _balances()
+    assert (after[2] - before[2], after[3] - before[3]) == (11, -3)
+    assert [row['amount'] for row in query('SELECT amount FROM transactions ORDER BY user_id')] == [11, 3]
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import circuit_breaker
+from circuit_breaker import CLOSED, OPEN, ProviderError, get_breaker, make_probe
+from providers.network_provider import NetworkProvider
+from providers.selection import fetch_with_metrics
+
+
+class _Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+
+class FakeNetwork(NetworkProvider):
+    def __init__(self, name, send):
+        super().__init__(name)
+        self.cache_ttl = 0
+        self._send_impl = send
+
+    def is_configured(self):
+        return True
+
+    def _send(self, ad_format, user_country):
+        return self._send_impl()
+
+    def _parse(self, ad_data):
+        return {'provider': self.name, 'ad_id': ad_data['id']}
+
+
+def _refused():
+    raise requests.ConnectionError('connection refused')
+
+
+@pytest.mark.parametrize('name, send', [
+    ('refused', _refused),
+    ('server_error', lambda: _Response(503)),
+])
+def test_fast_failures_open_the_breaker(name, send):
+    provider = FakeNetwork(f'test_{name}', send)
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS):
+        assert fetch_with_metrics(provider, provider.fetch_ad) is None
+
+    assert get_breaker(provider.name).state == OPEN
+
+
+def test_no_fill_does_not_open_the_breaker():
+    provider = FakeNetwork('test_no_fill', lambda: _Response(204))
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS * 2):
+        assert fetch_with_metrics(provider, provider.fetch_ad) is None
+
+    assert get_breaker(provider.name).state == CLOSED
+
+
+def test_timeout_is_reported_as_timeout():
+    def timeout():
+        raise requests.Timeout('read timed out')
+    provider = FakeNetwork('test_timeout', timeout)
+
+    outcome = circuit_breaker.guarded_fetch(provider, provider.fetch_ad)
+
+    assert outcome.timed_out and not outcome.error
+
+
+def test_probe_fails_while_network_is_down():
+    provider = FakeNetwork('test_probe', lambda: _Response(502))
+    with pytest.raises(ProviderError):
+        make_probe(provider.probe, timeout=5)()
+
+    provider._send_impl = lambda: _Response(200, {'id': 'x'})
+    assert make_probe(provider.probe, timeout=5)() is True
+
+
+def _half_open(breaker, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, 'BREAKER_OPEN_SECONDS', 0)
+    breaker._open_seconds = 0
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS):
+        breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_in_flight_calls_do_not_settle_a_probing_breaker(monkeypatch):
+    breaker = circuit_breaker.CircuitBreaker('probing')
+    release = threading.Event()
+    breaker.set_probe(lambda: release.wait(5))
+    _half_open(breaker, monkeypatch)
+
+    assert breaker.allow() is False
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == circuit_breaker.HALF_OPEN
+
+    release.set()
+    for _ in range(100):
+        if breaker.state == CLOSED:
+            break
+        time.sleep(0.01)
+    assert breaker.state == CLOSED
+
+
+def test_only_the_trial_call_settles_a_probe_less_breaker(monkeypatch):
+    breaker = circuit_breaker.CircuitBreaker('trial')
+    _half_open(breaker, monkeypatch)
+
+    assert breaker.allow() is True
+    stale = threading.Thread(target=breaker.record, args=(True, 0.1))
+    stale.start()
+    stale.join()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
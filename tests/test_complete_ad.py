@@ -0,0 +1,31 @@
+from conftest import query
+
+USER_ID = 2     # John Doe
+
+
+def _state():
+    balance = query('SELECT balance FROM users WHERE id = %s', (USER_ID,))[0]['balance']
+    watches = query('SELECT COUNT(*) FROM watched_ads WHERE user_id = %s', (USER_ID,))[0][0]
+    return balance, watches
+
+
+def test_reward_below_one_point_is_rejected_without_recording_the_watch(client):
+    before = _state()
+
+    response = client.post('/complete_ad', json={'ad_id': 'demo_1', 'provider': 'demo', 'reward': 0.1})
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert _state() == before
+
+
+def test_valid_reward_is_paid(client):
+    balance, watches = _state()
+
+    response = client.post('/complete_ad', json={'ad_id': 'demo_1', 'provider': 'demo', 'reward': 2})
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+    new_balance, new_watches = _state()
+    assert new_balance > balance
+    assert new_watches == watches + 1
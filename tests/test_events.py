@@ -0,0 +1,51 @@
+import time
+
+import models
+import events
+
+
+def test_single_threaded_worker_gets_no_stream(client):
+    response = client.get('/events', environ_overrides={'wsgi.multithread': False})
+
+    assert response.status_code == 204
+    assert events.event_bus.get_stats()['connections'] == 0
+
+
+def test_threaded_worker_gets_a_stream(client):
+    response = client.get('/events', environ_overrides={'wsgi.multithread': True}, buffered=False)
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert next(response.response).startswith(b'retry:')
+    finally:
+        response.close()
+
+
+
+def _watched(ad_id, seconds_ago):
+    with models.get_db_connection() as conn:
+        conn.execute("""
+            INSERT INTO watched_ads (user_id, ad_id, provider, reward, timestamp)
+            VALUES (2, ?, 'demo', 2, datetime('now', ?))
+        """, (ad_id, f'-{seconds_ago} seconds'))
+
+
+def test_recent_cooldowns_come_from_watched_ads(db):
+    _watched('fresh', 10)
+    _watched('old', 120)
+
+    expiries = events.recent_cooldowns(2)
+
+    assert list(expiries) == ['fresh']
+    assert 45 < expiries['fresh'] - time.time() <= 50
+
+
+def test_new_stream_emits_expiry_of_an_earlier_cooldown(db):
+    _watched('demo_1', events.AD_COOLDOWN_SECONDS - 1)
+    stream = events.stream_events(events.event_bus.subscribe(2))
+    try:
+        frames = [next(stream) for _ in range(3)]
+    finally:
+        stream.close()
+
+    assert frames[2] == events.format_sse('cooldown_expired', {'ad_id': 'demo_1'})
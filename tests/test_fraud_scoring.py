@@ -0,0 +1,38 @@
+import numpy as np
+
+import models
+from fraud_scoring import FRAUD_REVIEW_THRESHOLD, _save_scores, get_flagged, set_review_status
+
+USER_ID = 2
+
+
+def _score(score):
+    features = {'fast_ratio': np.array([0.0])}
+    with models.get_db_connection() as conn:
+        _save_scores(conn.cursor(), np.array([USER_ID]), np.array([10]), np.array([score]), features)
+
+
+def _status():
+    return {row['user_id']: row['status'] for status in ('pending', 'cleared', 'blocked')
+            for row in get_flagged(status)}.get(USER_ID)
+
+
+def test_cleared_user_is_reopened_when_the_score_rises(db):
+    _score(FRAUD_REVIEW_THRESHOLD + 0.1)
+    assert _status() == 'pending'
+    assert set_review_status(USER_ID, 'cleared')
+
+    _score(FRAUD_REVIEW_THRESHOLD + 0.1)
+    assert _status() == 'cleared'
+
+    _score(FRAUD_REVIEW_THRESHOLD + 0.2)
+    assert _status() == 'pending'
+
+
+def test_blocked_user_stays_blocked(db):
+    _score(FRAUD_REVIEW_THRESHOLD + 0.1)
+    set_review_status(USER_ID, 'blocked')
+
+    _score(FRAUD_REVIEW_THRESHOLD + 0.3)
+
+    assert _status() == 'blocked'
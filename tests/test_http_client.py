@@ -0,0 +1,57 @@
+import time
+
+import pytest
+import requests
+
+import http_client
+
+URL = 'https://ads.example.test/fill'
+
+
+@pytest.fixture
+def attempts(monkeypatch):
+    """Per-attempt (connect, read) timeouts; every attempt fails to connect"""
+    seen = []
+
+    def refuse(method, url, timeout=None, **kwargs):
+        seen.append(timeout)
+        raise requests.ConnectionError('refused')
+
+    monkeypatch.setattr(http_client.get_session(URL), 'request', refuse)
+    return seen
+
+
+def test_retries_that_fit_the_budget_are_made(monkeypatch, attempts):
+    monkeypatch.setattr(http_client, '_backoff', lambda attempt: 0.05)
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.http_get(URL, timeout=(0.1, 1.0), retries=2)
+
+    assert len(attempts) == 3
+    assert attempts[0] == (0.1, pytest.approx(1.0, abs=0.01))
+    assert all(read < 1.0 for connect, read in attempts[1:])
+
+
+def test_retry_is_skipped_when_its_backoff_would_overrun_the_budget(monkeypatch, attempts):
+    monkeypatch.setattr(http_client, '_backoff', lambda attempt: 0.5)
+    started = time.monotonic()
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.http_get(URL, timeout=(0.1, 0.4), retries=2)
+
+    assert len(attempts) == 1
+    assert time.monotonic() - started < 0.4
+
+
+def test_budget_bounds_the_whole_call(monkeypatch, attempts):
+    monkeypatch.setattr(http_client, '_backoff', lambda attempt: 0.1)
+
+    started = time.monotonic()
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.http_get(URL, timeout=(0.1, 5), retries=5, budget=0.45)
+
+    # t=0, 0.1, 0.2, 0.3; a fifth attempt would start at 0.4 with no full connect timeout left
+    assert len(attempts) == 4
+    assert all(read <= 0.45 for connect, read in attempts)
+    assert time.monotonic() - started < 0.45
@@ -0,0 +1,42 @@
+from providers.demo_provider import DemoProvider
+from providers.provider_manager import ProviderManager
+from conftest import query
+
+
+def _impressions():
+    return query('SELECT impression_id, status, watch_time FROM ad_impressions ORDER BY id')
+
+
+def test_completion_marks_only_its_impression(db):
+    provider = DemoProvider()
+    provider.track_impression('demo_1', 2, impression_id='a' * 32)
+    provider.track_impression('demo_1', 2, impression_id='b' * 32)
+
+    provider.track_completion('demo_1', 2, 25, impression_id='b' * 32)
+
+    rows = _impressions()
+    assert [(r['impression_id'][0], r['status'], r['watch_time']) for r in rows] == [
+        ('a', 'shown', None), ('b', 'completed', 25)
+    ]
+
+
+def test_completion_without_impression_id_falls_back_to_ad_id(db):
+    provider = DemoProvider()
+    provider.track_impression('demo_1', 2)
+
+    provider.track_completion('demo_1', 2, 30)
+
+    assert _impressions()[0]['status'] == 'completed'
+
+
+def test_served_ad_carries_impression_id_through_complete_ad(db):
+    manager = ProviderManager(provider_names=['demo'])
+    manager.inventory = None
+    ad = manager.get_ad(user_id=2)
+
+    manager.complete_ad('demo', ad['ad_id'], 2, 30, impression_id=ad['impression_id'])
+
+    rows = _impressions()
+    assert len(rows) == 1
+    assert rows[0]['impression_id'] == ad['impression_id']
+    assert rows[0]['status'] == 'completed'
@@ -0,0 +1,42 @@
+import models
+from conftest import query
+
+
+def _tables():
+    return {row['name'] for row in query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_init_db_on_empty_database(empty_db):
+    models.init_db()
+
+    tables = _tables()
+    for table in ('users', 'transactions', 'watched_ads', 'ad_impressions',
+                  'ledger_entries', 'balance_deltas', 'redemptions'):
+        assert table in tables
+    assert query('SELECT COUNT(*) AS n FROM users')[0]['n'] == 3
+
+
+def test_init_db_is_idempotent(db):
+    models.init_db()
+    assert query('SELECT COUNT(*) AS n FROM users')[0]['n'] == 3
+
+
+def test_impression_id_added_to_existing_ad_impressions(empty_db):
+    # Shape created by create_offline_db.py, before impression_id existed
+    with models.get_db_connection() as conn:
+        conn.execute('''
+            CREATE TABLE ad_impressions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider VARCHAR(50) NOT NULL,
+                ad_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(20) DEFAULT 'shown',
+                watch_time INTEGER,
+                completed_at TIMESTAMP
+            )
+        ''')
+    models.init_db()
+
+    columns = {row['name'] for row in query('PRAGMA table_info(ad_impressions)')}
+    assert 'impression_id' in columns
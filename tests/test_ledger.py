@@ -0,0 +1,77 @@
+import ledger
+from ledger import credit, debit, merge_deltas, to_points
+from conftest import query
+
+USER_ID = 2     # John Doe, 450 points
+
+
+def _balance():
+    return query('SELECT balance FROM users WHERE id = %s', (USER_ID,))[0]['balance']
+
+
+def _user_legs():
+    return query("SELECT amount, running_balance FROM ledger_entries WHERE user_id = %s ORDER BY id", (USER_ID,))
+
+
+def test_to_points_rounds_half_up():
+    assert [to_points(a) for a in (2.25, 2.5, 3.15, 0.4, 7)] == [2, 3, 3, 0, 7]
+
+
+def test_post_writes_rounded_amount_everywhere(db):
+    result = credit(USER_ID, 2.6, 'Watched: ad')
+
+    assert result.ok and result.balance == 453
+    assert query('SELECT amount FROM transactions WHERE id = %s', (result.transaction_id,))[0]['amount'] == 3
+    assert [tuple(leg) for leg in _user_legs()] == [(3, 453)]
+    counter_leg = query("SELECT amount FROM ledger_entries WHERE user_id IS NULL")
+    assert [leg['amount'] for leg in counter_leg] == [-3]
+
+
+def test_amount_rounding_to_zero_is_rejected(db):
+    result = credit(USER_ID, 0.4, 'Dust')
+    assert not result.ok and result.reason == 'invalid_amount'
+
+
+def test_debit_refuses_overdraft(db):
+    result = debit(USER_ID, 451, 'Too much')
+
+    assert not result.ok and result.reason == 'insufficient_funds'
+    assert _balance() == 450
+    assert _user_legs() == []
+
+
+def test_deferred_credits_merge_to_the_same_total(db, monkeypatch):
+    monkeypatch.setattr(ledger, 'LEDGER_DEFERRED_CREDITS', True)
+    first = credit(USER_ID, 2.25, 'Watched: ad')
+    second = credit(USER_ID, 2.25, 'Watched: ad')
+
+    assert second.balance == 454
+    assert _balance() == 450
+
+    assert merge_deltas() == 2
+    assert _balance() == 454
+    assert [tuple(leg) for leg in _user_legs()] == [(2, 452), (2, 454)]
+    amounts = query('SELECT amount FROM transactions WHERE id IN (%s, %s)',
+                    (first.transaction_id, second.transaction_id))
+    assert sum(row['amount'] for row in amounts) == 4
+
+
+def test_debit_merges_pending_credits_when_deferred(db, monkeypatch):
+    monkeypatch.setattr(ledger, 'LEDGER_DEFERRED_CREDITS', True)
+    credit(USER_ID, 10, 'Watched: ad')
+
+    result = debit(USER_ID, 455, 'Airtime')
+
+    assert result.ok and result.balance == 5
+    assert query('SELECT COUNT(*) AS n FROM balance_deltas')[0]['n'] == 0
+
+
+def test_debit_leaves_deltas_alone_when_not_deferred(db, monkeypatch):
+    monkeypatch.setattr(ledger, 'LEDGER_DEFERRED_CREDITS', True)
+    credit(USER_ID, 10, 'Watched: ad')
+    monkeypatch.setattr(ledger, 'LEDGER_DEFERRED_CREDITS', False)
+
+    assert debit(USER_ID, 50, 'Airtime').ok
+
+    assert query('SELECT COUNT(*) AS n FROM balance_deltas')[0]['n'] == 1
+    assert _balance() == 400
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import provider_metrics
+from conftest import query
+
+
+def _pending(last_served):
+    counts = provider_metrics._new_counts()
+    counts['impressions'] = 1
+    counts['last_served'] = last_served
+    return {(provider_metrics._hour_start(last_served), 'demo'): counts}
+
+
+def test_older_flush_keeps_the_newer_last_served(db):
+    newer = datetime(2026, 3, 1, 12, 30).timestamp()
+    provider_metrics._write(_pending(newer))
+    provider_metrics._write(_pending(newer - 3600))
+
+    row = query('SELECT impressions, last_served FROM provider_stats WHERE provider = %s', ('demo',))[0]
+    assert row['impressions'] == 2
+    assert row['last_served'] == provider_metrics._format_ts(datetime.utcfromtimestamp(newer))
+
+
+def test_last_served_is_utc_like_the_buckets(db):
+    ts = datetime(2026, 3, 1, 12, 30).timestamp()
+    provider_metrics._write(_pending(ts))
+
+    last_served = query('SELECT last_served FROM provider_stats')[0]['last_served']
+    bucket = query('SELECT bucket_start FROM provider_metrics')[0]['bucket_start']
+    assert last_served[:13] == bucket[:13]
@@ -0,0 +1,57 @@
+from ledger import credit
+from reconcile import find_drift, repair
+import models
+from conftest import query
+
+USER_ID = 2     # John Doe, 450 points
+
+
+def _balance():
+    return query('SELECT balance FROM users WHERE id = %s', (USER_ID,))[0]['balance']
+
+
+def _drift_of(user_id):
+    return {row['user_id']: row['drift'] for row in find_drift()}.get(user_id)
+
+
+def _skew_balance(amount):
+    with models.get_db_connection() as conn:
+        conn.execute('UPDATE users SET balance = balance + ? WHERE id = ?', (amount, USER_ID))
+
+
+def test_ledger_repair_posts_adjustment_without_moving_balance(db):
+    # The demo users were seeded with a balance but no transactions
+    assert _drift_of(USER_ID) == 450
+
+    repair([row for row in find_drift() if row['user_id'] == USER_ID], mode='ledger')
+
+    assert _drift_of(USER_ID) is None
+    assert _balance() == 450
+    txn = query("SELECT id, type, amount FROM transactions WHERE user_id = %s", (USER_ID,))
+    assert [(row['type'], row['amount']) for row in txn] == [('adjustment', 450)]
+    legs = query('SELECT account, amount, running_balance FROM ledger_entries WHERE transaction_id = %s',
+                 (txn[0]['id'],))
+    assert sorted(tuple(leg) for leg in legs) == [('adjustments', -450, None), ('user', 450, 450)]
+
+
+def test_ledger_repair_of_negative_drift_is_a_correction(db):
+    repair(find_drift(), mode='ledger')
+    _skew_balance(-20)
+
+    repair(find_drift(), mode='ledger')
+
+    assert _drift_of(USER_ID) is None
+    assert _balance() == 430
+    last = query("SELECT type, amount FROM transactions WHERE user_id = %s ORDER BY id DESC LIMIT 1", (USER_ID,))
+    assert tuple(last[0]) == ('correction', 20)
+
+
+def test_balance_repair_restores_balance_from_ledger(db):
+    repair(find_drift(), mode='ledger')
+    credit(USER_ID, 10, 'Watched: ad')
+    _skew_balance(7)
+
+    repair(find_drift(), mode='balance')
+
+    assert _drift_of(USER_ID) is None
+    assert _balance() == 460
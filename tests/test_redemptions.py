@@ -0,0 +1,60 @@
+import redemptions
+from redemptions import FulfillmentResult, claim_batch, enqueue_redemption, get_redemption, record_results
+import models
+from conftest import query
+
+USER_ID = 2     # John Doe, 450 points
+
+
+def _enqueue(points=100):
+    with models.get_db_connection() as conn:
+        return enqueue_redemption(conn, USER_ID, None, 'airtime', 'R10', points, '0829876543')
+
+
+def _balance():
+    return query('SELECT balance FROM users WHERE id = %s', (USER_ID,))[0]['balance']
+
+
+def test_claim_then_fulfil(db):
+    redemption_id = _enqueue()
+
+    batch = claim_batch('worker-a')
+    assert [item['id'] for item in batch] == [redemption_id]
+    assert batch[0]['status'] == 'processing' and batch[0]['attempts'] == 1
+    assert claim_batch('worker-b') == []
+
+    counts = record_results(batch, [FulfillmentResult(redemption_id, True, reference='REF-1')], 'worker-a')
+
+    assert counts['fulfilled'] == 1
+    redemption = get_redemption(redemption_id)
+    assert redemption['status'] == 'fulfilled' and redemption['provider_ref'] == 'REF-1'
+
+
+def test_final_failure_refunds_once(db):
+    redemption_id = _enqueue(points=100)
+    batch = claim_batch('worker-a')
+
+    counts = record_results(batch, [FulfillmentResult(redemption_id, False, error='rejected', retryable=False)],
+                            'worker-a')
+
+    assert counts['failed'] == 1
+    assert get_redemption(redemption_id)['status'] == 'failed'
+    assert _balance() == 550
+
+
+def test_result_after_lost_lease_is_dropped(db, monkeypatch):
+    redemption_id = _enqueue(points=100)
+    stale_batch = claim_batch('worker-a')
+
+    # worker-a's lease expires and worker-b reclaims the row
+    monkeypatch.setattr(redemptions, 'REDEMPTION_LEASE_SECONDS', -60)
+    assert [item['id'] for item in claim_batch('worker-b')] == [redemption_id]
+
+    counts = record_results(stale_batch,
+                            [FulfillmentResult(redemption_id, False, error='late', retryable=False)],
+                            'worker-a')
+
+    assert counts['stale'] == 1 and counts['failed'] == 0
+    redemption = get_redemption(redemption_id)
+    assert redemption['status'] == 'processing' and redemption['attempts'] == 2
+    assert _balance() == 450
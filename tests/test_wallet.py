@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import query
+
+USER_ID = 2     # John Doe
+
+
+def _balance():
+    return query('SELECT balance FROM users WHERE id = %s', (USER_ID,))[0]['balance']
+
+
+def _redemptions():
+    return [tuple(row) for row in query('SELECT product, points FROM redemptions WHERE user_id = %s', (USER_ID,))]
+
+
+def test_airtime_package_is_priced_from_the_catalog(client):
+    before = _balance()
+
+    response = client.post('/wallet/convert/airtime', data={'amount': '20'})
+
+    assert response.status_code == 302
+    assert _balance() == before - 200
+    assert _redemptions() == [('R20', 200)]
+
+
+@pytest.mark.parametrize('amount', ['-10', '15', 'abc', ''])
+def test_invalid_airtime_amount_is_rejected(client, amount):
+    before = _balance()
+
+    response = client.post('/wallet/convert/airtime', data={'amount': amount})
+
+    assert response.status_code == 302
+    assert _balance() == before
+    assert _redemptions() == []
@@ -0,0 +1,214 @@
+"""
+unit_bandit.py - Thompson-sampling choice between Adsterra ad units
+Each (country, format) context keeps impressions, completions and revenue
+per unit. To pick a unit we draw a completion rate from each unit's
+Beta(1 + completions, 1 + misses) posterior and multiply it by the unit's
+revenue per completion; the highest draw wins. Units that complete more
+or pay more get more traffic, and uncertain units still get explored.
+
+choose() only reads the in-memory snapshot - no lock, O(units).
+Impressions and completions update the in-memory counts under a lock and
+are flushed every BANDIT_FLUSH_SECONDS as additive upserts, after which
+the snapshot is reloaded from the table so every worker learns from all
+workers' traffic.
+
+Counts are scaled down to at most BANDIT_MAX_WEIGHT impressions when
+sampling, so a unit whose performance changes is re-learned in days
+rather than never.
+
+Environment:
+    BANDIT_FLUSH_SECONDS=60
+    BANDIT_MAX_WEIGHT=5000
+"""
+
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from models import get_db_connection, convert_query, safe_row_access, run_ddl
+from app_logging import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__, category='ads')
+
+BANDIT_FLUSH_SECONDS = int(os.getenv('BANDIT_FLUSH_SECONDS', '60'))
+BANDIT_MAX_WEIGHT = int(os.getenv('BANDIT_MAX_WEIGHT', '5000'))
+
+
+def init_bandit_tables():
+    """Posterior counts per (country, format, unit)"""
+    run_ddl(
+        sqlite_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS unit_bandit_stats (
+                country VARCHAR(2) NOT NULL,
+                ad_format VARCHAR(30) NOT NULL,
+                unit VARCHAR(50) NOT NULL,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                completions INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (country, ad_format, unit)
+            )
+            """
+        ],
+        postgres_statements=[
+            """
+            CREATE TABLE IF NOT EXISTS unit_bandit_stats (
+                country VARCHAR(2) NOT NULL,
+                ad_format VARCHAR(30) NOT NULL,
+                unit VARCHAR(50) NOT NULL,
+                impressions BIGINT NOT NULL DEFAULT 0,
+                completions BIGINT NOT NULL DEFAULT 0,
+                revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (country, ad_format, unit)
+            )
+            """
+        ]
+    )
+
+
+class UnitBandit:
+    """
+    Thompson sampler over ad units
+
+    units: {unit key: revenue per completion in USD} - the prior for what a
+    completed view pays, replaced by the observed mean once a unit has
+    completions.
+    """
+
+    def __init__(self, units, flush_seconds=BANDIT_FLUSH_SECONDS, max_weight=BANDIT_MAX_WEIGHT):
+        self.units = dict(units)
+        self.flush_seconds = flush_seconds
+        self.max_weight = max_weight
+        self._lock = threading.Lock()
+        # (country, format, unit) -> (impressions, completions, revenue). Entries are
+        # replaced whole (single dict store) so choose() can read without the lock.
+        self._snapshot = {}
+        self._pending = {}
+        self._flusher = None
+
+    def choose(self, country, ad_format):
+        """Unit key with the highest sampled revenue per impression"""
+        self._ensure_flusher()
+        snapshot = self._snapshot
+        best, best_score = None, -1.0
+        for unit, prior_revenue in self.units.items():
+            impressions, completions, revenue = snapshot.get((country, ad_format, unit), (0, 0, 0.0))
+            completions = min(completions, impressions)
+            per_completion = revenue / completions if completions else prior_revenue
+            if impressions > self.max_weight:
+                scale = self.max_weight / impressions
+                impressions, completions = impressions * scale, completions * scale
+            score = random.betavariate(1 + completions, 1 + impressions - completions) * per_completion
+            if score > best_score:
+                best, best_score = unit, score
+        return best
+
+    def record_impression(self, country, ad_format, unit):
+        self._add(country, ad_format, unit, 1, 0, 0.0)
+
+    def record_completion(self, country, ad_format, unit, revenue=0.0):
+        self._add(country, ad_format, unit, 0, 1, revenue or 0.0)
+
+    def _add(self, country, ad_format, unit, impressions, completions, revenue):
+        if unit not in self.units:
+            return
+        key = (country, ad_format, unit)
+        with self._lock:
+            i, c, r = self._pending.get(key, (0, 0, 0.0))
+            self._pending[key] = (i + impressions, c + completions, r + revenue)
+            i, c, r = self._snapshot.get(key, (0, 0, 0.0))
+            self._snapshot[key] = (i + impressions, c + completions, r + revenue)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='unit-bandit', daemon=True)
+            self._flusher.start()
+        import atexit
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        self.reload()
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+            self.reload()
+
+    def flush(self):
+        """Write pending deltas; returns the number of rows flushed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.executemany(convert_query("""
+                        INSERT INTO unit_bandit_stats
+                            (country, ad_format, unit, impressions, completions, revenue, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT (country, ad_format, unit) DO UPDATE SET
+                            impressions = unit_bandit_stats.impressions + excluded.impressions,
+                            completions = unit_bandit_stats.completions + excluded.completions,
+                            revenue = unit_bandit_stats.revenue + excluded.revenue,
+                            updated_at = CURRENT_TIMESTAMP
+                    """), [key + counts for key, counts in pending.items()])
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            log.error('bandit_flush_failed', rows=len(pending), error=str(e))
+            with self._lock:
+                for key, (i, c, r) in pending.items():
+                    pi, pc, pr = self._pending.get(key, (0, 0, 0.0))
+                    self._pending[key] = (pi + i, pc + c, pr + r)
+            return 0
+
+        log.debug('bandit_flushed', rows=len(pending))
+        return len(pending)
+
+    def reload(self):
+        """Replace the snapshot with the table's totals plus anything not yet flushed"""
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT country, ad_format, unit, impressions, completions, revenue
+                    FROM unit_bandit_stats
+                """)
+                rows = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            log.error('bandit_reload_failed', error=str(e))
+            return
+
+        totals = {}
+        for row in rows:
+            key = tuple(safe_row_access(row, name, i) for i, name in enumerate(('country', 'ad_format', 'unit')))
+            totals[key] = (int(safe_row_access(row, 'impressions', 3)),
+                           int(safe_row_access(row, 'completions', 4)),
+                           float(safe_row_access(row, 'revenue', 5)))
+        with self._lock:
+            for key, (i, c, r) in self._pending.items():
+                ti, tc, tr = totals.get(key, (0, 0, 0.0))
+                totals[key] = (ti + i, tc + c, tr + r)
+            self._snapshot = totals
+
+    def stats(self):
+        """Current counts and completion rate per (country, format, unit)"""
+        return [
+            {'country': country, 'format': ad_format, 'unit': unit, 'impressions': i,
+             'completions': c, 'completion_rate': round(c / i, 3) if i else None, 'revenue': round(r, 4)}
+            for (country, ad_format, unit), (i, c, r) in sorted(list(self._snapshot.items()))
+        ]